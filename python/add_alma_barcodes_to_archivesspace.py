@@ -1,16 +1,65 @@
 import argparse
+import itertools
 import json
 
-from importlib import import_module
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
 from pathlib import Path
+from types import ModuleType
 from alma_api_client import AlmaAPIClient
 from asnake.client import ASnakeClient
 import asnake.logging as logging
 
-from config.base_match import match_containers
-from utils import configure_logging, load_config, read_from_cache, write_to_cache
-from utils.alma_utils import get_alma_items_from_alma
-from utils.aspace_utils import get_container_refs_from_api, get_container_refs_from_db
+from config.base_match import cascade_match_containers, match_containers
+from config.profile_compiler import (
+    PROFILE_SEPARATOR,
+    get_registered_profiles,
+    load_profile,
+    load_profiles,
+    resolve_profile_name,
+)
+from utils import configure_logging, iter_jsonl, load_config, log_stage, write_jsonl
+from utils.alma_utils import (
+    DEFAULT_ALMA_CALLS_PER_SECOND,
+    AlmaRateLimiter,
+    get_alma_cache_key,
+    get_alma_items_from_alma,
+)
+from utils.aspace_utils import (
+    DEFAULT_BATCH_SIZE,
+    DEFAULT_BULK_CHUNK_SIZE,
+    DEFAULT_MAX_WORKERS,
+    get_changed_container_refs,
+    get_container_refs_from_api,
+    get_container_refs_from_db,
+    get_container_stamps_from_db,
+    get_container_versions_from_db,
+    get_top_containers_by_id_set,
+    get_top_containers_from_db,
+    get_top_containers_from_refs,
+    get_version_stamp,
+    partition_containers_by_barcode,
+    restore_top_container_barcodes,
+    update_top_container_barcodes,
+    update_top_container_barcodes_in_bulk,
+)
+from utils.cache_utils import DEFAULT_CACHE_DIR, CacheStore
+from utils.journal_utils import (
+    ChangeJournal,
+    get_barcode_changes,
+    get_checkpoint_filename,
+    get_journal_filename,
+    get_plan_filename,
+    get_run_id,
+    iter_journal,
+)
+from utils.record_utils import (
+    AlmaItemRecord,
+    TopContainerRecord,
+    compact_alma_items,
+    compact_top_containers,
+)
 
 
 # Logger available globally within this module.
@@ -19,9 +68,11 @@ from utils.aspace_utils import get_container_refs_from_api, get_container_refs_f
 logger = logging.get_logger(Path(__file__).stem)
 
 
-def _get_args() -> argparse.Namespace:
+def _get_args(argv: list[str] | None = None) -> argparse.Namespace:
     """Returns the command-line arguments for this program.
 
+    :param list[str] | None argv: Arguments to parse, e.g. when run for one collection
+        of a batch. Defaults to None, which parses `sys.argv`.
     :return: Parsed CLI arguments.
     """
     parser = argparse.ArgumentParser()
@@ -36,7 +87,22 @@ def _get_args() -> argparse.Namespace:
         required=False,
         default=2,
     )
-    parser.add_argument("--profile", help="Path to profile module", required=True)
+    parser.add_argument(
+        "--profile",
+        help=(
+            "Profile module (e.g. config.indicator_type_matching), or declarative profile file. "
+            "Several comma-separated profiles are applied in order, each matching "
+            "only what earlier ones left unmatched"
+        ),
+    )
+    parser.add_argument(
+        "--evaluate_profiles",
+        help=(
+            "Compare all registered profiles (and --profile, if set) on this collection, "
+            "without changing ASpace"
+        ),
+        action="store_true",
+    )
     parser.add_argument(
         "--config_file",
         help="Path to config file with ASpace and Alma info",
@@ -52,6 +118,14 @@ def _get_args() -> argparse.Namespace:
         help="Dry run: do not update top containers in ArchivesSpace",
         action="store_true",
     )
+    parser.add_argument(
+        "--trace_memory",
+        help=(
+            "Log the memory used by each stage (slows the run, "
+            "as every allocation is traced)"
+        ),
+        action="store_true",
+    )
     parser.add_argument(
         "--print_output",
         help="Print output to console in addition to writing to log file",
@@ -62,6 +136,25 @@ def _get_args() -> argparse.Namespace:
         help="Read Alma and ASpace data from cached files (if available)",
         action="store_true",
     )
+    parser.add_argument(
+        "--cache_dir",
+        help=f"Directory for cached Alma and ASpace data. Defaults to {DEFAULT_CACHE_DIR}.",
+        default=DEFAULT_CACHE_DIR,
+    )
+    parser.add_argument(
+        "--cache_max_age",
+        help="With --use_cache, ignore cached data fetched more than this many hours ago",
+        type=float,
+        required=False,
+    )
+    parser.add_argument(
+        "--refresh_cache",
+        help=(
+            "With --use_cache, update cached ASpace data by refetching only containers "
+            "changed since it was cached (uses the database)"
+        ),
+        action="store_true",
+    )
     parser.add_argument(
         "--undo_barcoding",
         help="Remove barcodes from ASpace for the collection specified by resource_id",
@@ -71,22 +164,92 @@ def _get_args() -> argparse.Namespace:
         "--use_log",
         help="Log file to use when undoing barcoding",
     )
-    args = parser.parse_args()
+    parser.add_argument(
+        "--resume",
+        help=(
+            "ID of an interrupted run to resume (the stem of its log file): "
+            "reuses its match plan, and only adds barcodes not already added"
+        ),
+    )
+    parser.add_argument(
+        "--apply_plan",
+        help=(
+            "Match plan written by a dry run, to add exactly the barcodes it lists "
+            "without contacting Alma or matching again"
+        ),
+    )
+    parser.add_argument(
+        "--use_journal",
+        help=(
+            "Change journal to use when undoing barcoding: restores each top container's "
+            "previous barcode, and resumes where an interrupted undo stopped"
+        ),
+    )
+    parser.add_argument(
+        "--max_workers",
+        help=(
+            "Maximum number of concurrent ArchivesSpace requests "
+            f"when retrieving and updating top containers. Defaults to {DEFAULT_MAX_WORKERS}."
+        ),
+        type=int,
+        default=DEFAULT_MAX_WORKERS,
+    )
+    parser.add_argument(
+        "--alma_calls_per_second",
+        help=(
+            "Maximum sustained rate of Alma API calls. "
+            f"Defaults to {DEFAULT_ALMA_CALLS_PER_SECOND}."
+        ),
+        type=float,
+        default=DEFAULT_ALMA_CALLS_PER_SECOND,
+    )
+    parser.add_argument(
+        "--batch_size",
+        help=(
+            "Retrieve top containers in batches of this size, "
+            "instead of one request per container. "
+            f"Values above {DEFAULT_BATCH_SIZE} may be capped by ArchivesSpace."
+        ),
+        type=int,
+        required=False,
+    )
+    parser.add_argument(
+        "--bulk_update_size",
+        help=(
+            "Add barcodes via the bulk barcodes endpoint, in chunks of this size, "
+            "instead of posting each top container. "
+            f"{DEFAULT_BULK_CHUNK_SIZE} is a reasonable value."
+        ),
+        type=int,
+        required=False,
+    )
+    args = parser.parse_args(argv)
     return args
 
 
 def _get_containers_from_container_refs(
-    aspace_client: ASnakeClient, container_refs: set[str]
+    aspace_client: ASnakeClient,
+    container_refs: set[str],
+    max_workers: int = DEFAULT_MAX_WORKERS,
+    batch_size: int | None = None,
+    seen_stamps: dict[str, dict] | None = None,
 ) -> list[dict]:
     """Returns a list of container data, given a set of container refs.
 
     :param ASnakeClient aspace_client: ASnakeClient instance.
     :param set[str] container_refs: A set of container refs.
+    :param int max_workers: Maximum number of concurrent requests.
+    :param int | None batch_size: If set, retrieve containers in batches of this size.
+    :param dict[str, dict] | None seen_stamps: If set, the version stamp of every
+        container retrieved, including those skipped, is added to this dict.
     :return: A list of containers.
     """
     containers = []
-    for tc in container_refs:
-        tc_json: dict = aspace_client.get(tc).json()
+    for tc_json in get_top_containers_from_refs(
+        aspace_client, container_refs, max_workers=max_workers, batch_size=batch_size
+    ):
+        if seen_stamps is not None:
+            seen_stamps[tc_json["uri"]] = get_version_stamp(tc_json)
         # Check that the container is linked to a published resource.
         if not tc_json.get("is_linked_to_published_record"):
             logger.info(
@@ -98,60 +261,201 @@ def _get_containers_from_container_refs(
     return containers
 
 
+def _get_cache_max_age(args: argparse.Namespace) -> timedelta | None:
+    """Returns the maximum age of cached data to use, from the CLI arguments.
+
+    :param argparse.Namespace args: CLI arguments for this program.
+    :return: The maximum age, or None if cached data of any age can be used.
+    """
+    if args.cache_max_age is None:
+        return None
+    return timedelta(hours=args.cache_max_age)
+
+
 def get_alma_items(
-    alma_client: AlmaAPIClient, bib_id: str, holdings_id: str, use_cache: bool
+    alma_client: AlmaAPIClient,
+    bib_id: str,
+    holdings_id: str,
+    use_cache: bool,
+    cache_store: CacheStore | None = None,
+    cache_max_age: timedelta | None = None,
+    rate_limiter: AlmaRateLimiter | None = None,
 ) -> list[dict]:
     """Returns item data from Alma for the given bib_id and holdings_id.
     The data is a list of dictionaries, each containing Alma data for one item.
-    Retrieves data from cache file if requested (and if it exists);
+    Retrieves data from cache if requested (and if fresh enough);
     otherwise, retrieves data from Alma.
 
     :param alma_client: AlmaAPIClient instance.
     :param str bib_id: Bib ID (AKA MMS ID) for the target collection.
     :param str holdings_id: Holdiings ID for the target collection.
     :param bool use_cache: If True, get data from cache file, otherwise get it from Alma.
+    :param CacheStore | None cache_store: Cache to use. Defaults to one in DEFAULT_CACHE_DIR.
+    :param timedelta | None cache_max_age: If set, ignore cached data older than this.
+    :param AlmaRateLimiter | None rate_limiter: If set, all Alma requests wait for it.
     :return: A list of dictionaries representing Alma items.
     """
     alma_items = None
-    alma_cache_file = f"alma_data_{holdings_id}.json"
-    # If using cache, get data from file if it exists.
+    cache_store = cache_store or CacheStore()
+    alma_cache_key = get_alma_cache_key(holdings_id)
+    # If using cache, get data from cache if it is usable.
     if use_cache:
-        logger.info(f"Reading Alma data from cache file {alma_cache_file}")
-        alma_items = read_from_cache(alma_cache_file)
+        logger.info(f"Reading Alma data from cache entry {alma_cache_key}")
+        alma_items = cache_store.get(alma_cache_key, max_age=cache_max_age)
     # If still no items, retrieve current data from Alma.
     if not alma_items:
-        alma_items = get_alma_items_from_alma(alma_client, bib_id, holdings_id)
-        # Cache data in file for possible later use.
-        logger.info(f"Caching Alma data in {alma_cache_file}")
-        write_to_cache(alma_items, alma_cache_file)
+        alma_items = get_alma_items_from_alma(
+            alma_client, bib_id, holdings_id, rate_limiter=rate_limiter
+        )
+        # Cache data for possible later use.
+        logger.info(f"Caching Alma data in cache entry {alma_cache_key}")
+        cache_store.put(alma_cache_key, alma_items)
     return alma_items
 
 
+def _refresh_cached_containers(
+    aspace_client: ASnakeClient,
+    resource_id: int,
+    cached_containers: list[dict],
+    seen_stamps: dict[str, dict] | None,
+    max_workers: int = DEFAULT_MAX_WORKERS,
+    batch_size: int | None = None,
+) -> tuple[list[dict], dict[str, dict]]:
+    """Brings cached container data up to date, using the database to find
+    containers which were added, changed or removed since they were cached,
+    and refetching only the added and changed ones.
+    Containers are compared by version stamp (`lock_version` and `system_mtime`).
+
+    :param ASnakeClient aspace_client: ASnakeClient instance.
+    :param int resource_id: ASpace resource ID for target collection.
+    :param list[dict] cached_containers: Container data from the cache.
+    :param dict[str, dict] | None seen_stamps: Version stamps of every container
+        seen when the cache was written, including those which were skipped,
+        or None if not cached.
+    :param int max_workers: Maximum number of concurrent requests.
+    :param int | None batch_size: If set, retrieve containers in batches of this size.
+    :return: A tuple of:
+        - a list of current containers linked to published resources, sorted by URI.
+        - the version stamps of every container now seen, to cache with them.
+    """
+    db_settings = aspace_client.config.get("database")
+    current_stamps = get_container_stamps_from_db(db_settings, resource_id)
+    unchanged_containers, changed_refs, removed_refs = get_changed_container_refs(
+        cached_containers, current_stamps, seen_stamps
+    )
+    logger.info(
+        f"Refreshing cached ASpace data: {len(unchanged_containers)} unchanged, "
+        f"{len(changed_refs)} new or changed, {len(removed_refs)} removed"
+    )
+    fetched_stamps: dict[str, dict] = {}
+    changed_containers = _get_containers_from_container_refs(
+        aspace_client, changed_refs, max_workers, batch_size, fetched_stamps
+    )
+    # Containers which could not be refetched are left out,
+    # so they are tried again by the next refresh.
+    refreshed_stamps = {
+        ref: stamp
+        for ref, stamp in current_stamps.items()
+        if ref not in changed_refs or ref in fetched_stamps
+    }
+    containers = sorted(
+        unchanged_containers + changed_containers, key=lambda tc: tc["uri"]
+    )
+    return containers, refreshed_stamps
+
+
+def _stamps_to_records(stamps: dict[str, dict]) -> list[dict]:
+    """Returns version stamps as records for the cache, one per container.
+
+    :param dict[str, dict] stamps: Version stamps by container ref.
+    :return: A list of dicts with `uri`, `lock_version` and `system_mtime`.
+    """
+    return [{"uri": ref, **stamp} for ref, stamp in stamps.items()]
+
+
+def _stamps_from_records(records: list[dict] | None) -> dict[str, dict] | None:
+    """Returns version stamps by container ref from cached records.
+
+    :param list[dict] | None records: Records from `_stamps_to_records`, or None.
+    :return: Version stamps by container ref, or None if there are no records.
+    """
+    if records is None:
+        return None
+    return {record["uri"]: get_version_stamp(record) for record in records}
+
+
 def get_aspace_containers(
     aspace_client: ASnakeClient,
     repo_id: int,
     resource_id: int,
     use_db: bool,
     use_cache: bool,
+    max_workers: int = DEFAULT_MAX_WORKERS,
+    batch_size: int | None = None,
+    dry_run: bool = False,
+    cache_store: CacheStore | None = None,
+    cache_max_age: timedelta | None = None,
+    refresh_cache: bool = False,
 ) -> list[dict]:
     """Given a set of top container ref URIs, obtain the full container data as JSON
     for each one that linked to a published resource.
     Returns a list of qualifying container data.
 
+    In a dry run with `use_db`, nothing will be written back to ASpace,
+    so a database projection with only the fields needed for matching
+    is used instead of full container data.
+    That projection is not cached, since a later live run must not post it.
+
     :param ASnakeClient aspace_client: ASnakeClient instance.
     :param int repo_id: ASpace repository ID.
     :param int resource_id: ASpace resource ID for target collection.
     :param bool use_db: If True, get ASpace data from DB, otherwise get it via the API.
     :param bool use_cache: If True, get data from cache file, otherwise get it from Alma.
+    :param int max_workers: Maximum number of concurrent requests.
+    :param int | None batch_size: If set, retrieve containers in batches of this size.
+    :param bool dry_run: If True with `use_db`, get a partial projection from the DB.
+    :param CacheStore | None cache_store: Cache to use. Defaults to one in DEFAULT_CACHE_DIR.
+    :param timedelta | None cache_max_age: If set, ignore cached data older than this.
+    :param bool refresh_cache: If True, refetch only the cached containers
+        which have changed in ASpace since they were cached.
     :return: A list of containers linked to published resources.
     """
     containers = None
-    aspace_cache_file = f"aspace_data_{resource_id}.json"
-    # If using cache, get data from file if it exists.
+    cache_store = cache_store or CacheStore()
+    aspace_cache_key = f"aspace_data_{resource_id}"
+    # Version stamps of every container seen, including skipped ones,
+    # so `refresh_cache` only refetches containers which have changed.
+    stamps_cache_key = f"aspace_stamps_{resource_id}"
+    # Cached containers are only valid for the ASpace instance they came from.
+    aspace_source = aspace_client.config.get("baseurl")
+    # If using cache, get data from cache if it is usable.
     if use_cache:
-        logger.info(f"Reading ASpace data from cache file {aspace_cache_file}")
-        containers = read_from_cache(aspace_cache_file)
+        logger.info(f"Reading ASpace data from cache entry {aspace_cache_key}")
+        containers = cache_store.get(
+            aspace_cache_key, max_age=cache_max_age, source=aspace_source
+        )
+        if containers and refresh_cache:
+            cached_stamps = cache_store.get(stamps_cache_key, source=aspace_source)
+            containers, seen_stamps = _refresh_cached_containers(
+                aspace_client,
+                resource_id,
+                containers,
+                _stamps_from_records(cached_stamps),
+                max_workers,
+                batch_size,
+            )
+            logger.info(f"Caching ASpace data in cache entry {aspace_cache_key}")
+            cache_store.put(aspace_cache_key, containers, source=aspace_source)
+            cache_store.put(
+                stamps_cache_key,
+                _stamps_to_records(seen_stamps),
+                source=aspace_source,
+            )
     # If still no containers, retrieve current data from ASpace.
+    if not containers and use_db and dry_run:
+        logger.info("Dry run: reading ASpace container projection from database")
+        db_settings = aspace_client.config.get("database")
+        return get_top_containers_from_db(db_settings, resource_id)
     if not containers:
         if use_db:
             db_settings = aspace_client.config.get("database")
@@ -162,11 +466,17 @@ def get_aspace_containers(
             )
 
         # The top containers endpoint returns refs, so we need to get the full container JSON.
-        containers = _get_containers_from_container_refs(aspace_client, container_refs)
+        seen_stamps: dict[str, dict] = {}
+        containers = _get_containers_from_container_refs(
+            aspace_client, container_refs, max_workers, batch_size, seen_stamps
+        )
 
-        # Cache data in file for possible later use.
-        logger.info(f"Caching ASpace data in {aspace_cache_file}")
-        write_to_cache(containers, aspace_cache_file)
+        # Cache data for possible later use.
+        logger.info(f"Caching ASpace data in cache entry {aspace_cache_key}")
+        cache_store.put(aspace_cache_key, containers, source=aspace_source)
+        cache_store.put(
+            stamps_cache_key, _stamps_to_records(seen_stamps), source=aspace_source
+        )
 
     return containers
 
@@ -240,25 +550,41 @@ def print_unhandled_data(unhandled_data: dict) -> None:
 
 
 def print_summary_info(
-    alma_items: list[dict],
-    aspace_containers: list[dict],
+    alma_item_count: int,
+    aspace_container_count: int,
     matched_aspace_containers: list[dict],
     unhandled_data: dict,
     print_output: bool,
+    updated_refs: list[str] | None = None,
+    failed_refs: dict[str, str] | None = None,
+    stages: list[dict] | None = None,
+    match_tiers: dict[str, str] | None = None,
 ) -> None:
     """Writes summary information about the run to the log.
     If print_output is True, also prints the info to console.
 
-    :param list[dict] alma_items: A list of all Alma items.
-    :param list[dict] aspace_containers: A list of all ASpace containers.
+    :param int alma_item_count: Number of Alma items.
+    :param int aspace_container_count: Number of ASpace containers without barcodes.
     :param list[dict] matched_aspace_containers: A list of matched ASpace containers.
     :param dict unhandled_data: A dict representing unhandled items.
     :param bool print_output: If True, print summary to console, otherwise only write to file.
+    :param list[str] | None updated_refs: Refs of containers updated in ASpace.
+        None if no updates were attempted (e.g. a dry run).
+    :param dict[str, str] | None failed_refs: Refs of containers which failed to update,
+        with error messages.
+    :param list[dict] | None stages: Info about each completed pipeline stage,
+        as recorded by `log_stage`; their times are included in the summary.
+    :param dict[str, str] | None match_tiers: For a cascade of profiles,
+        the profile which matched each container, by uri.
     """
     summary_info = [
-        f"Total Alma items: {len(alma_items)}",
-        f"Total ASpace top containers: {len(aspace_containers)}",
+        f"Total Alma items: {alma_item_count}",
+        f"Total ASpace top containers: {aspace_container_count}",
         f"Matched ASpace top containers: {len(matched_aspace_containers)}",
+        *(
+            f"Matched by {tier}: {count}"
+            for tier, count in Counter((match_tiers or {}).values()).items()
+        ),
         (
             f"ASpace top containers with existing barcodes:"
             f" {len(unhandled_data.get('top_containers_with_barcodes', []))}"
@@ -277,6 +603,13 @@ def print_summary_info(
             f" {len(unhandled_data.get('tcs_with_duplicate_keys', []))}"
         ),
     ]
+    if updated_refs is not None:
+        summary_info.append(f"ASpace top containers updated: {len(updated_refs)}")
+        summary_info.append(
+            f"ASpace top containers failed to update: {len(failed_refs or {})}"
+        )
+    for stage in stages or []:
+        summary_info.append(f"Stage {stage['stage']}: {stage['seconds']:.1f} seconds")
     for message in summary_info:
         logger.info(message)
         if print_output:
@@ -316,11 +649,15 @@ def _remove_barcodes_from_aspace(
     :param argparse.Namespace: CLI arguments for this program.
     """
 
+    if args.use_journal:
+        _undo_barcoding_from_journal(aspace_client, args)
+        return
+
     if args.use_log:
         container_refs = _get_container_refs_from_log_file(args.use_log)
         print(f"Retrieving container information from {args.use_log}...")
         aspace_containers = _get_containers_from_container_refs(
-            aspace_client, container_refs
+            aspace_client, container_refs, args.max_workers, args.batch_size
         )
     else:
         print("Retrieving container information from ASpace...")
@@ -330,6 +667,11 @@ def _remove_barcodes_from_aspace(
             resource_id=args.resource_id,
             use_db=args.use_db,
             use_cache=args.use_cache,
+            max_workers=args.max_workers,
+            batch_size=args.batch_size,
+            cache_store=CacheStore(args.cache_dir),
+            cache_max_age=_get_cache_max_age(args),
+            refresh_cache=args.refresh_cache,
         )
     # Make sure returned containers have barcodes
     top_containers_with_barcodes = [tc for tc in aspace_containers if tc.get("barcode")]
@@ -371,18 +713,23 @@ def _remove_barcodes_from_aspace(
             logger.info(message)
             print(message)
             return
-        # Delete barcodes using fetched container refs
-        for tc in top_containers_with_barcodes:
-            logger.info(
-                f"Deleted barcode {tc['barcode']} for top container {tc['uri']}"
-            )
-            del tc["barcode"]
-            aspace_client.post(tc["uri"], json=tc)
+        # Delete barcodes using fetched container refs, concurrently.
+        # Each container is refetched first, so one edited since is not overwritten.
+        removed_refs, failed_refs = restore_top_container_barcodes(
+            aspace_client,
+            [
+                {"uri": tc["uri"], "old_barcode": None, "new_barcode": tc["barcode"]}
+                for tc in top_containers_with_barcodes
+            ],
+            args.max_workers,
+        )
 
         message = (
-            f"Removed barcodes from {len(top_containers_with_barcodes)} "
+            f"Removed barcodes from {len(removed_refs)} "
             f"top containers related to ASpace Resource ID {args.resource_id}"
         )
+        if failed_refs:
+            message += f"; {len(failed_refs)} could not be removed"
         logger.info(message)
         print(message)
         return
@@ -391,6 +738,76 @@ def _remove_barcodes_from_aspace(
         return
 
 
+def _undo_barcoding_from_journal(
+    aspace_client: ASnakeClient, args: argparse.Namespace
+) -> None:
+    """Restores the barcodes of top containers changed in a barcoding run,
+    as recorded in its journal. Progress is checkpointed as each container
+    is restored, so running the same undo again resumes where it stopped.
+
+    :param ASnakeClient aspace_client: ASnakeClient instance for ASpace environment.
+    :param argparse.Namespace: CLI arguments for this program.
+    """
+    if not Path(args.use_journal).exists():
+        print(f"{args.use_journal} does not exist. Exiting...")
+        raise SystemExit()
+
+    changes = get_barcode_changes(args.use_journal)
+    checkpoint_filename = get_checkpoint_filename(args.use_journal)
+    restored_refs = set()
+    if checkpoint_filename.exists():
+        restored_refs = {
+            entry["uri"]
+            for entry in iter_journal(checkpoint_filename)
+            if entry["error"] is None
+        }
+        print(
+            f"Resuming undo: {len(restored_refs)} of {len(changes)} "
+            f"top containers already restored (see {checkpoint_filename})"
+        )
+    pending_changes = [
+        change for change in changes if change["uri"] not in restored_refs
+    ]
+    if not pending_changes:
+        print(f"No barcode changes left to undo in {args.use_journal}")
+        return
+
+    confirmation = input(
+        f"Are you sure you want to restore the previous barcodes of "
+        f"{len(pending_changes)} top containers in ArchivesSpace? (y/N): "
+    )
+    if not confirmation or confirmation.lower() not in "yes":
+        print("Aborting undo...")
+        return
+
+    if args.dry_run:
+        message = (
+            "Running in dry run mode..."
+            f"would restore barcodes of {len(pending_changes)} top containers "
+            "in live mode"
+        )
+        logger.info(message)
+        print(message)
+        return
+
+    print(f"Restoring barcodes from {args.use_journal}...")
+    with ChangeJournal(checkpoint_filename) as checkpoint:
+        restored, failed = restore_top_container_barcodes(
+            aspace_client,
+            pending_changes,
+            args.max_workers,
+            on_done=lambda change, error: checkpoint.append(
+                {"uri": change["uri"], "error": error}
+            ),
+        )
+    message = (
+        f"Restored barcodes of {len(restored)} top containers; "
+        f"{len(failed)} could not be restored"
+    )
+    logger.info(message)
+    print(message)
+
+
 def main() -> None:
     """Add barcodes pulled from Alma records to matching records in ArchivesSpace."""
 
@@ -398,7 +815,7 @@ def main() -> None:
     # Also used in names of some output files.
     logging_filename_base = Path(__file__).stem
     print(f"Logging to {logging_filename_base}.log")
-    configure_logging(log_filename_stem=logging_filename_base)
+    log_filename = configure_logging(log_filename_stem=logging_filename_base)
 
     args: argparse.Namespace = _get_args()
     config = load_config(args.config_file)
@@ -407,94 +824,860 @@ def main() -> None:
     alma_client = AlmaAPIClient(alma_api_key)
     aspace_client = ASnakeClient(**config)
 
-    # Require use of --undo_barcoding if --use_log is set
+    # Require use of --undo_barcoding if --use_log or --use_journal is set
     if args.use_log and not args.undo_barcoding:
         print("The --undo_barcoding is required when --use_log is set")
         return
+    if args.use_journal and not args.undo_barcoding:
+        print("The --undo_barcoding is required when --use_journal is set")
+        return
+    # Require a profile, unless comparing all of them
+    if not args.profile and not args.evaluate_profiles:
+        print("The --profile is required unless --evaluate_profiles is set")
+        return
+
+    if args.evaluate_profiles:
+        evaluate_profiles(args, alma_client, aspace_client)
+        return
 
     if args.undo_barcoding:
         _remove_barcodes_from_aspace(aspace_client, args)
         return
 
-    alma_items = get_alma_items(
-        alma_client, args.bib_id, args.holdings_id, args.use_cache
+    if args.resume and not get_plan_filename(args.resume).exists():
+        print(f"{get_plan_filename(args.resume)} does not exist. Exiting...")
+        raise SystemExit()
+    if args.apply_plan and not Path(args.apply_plan).exists():
+        print(f"{args.apply_plan} does not exist. Exiting...")
+        raise SystemExit()
+    if args.apply_plan and args.resume:
+        print("The --apply_plan and --resume options cannot be used together")
+        return
+
+    barcode_collection(
+        args,
+        alma_client,
+        aspace_client,
+        logging_filename_base,
+        args.resume or get_run_id(log_filename),
     )
+
+
+def _prepare_alma_data(
+    args: argparse.Namespace,
+    alma_client: AlmaAPIClient,
+    cache_store: CacheStore,
+    cache_max_age: timedelta | None,
+    profile_module: ModuleType,
+    stages: list[dict],
+) -> tuple[list[dict], dict, list]:
+    """Fetch and key-build stages for Alma: gets the collection's items,
+    then builds their match keys with the profile.
+
+    :param argparse.Namespace args: CLI arguments for this program.
+    :param AlmaAPIClient alma_client: AlmaAPIClient instance.
+    :param CacheStore cache_store: Cache for Alma data.
+    :param timedelta | None cache_max_age: If set, ignore cached data older than this.
+    :param ModuleType profile_module: The matching profile.
+    :param list[dict] stages: Info about each completed stage is appended to this.
+    :return: A tuple of (Alma items, match data, items with duplicate keys).
+    """
+    alma_items = _fetch_alma_data(args, alma_client, cache_store, cache_max_age, stages)
+
+    with log_stage("key_build_alma", logger, stages, args.trace_memory) as stage:
+        match_data, items_with_duplicate_keys = profile_module.get_alma_match_data(
+            alma_items, logger
+        )
+        stage["keys"] = len(match_data)
+        stage["duplicates"] = len(items_with_duplicate_keys)
+    return alma_items, match_data, items_with_duplicate_keys
+
+
+def _fetch_alma_data(
+    args: argparse.Namespace,
+    alma_client: AlmaAPIClient,
+    cache_store: CacheStore,
+    cache_max_age: timedelta | None,
+    stages: list[dict],
+) -> list[AlmaItemRecord]:
+    """Fetch stage for Alma: gets the collection's items,
+    keeping only the fields used for matching (see `utils.record_utils`).
+
+    :param argparse.Namespace args: CLI arguments for this program.
+    :param AlmaAPIClient alma_client: AlmaAPIClient instance.
+    :param CacheStore cache_store: Cache for Alma data.
+    :param timedelta | None cache_max_age: If set, ignore cached data older than this.
+    :param list[dict] stages: Info about each completed stage is appended to this.
+    :return: Compact records for the Alma items.
+    """
+    # As in prefetch_alma_items.py, all Alma requests share one rate limiter.
+    rate_limiter = AlmaRateLimiter(args.alma_calls_per_second)
+    with log_stage("fetch_alma", logger, stages, args.trace_memory) as stage:
+        alma_items = compact_alma_items(
+            get_alma_items(
+                alma_client,
+                args.bib_id,
+                args.holdings_id,
+                args.use_cache,
+                cache_store,
+                cache_max_age,
+                rate_limiter,
+            )
+        )
+        stage["items"] = len(alma_items)
     logger.info(f"Found {len(alma_items)} items in Alma")
+    return alma_items
+
+
+def _prepare_aspace_data(
+    args: argparse.Namespace,
+    aspace_client: ASnakeClient,
+    cache_store: CacheStore,
+    cache_max_age: timedelta | None,
+    profile_module: ModuleType,
+    stages: list[dict],
+) -> tuple[list[dict], list[dict], dict, list]:
+    """Fetch, partition and key-build stages for ASpace: gets the collection's
+    top containers, sets aside those which already have barcodes,
+    then builds match keys for the rest with the profile.
+
+    :param argparse.Namespace args: CLI arguments for this program.
+    :param ASnakeClient aspace_client: ASnakeClient instance.
+    :param CacheStore cache_store: Cache for ASpace data.
+    :param timedelta | None cache_max_age: If set, ignore cached data older than this.
+    :param ModuleType profile_module: The matching profile.
+    :param list[dict] stages: Info about each completed stage is appended to this.
+    :return: A tuple of (top containers without barcodes, top containers with barcodes,
+        match data, top containers with duplicate keys).
+    """
+    aspace_containers, top_containers_with_barcodes = _fetch_aspace_data(
+        args, aspace_client, cache_store, cache_max_age, stages
+    )
 
-    aspace_containers = get_aspace_containers(
-        aspace_client, args.repo_id, args.resource_id, args.use_db, args.use_cache
+    with log_stage("key_build_aspace", logger, stages, args.trace_memory) as stage:
+        match_data, tcs_with_duplicate_keys = profile_module.get_aspace_match_data(
+            aspace_containers, logger
+        )
+        stage["keys"] = len(match_data)
+        stage["duplicates"] = len(tcs_with_duplicate_keys)
+    return (
+        aspace_containers,
+        top_containers_with_barcodes,
+        match_data,
+        tcs_with_duplicate_keys,
     )
+
+
+def _fetch_aspace_data(
+    args: argparse.Namespace,
+    aspace_client: ASnakeClient,
+    cache_store: CacheStore,
+    cache_max_age: timedelta | None,
+    stages: list[dict],
+) -> tuple[list[TopContainerRecord], list[TopContainerRecord]]:
+    """Fetch and partition stages for ASpace: gets the collection's top containers,
+    keeping only the fields used for matching (see `utils.record_utils`),
+    and sets aside those which already have barcodes.
+    The complete JSON of the containers which get barcodes is fetched again
+    just before each is written.
+
+    :param argparse.Namespace args: CLI arguments for this program.
+    :param ASnakeClient aspace_client: ASnakeClient instance.
+    :param CacheStore cache_store: Cache for ASpace data.
+    :param timedelta | None cache_max_age: If set, ignore cached data older than this.
+    :param list[dict] stages: Info about each completed stage is appended to this.
+    :return: A tuple of compact records for
+        (top containers without barcodes, top containers with barcodes).
+    """
+    with log_stage("fetch_aspace", logger, stages, args.trace_memory) as stage:
+        aspace_containers = compact_top_containers(
+            get_aspace_containers(
+                aspace_client,
+                args.repo_id,
+                args.resource_id,
+                args.use_db,
+                args.use_cache,
+                args.max_workers,
+                args.batch_size,
+                args.dry_run,
+                cache_store,
+                cache_max_age,
+                args.refresh_cache,
+            )
+        )
+        stage["items"] = len(aspace_containers)
     logger.info(f"Found {len(aspace_containers)} top containers in ASpace")
 
-    # TODO: Refactor below here, including config and data reporting code.
+    with log_stage("partition", logger, stages, args.trace_memory) as stage:
+        aspace_containers, top_containers_with_barcodes = (
+            partition_containers_by_barcode(aspace_containers)
+        )
+        stage["without_barcodes"] = len(aspace_containers)
+        stage["with_barcodes"] = len(top_containers_with_barcodes)
+    return aspace_containers, top_containers_with_barcodes
 
-    # Load profile module
-    profile_module = import_module(args.profile)
-    get_alma_match_data = getattr(profile_module, "get_alma_match_data")
-    get_aspace_match_data = getattr(profile_module, "get_aspace_match_data")
 
-    # find top containers with existing barcodes
-    # add them to a list for later output and remove them from the list of ASpace containers
-    top_containers_with_barcodes = [tc for tc in aspace_containers if tc.get("barcode")]
-    if top_containers_with_barcodes:
-        aspace_containers = [
-            tc for tc in aspace_containers if tc not in top_containers_with_barcodes
-        ]
+def _write_barcodes(
+    args: argparse.Namespace,
+    aspace_client: ASnakeClient,
+    matched_aspace_containers: list[dict],
+    journal_filename: str | Path | None = None,
+) -> tuple[list[str] | None, dict[str, str] | None]:
+    """Write stage: adds barcodes to the matched ASpace top containers,
+    unless this is a dry run.
+
+    :param argparse.Namespace args: CLI arguments for this program.
+    :param ASnakeClient aspace_client: ASnakeClient instance.
+    :param list[dict] matched_aspace_containers: Top containers with barcodes to add.
+    :param str | Path | None journal_filename: If set, each change is recorded
+        in this journal as soon as it is made, for use by undo and `--resume`.
+    :return: A tuple of (updated refs, failed refs with errors),
+        both None for a dry run.
+    """
+    if args.dry_run:
+        logger.info("Dry run: no changes made to ASpace top containers")
+        return None, None
+
+    journal = ChangeJournal(journal_filename) if journal_filename else None
+
+    def _record_change(tc: dict) -> None:
+        # Barcodes are only added to containers which have none when updated:
+        # both update paths refuse to replace a barcode added since matching,
+        # so there is no earlier barcode to restore.
+        # `tc` is the container as saved, so its `lock_version` is the one
+        # the change was applied to.
+        journal.record_barcode_change(
+            tc["uri"], None, tc["barcode"], tc.get("lock_version")
+        )
 
-    # get match data for Alma items and ASpace top containers
-    aspace_match_data, tcs_with_duplicate_keys = get_aspace_match_data(
-        aspace_containers, logger
+    on_updated = _record_change if journal else None
+    try:
+        if args.bulk_update_size:
+            updated_refs, failed_refs = update_top_container_barcodes_in_bulk(
+                aspace_client,
+                matched_aspace_containers,
+                args.bulk_update_size,
+                args.max_workers,
+                on_updated=on_updated,
+            )
+        else:
+            updated_refs, failed_refs = update_top_container_barcodes(
+                aspace_client,
+                matched_aspace_containers,
+                args.max_workers,
+                on_updated=on_updated,
+            )
+    finally:
+        if journal:
+            journal.close()
+    logger.info(f"Updated barcodes for {len(updated_refs)} top containers")
+    if journal:
+        logger.info(f"Changes recorded in journal {journal_filename}")
+    return updated_refs, failed_refs
+
+
+def _save_match_plan(
+    plan_filename: Path,
+    args: argparse.Namespace,
+    plan: dict,
+) -> None:
+    """Writes a run's match plan to a JSON Lines file before any barcodes are added,
+    so an interrupted run can be resumed without fetching and matching again,
+    and a dry run's plan can be reviewed, then applied with `--apply_plan`.
+    The first line identifies the collection and has the run's counts;
+    each following line is a record tagged with its category, as in the
+    unhandled data file, with matched top containers as "matched_containers",
+    and the profile which matched them as "tier" for a cascade of profiles.
+
+    :param Path plan_filename: Path of the plan file.
+    :param argparse.Namespace args: CLI arguments for this program.
+    :param dict plan: The plan, as returned by `_plan_barcodes`.
+    """
+    header = {
+        "resource_id": args.resource_id,
+        "bib_id": args.bib_id,
+        "holdings_id": args.holdings_id,
+        "profile": args.profile,
+        "alma_item_count": plan["alma_item_count"],
+        "aspace_container_count": plan["aspace_container_count"],
+    }
+    match_tiers = plan.get("match_tiers") or {}
+    plan_filename.parent.mkdir(parents=True, exist_ok=True)
+    write_jsonl(
+        itertools.chain(
+            [header],
+            (
+                # Only the fields needed to apply the plan, and to review it.
+                {
+                    "category": "matched_containers",
+                    "record": TopContainerRecord.from_dict(tc),
+                }
+                | ({"tier": match_tiers[tc["uri"]]} if tc["uri"] in match_tiers else {})
+                for tc in plan["matched_containers"]
+            ),
+            (
+                {"category": category, "record": record}
+                for category, records in plan["unhandled_data"].items()
+                for record in records
+            ),
+        ),
+        plan_filename,
     )
-    alma_match_data, items_with_duplicate_keys = get_alma_match_data(alma_items, logger)
-    # match Alma items with ASpace top containers
-    matched_aspace_containers, unhandled_data = match_containers(
-        alma_match_data,
-        aspace_match_data,
-        logger,
+    logger.info(f"Match plan written to {plan_filename}")
+
+
+def _load_match_plan(plan_filename: Path, args: argparse.Namespace) -> dict:
+    """Reads the match plan saved by an earlier run of the same collection.
+    Matched top containers are loaded as compact records, with the `lock_version`
+    they were matched at, and the barcode to add.
+
+    :param Path plan_filename: Path of the plan file.
+    :param argparse.Namespace args: CLI arguments for this program.
+    :return: The plan, in the format returned by `_plan_barcodes`.
+    :raises ValueError: If the plan is for a different collection or profile.
+    """
+    lines = iter_jsonl(plan_filename)
+    header = next(lines)
+    for arg in ("resource_id", "bib_id", "holdings_id"):
+        if header[arg] != getattr(args, arg):
+            raise ValueError(
+                f"Plan {plan_filename} is for {arg} {header[arg]}, "
+                f"not {getattr(args, arg)}"
+            )
+    # The same profile may be given in different ways, e.g. as a module or filename.
+    if resolve_profile_name(header["profile"]) != resolve_profile_name(args.profile):
+        raise ValueError(
+            f"Plan {plan_filename} is for profile {header['profile']}, "
+            f"not {args.profile}"
+        )
+    matched_containers = []
+    match_tiers = {}
+    unhandled_data: dict[str, list] = {}
+    for line in lines:
+        if line["category"] == "matched_containers":
+            # Complete JSON is fetched again when each container is written.
+            matched_containers.append(TopContainerRecord.from_dict(line["record"]))
+            if "tier" in line:
+                match_tiers[line["record"]["uri"]] = line["tier"]
+        else:
+            unhandled_data.setdefault(line["category"], []).append(line["record"])
+    logger.info(f"Loaded match plan {plan_filename}")
+    return {
+        "alma_item_count": header["alma_item_count"],
+        "aspace_container_count": header["aspace_container_count"],
+        "matched_containers": matched_containers,
+        "unhandled_data": unhandled_data,
+        "match_tiers": match_tiers or None,
+    }
+
+
+def _revalidate_match_plan(
+    args: argparse.Namespace,
+    aspace_client: ASnakeClient,
+    plan: dict,
+    stages: list[dict],
+    completed_refs: set[str] | None = None,
+) -> dict:
+    """Revalidate stage for `--apply_plan` and `--resume`: checks that each top container
+    in the plan is unchanged since it was matched, i.e. still has the `lock_version`
+    in the plan.
+    Current versions are read in bulk: in one database query with `--use_db`,
+    otherwise in `id_set` batches from the API, whose complete JSON is then posted
+    as is, so no container is fetched again when it is written.
+    Containers which have changed (or could not be checked) are not written,
+    but reported as unhandled "stale_plan_containers", for a new dry run to review.
+
+    :param argparse.Namespace args: CLI arguments for this program.
+    :param ASnakeClient aspace_client: ASnakeClient instance.
+    :param dict plan: The plan, as returned by `_load_match_plan`.
+    :param list[dict] stages: Info about each completed stage is appended to this.
+    :param set[str] | None completed_refs: Top containers already updated by the run
+        being resumed, which changed when their barcodes were added,
+        so are kept without being checked.
+    :return: The plan, with only the unchanged top containers to be written.
+    """
+    completed_refs = completed_refs or set()
+    with log_stage("revalidate", logger, stages, args.trace_memory) as stage:
+        completed_containers = [
+            tc for tc in plan["matched_containers"] if tc["uri"] in completed_refs
+        ]
+        planned_containers = [
+            tc for tc in plan["matched_containers"] if tc["uri"] not in completed_refs
+        ]
+        current_containers: dict[str, dict] = {}
+        if args.use_db:
+            db_settings = aspace_client.config.get("database")
+            current_versions = get_container_versions_from_db(
+                db_settings, args.resource_id
+            )
+        else:
+            top_containers, _ = get_top_containers_by_id_set(
+                aspace_client,
+                [tc["uri"] for tc in planned_containers],
+                args.batch_size or DEFAULT_BATCH_SIZE,
+                args.max_workers,
+            )
+            current_containers = {tc["uri"]: tc for tc in top_containers}
+            current_versions = {
+                uri: tc.get("lock_version") for uri, tc in current_containers.items()
+            }
+
+        valid_containers = list(completed_containers)
+        stale_containers = []
+        for tc in planned_containers:
+            current_version = current_versions.get(tc["uri"])
+            if current_version is None or current_version != tc.get("lock_version"):
+                logger.warning(
+                    f"Top container {tc['uri']} has changed since it was matched"
+                    f" (lock_version {tc.get('lock_version')} in plan,"
+                    f" {current_version} now); not adding barcode {tc['barcode']}"
+                )
+                stale_containers.append(
+                    {
+                        "uri": tc["uri"],
+                        "barcode": tc["barcode"],
+                        "planned_lock_version": tc.get("lock_version"),
+                        "current_lock_version": current_version,
+                    }
+                )
+            elif tc["uri"] in current_containers:
+                valid_containers.append(
+                    dict(current_containers[tc["uri"]], barcode=tc["barcode"])
+                )
+            else:
+                valid_containers.append(tc)
+        stage["valid"] = len(valid_containers)
+        stage["stale"] = len(stale_containers)
+
+    unhandled_data = dict(plan["unhandled_data"])
+    if stale_containers:
+        unhandled_data["stale_plan_containers"] = stale_containers
+    return dict(
+        plan, matched_containers=valid_containers, unhandled_data=unhandled_data
     )
 
+
+def _plan_barcodes(
+    args: argparse.Namespace,
+    alma_client: AlmaAPIClient,
+    aspace_client: ASnakeClient,
+    stages: list[dict],
+) -> dict:
+    """Fetch, partition, key-build and match stages: works out which ASpace
+    top containers get which barcodes. Alma and ASpace are independent services,
+    so their fetch and key-build stages run at the same time,
+    each side continuing as soon as its own data arrives.
+
+    :param argparse.Namespace args: CLI arguments for this program.
+    :param AlmaAPIClient alma_client: AlmaAPIClient instance.
+    :param ASnakeClient aspace_client: ASnakeClient instance.
+    :param list[dict] stages: Info about each completed stage is appended to this.
+    :return: A dict with the numbers of Alma items and ASpace top containers,
+        the matched top containers with barcodes added, and the unhandled data.
+        For a cascade of profiles, also the profile which matched each container.
+    """
+    profiles = load_profiles(args.profile)
+    if len(profiles) > 1:
+        return _plan_barcodes_in_tiers(
+            args, alma_client, aspace_client, profiles, stages
+        )
+    profile_module = profiles[0][1]
+    cache_store = CacheStore(args.cache_dir)
+    cache_max_age = _get_cache_max_age(args)
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        alma_future = executor.submit(
+            _prepare_alma_data,
+            args,
+            alma_client,
+            cache_store,
+            cache_max_age,
+            profile_module,
+            stages,
+        )
+        aspace_future = executor.submit(
+            _prepare_aspace_data,
+            args,
+            aspace_client,
+            cache_store,
+            cache_max_age,
+            profile_module,
+            stages,
+        )
+        alma_items, alma_match_data, items_with_duplicate_keys = alma_future.result()
+        (
+            aspace_containers,
+            top_containers_with_barcodes,
+            aspace_match_data,
+            tcs_with_duplicate_keys,
+        ) = aspace_future.result()
+
+    with log_stage("match", logger, stages, args.trace_memory) as stage:
+        matched_aspace_containers, unhandled_data = match_containers(
+            alma_match_data,
+            aspace_match_data,
+            logger,
+        )
+        stage["matched"] = len(matched_aspace_containers)
     # add top containers with existing barcodes to unhandled data for output
     unhandled_data["top_containers_with_barcodes"] = top_containers_with_barcodes
     # add items and top containers with duplicate keys to unhandled data for output
     unhandled_data["items_with_duplicate_keys"] = items_with_duplicate_keys
     unhandled_data["tcs_with_duplicate_keys"] = tcs_with_duplicate_keys
 
-    # update ASpace top containers with barcodes - only if not a dry run
-    if args.dry_run:
-        logger.info("Dry run: no changes made to ASpace top containers")
-    else:
-        for tc in matched_aspace_containers:
-            aspace_client.post(tc["uri"], json=tc)
-            logger.info(f"Added barcode to top container {tc['uri']}")
-        logger.info(
-            f"Updated barcodes for {len(matched_aspace_containers)} top containers"
+    return {
+        "alma_item_count": len(alma_items),
+        "aspace_container_count": len(aspace_containers),
+        "matched_containers": matched_aspace_containers,
+        "unhandled_data": unhandled_data,
+    }
+
+
+def _plan_barcodes_in_tiers(
+    args: argparse.Namespace,
+    alma_client: AlmaAPIClient,
+    aspace_client: ASnakeClient,
+    profiles: list[tuple[str, ModuleType]],
+    stages: list[dict],
+) -> dict:
+    """Fetch, partition and match stages for a cascade of profiles,
+    for collections which mix layouts. The data is fetched once, then each profile
+    in turn builds keys for, and matches, what earlier profiles left unmatched.
+    Keys are built as part of the match stage, as each tier depends on the last.
+
+    :param argparse.Namespace args: CLI arguments for this program.
+    :param AlmaAPIClient alma_client: AlmaAPIClient instance.
+    :param ASnakeClient aspace_client: ASnakeClient instance.
+    :param list[tuple[str, ModuleType]] profiles: The (name, profile) tiers, in order.
+    :param list[dict] stages: Info about each completed stage is appended to this.
+    :return: The plan, as returned by `_plan_barcodes`.
+    """
+    cache_store = CacheStore(args.cache_dir)
+    cache_max_age = _get_cache_max_age(args)
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        alma_future = executor.submit(
+            _fetch_alma_data, args, alma_client, cache_store, cache_max_age, stages
+        )
+        aspace_future = executor.submit(
+            _fetch_aspace_data, args, aspace_client, cache_store, cache_max_age, stages
         )
+        alma_items = alma_future.result()
+        aspace_containers, top_containers_with_barcodes = aspace_future.result()
 
-    # summary outputs: total number of items and top containers,
-    # and numbers of unhanded items and top containers
-    print_summary_info(
-        alma_items,
-        aspace_containers,
-        matched_aspace_containers,
-        unhandled_data,
-        args.print_output,
+    with log_stage("match", logger, stages, args.trace_memory) as stage:
+        matched_aspace_containers, unhandled_data, match_tiers = (
+            cascade_match_containers(alma_items, aspace_containers, profiles, logger)
+        )
+        stage["matched"] = len(matched_aspace_containers)
+        stage["tiers"] = dict(Counter(match_tiers.values()))
+    # add top containers with existing barcodes to unhandled data for output
+    unhandled_data["top_containers_with_barcodes"] = top_containers_with_barcodes
+
+    return {
+        "alma_item_count": len(alma_items),
+        "aspace_container_count": len(aspace_containers),
+        "matched_containers": matched_aspace_containers,
+        "unhandled_data": unhandled_data,
+        "match_tiers": match_tiers,
+    }
+
+
+def _evaluate_profile(
+    profile_module: ModuleType,
+    alma_items: list[dict],
+    aspace_containers: list[dict],
+) -> dict:
+    """Builds match keys for a collection's data with one profile,
+    and counts how they would match, without changing the data.
+
+    :param ModuleType profile_module: The matching profile.
+    :param list[dict] alma_items: The Alma items.
+    :param list[dict] aspace_containers: The ASpace top containers without barcodes.
+    :return: A dict of counts of matched records, unmatched records on each side,
+        and records with duplicate keys on each side.
+    """
+    # No logger: unparseable records are expected for the wrong profiles.
+    alma_match_data, items_with_duplicate_keys = profile_module.get_alma_match_data(
+        alma_items
+    )
+    aspace_match_data, tcs_with_duplicate_keys = profile_module.get_aspace_match_data(
+        aspace_containers
+    )
+    # Counted from the keys, as match_containers would add barcodes
+    # to top containers shared by every profile.
+    matched_keys = alma_match_data.keys() & aspace_match_data.keys()
+    return {
+        "matched": len(matched_keys),
+        "unmatched_alma_items": len(alma_match_data) - len(matched_keys),
+        "unmatched_aspace_containers": len(aspace_match_data) - len(matched_keys),
+        "items_with_duplicate_keys": len(items_with_duplicate_keys),
+        "tcs_with_duplicate_keys": len(tcs_with_duplicate_keys),
+    }
+
+
+def print_profile_evaluation(results: list[dict]) -> None:
+    """Writes a comparison of profiles to the log, and prints it as a table,
+    with the profile matching the most top containers first.
+
+    :param list[dict] results: Counts for each profile, as returned by
+        `_evaluate_profile`, with the profile name under "profile".
+    """
+    columns = [
+        ("profile", "Profile"),
+        ("matched", "Matched"),
+        ("unmatched_alma_items", "Unmatched Alma"),
+        ("unmatched_aspace_containers", "Unmatched ASpace"),
+        ("items_with_duplicate_keys", "Alma duplicates"),
+        ("tcs_with_duplicate_keys", "ASpace duplicates"),
+    ]
+    results = sorted(results, key=lambda result: result["matched"], reverse=True)
+    widths = [
+        max(len(heading), *(len(str(result[key])) for result in results))
+        for key, heading in columns
+    ]
+    rows = [[heading for _, heading in columns]] + [
+        [str(result[key]) for key, _ in columns] for result in results
+    ]
+    for row in rows:
+        print(
+            "  ".join(
+                value.ljust(width) if index == 0 else value.rjust(width)
+                for index, (value, width) in enumerate(zip(row, widths))
+            )
+        )
+    for result in results:
+        logger.info(f"Evaluated profile {result['profile']}", **result)
+
+
+def _load_profiles_to_evaluate(profile: str | None) -> dict[str, ModuleType]:
+    """Loads every registered profile, and the profiles given with `--profile`,
+    once each, however they were given, e.g. as "indicator_type_matching.py"
+    or "config.indicator_type_matching".
+
+    :param str | None profile: The `--profile` argument, which may be a cascade.
+    :return: The profile modules, by the name of the profile as first given.
+    """
+    profiles = get_registered_profiles()
+    if profile:
+        profiles += [
+            part.strip() for part in profile.split(PROFILE_SEPARATOR) if part.strip()
+        ]
+    profile_modules = {}
+    resolved_names = set()
+    for profile_name in profiles:
+        resolved_name = resolve_profile_name(profile_name)
+        if resolved_name not in resolved_names:
+            resolved_names.add(resolved_name)
+            profile_modules[Path(profile_name).name] = load_profile(profile_name)
+    return profile_modules
+
+
+def evaluate_profiles(
+    args: argparse.Namespace,
+    alma_client: AlmaAPIClient,
+    aspace_client: ASnakeClient,
+) -> list[dict]:
+    """Compares matching profiles on the collection given in the CLI arguments.
+    The collection's data is fetched once, then every registered profile
+    (and `--profile`, if set) builds its match keys from the same data,
+    so choosing a profile takes one run instead of a dry run per profile.
+    Nothing is changed in ASpace.
+
+    :param argparse.Namespace args: CLI arguments for this program.
+    :param AlmaAPIClient alma_client: AlmaAPIClient instance.
+    :param ASnakeClient aspace_client: ASnakeClient instance.
+    :return: Counts for each profile, as returned by `_evaluate_profile`,
+        with the profile name under "profile".
+    """
+    profile_modules = _load_profiles_to_evaluate(args.profile)
+
+    # Only matching data is needed, as for a dry run.
+    args = argparse.Namespace(**{**vars(args), "dry_run": True})
+    stages: list[dict] = []
+    cache_store = CacheStore(args.cache_dir)
+    cache_max_age = _get_cache_max_age(args)
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        alma_future = executor.submit(
+            _fetch_alma_data, args, alma_client, cache_store, cache_max_age, stages
+        )
+        aspace_future = executor.submit(
+            _fetch_aspace_data, args, aspace_client, cache_store, cache_max_age, stages
+        )
+        alma_items = alma_future.result()
+        aspace_containers, top_containers_with_barcodes = aspace_future.result()
+
+    results = []
+    with log_stage("evaluate", logger, stages, args.trace_memory) as stage:
+        for name, profile_module in profile_modules.items():
+            results.append(
+                {
+                    "profile": name,
+                    **_evaluate_profile(profile_module, alma_items, aspace_containers),
+                }
+            )
+        stage["profiles"] = len(results)
+
+    print(
+        f"Alma items: {len(alma_items)}, ASpace top containers: "
+        f"{len(aspace_containers)} ({len(top_containers_with_barcodes)} "
+        "more already have barcodes)"
     )
+    print_profile_evaluation(results)
+    return results
 
-    # If print_output is set, print the unhandled data
-    # to the console in a readable format.
-    if args.print_output:
-        print()
-        print_unhandled_data(unhandled_data)
 
-    # if there is any unhandled data, write it to a file
-    if unhandled_data:
-        unhandled_data_filename = f"unhandled_{logging_filename_base}.json"
-        write_to_cache(unhandled_data, unhandled_data_filename, indent=2)
-        logger.info(
-            f"Unhandled data (items and top containers remaining unmatched or with duplicate keys)"
-            f" written to {unhandled_data_filename}"
+def barcode_collection(
+    args: argparse.Namespace,
+    alma_client: AlmaAPIClient,
+    aspace_client: ASnakeClient,
+    output_filename_base: str,
+    run_id: str | None = None,
+) -> dict:
+    """Adds barcodes from Alma items to matching ASpace top containers
+    for the collection given in the CLI arguments.
+
+    Runs as a pipeline of stages: fetch, partition, key-build, match, write, report.
+    Each stage logs its elapsed time, counts and peak memory.
+    Before the write stage, the match plan is saved, and each barcode added
+    is recorded in the run's journal, so with `--resume` an interrupted run
+    skips straight to writing the barcodes it had not yet added.
+    A dry run saves its plan too, so that with `--apply_plan` a later run
+    writes exactly that plan. Both `--resume` and `--apply_plan` run
+    a revalidate stage in place of fetching and matching.
+
+    :param argparse.Namespace args: CLI arguments for this program.
+    :param AlmaAPIClient alma_client: AlmaAPIClient instance.
+    :param ASnakeClient aspace_client: ASnakeClient instance.
+    :param str output_filename_base: Used in the name of the unhandled data file.
+    :param str | None run_id: ID of this run (or the run being resumed),
+        used to name its match plan and journal. If None, neither is written.
+    :return: A dict of summary counts for the run,
+        and the names of the unhandled data file and journal (if any).
+    :raises ValueError: If resuming a run which has no journal, e.g. a dry run,
+        or whose plan is for a different collection or profile.
+    """
+    stages: list[dict] = []
+    plan_filename = get_plan_filename(run_id) if run_id else None
+    journal_filename = get_journal_filename(run_id) if run_id else None
+
+    completed_refs: set[str] = set()
+    if args.resume:
+        # A run without a journal never started adding barcodes, e.g. a dry run,
+        # whose plan should be reviewed and applied with --apply_plan instead.
+        if not journal_filename.exists():
+            raise ValueError(
+                f"Run {run_id} has no journal {journal_filename}, so cannot be resumed;"
+                f" to add the barcodes in its plan, use --apply_plan {plan_filename}"
+            )
+        # Containers the interrupted run already updated are skipped,
+        # and the rest checked, as the plan may be of any age.
+        completed_refs = {entry["uri"] for entry in iter_journal(journal_filename)}
+        plan = _load_match_plan(plan_filename, args)
+        plan = _revalidate_match_plan(args, aspace_client, plan, stages, completed_refs)
+    elif args.apply_plan:
+        plan = _load_match_plan(Path(args.apply_plan), args)
+        plan = _revalidate_match_plan(args, aspace_client, plan, stages)
+    else:
+        plan = _plan_barcodes(args, alma_client, aspace_client, stages)
+    if plan_filename and not args.resume:
+        _save_match_plan(plan_filename, args, plan)
+        if args.dry_run and not args.apply_plan:
+            message = (
+                f"Match plan written to {plan_filename}. "
+                f"To add exactly these barcodes, run again with --apply_plan {plan_filename}"
+            )
+            logger.info(message)
+            if args.print_output:
+                print(message)
+    matched_aspace_containers = plan["matched_containers"]
+    unhandled_data = plan["unhandled_data"]
+
+    with log_stage("write", logger, stages, args.trace_memory) as stage:
+        # When resuming, skip containers the interrupted run already updated.
+        pending_containers = [
+            tc for tc in matched_aspace_containers if tc["uri"] not in completed_refs
+        ]
+        stage["skipped"] = len(matched_aspace_containers) - len(pending_containers)
+        if stage["skipped"]:
+            logger.info(
+                f"Skipping {stage['skipped']} top containers updated before resuming"
+            )
+        updated_refs, failed_refs = _write_barcodes(
+            args, aspace_client, pending_containers, journal_filename
+        )
+        stage["updated"] = len(updated_refs or [])
+        stage["failed"] = len(failed_refs or {})
+    # add failed updates to unhandled data for output
+    unhandled_data.pop("failed_barcode_updates", None)
+    if failed_refs:
+        unhandled_data["failed_barcode_updates"] = [
+            {"uri": ref, "error": error} for ref, error in failed_refs.items()
+        ]
+    # Count barcodes added before resuming as updated, for a complete summary.
+    if updated_refs is not None:
+        updated_refs = [
+            tc["uri"] for tc in matched_aspace_containers if tc["uri"] in completed_refs
+        ] + updated_refs
+
+    with log_stage("report", logger, stages, args.trace_memory) as stage:
+        # summary outputs: total number of items and top containers,
+        # and numbers of unhanded items and top containers
+        print_summary_info(
+            plan["alma_item_count"],
+            plan["aspace_container_count"],
+            matched_aspace_containers,
+            unhandled_data,
+            args.print_output,
+            updated_refs,
+            failed_refs,
+            stages,
+            plan.get("match_tiers"),
         )
 
+        # If print_output is set, print the unhandled data
+        # to the console in a readable format.
+        if args.print_output:
+            print()
+            print_unhandled_data(unhandled_data)
+
+        # if there is any unhandled data, write it to a file,
+        # one line per record, tagged with the kind of issue
+        unhandled_data_filename = ""
+        stage["unhandled"] = 0
+        if unhandled_data:
+            unhandled_data_filename = f"unhandled_{output_filename_base}.jsonl"
+            stage["unhandled"] = write_jsonl(
+                (
+                    {"category": category, "record": record}
+                    for category, records in unhandled_data.items()
+                    for record in records
+                ),
+                unhandled_data_filename,
+            )
+            logger.info(
+                "Unhandled data (items and top containers remaining unmatched"
+                f" or with duplicate keys) written to {unhandled_data_filename}"
+            )
+    if failed_refs and run_id:
+        message = f"To retry failed updates later, run again with --resume {run_id}"
+        logger.info(message)
+        if args.print_output:
+            print(message)
+
+    stage_seconds = {stage["stage"]: stage["seconds"] for stage in stages}
+    return {
+        "alma_items": plan["alma_item_count"],
+        "aspace_containers": plan["aspace_container_count"],
+        "matched_containers": len(matched_aspace_containers),
+        "updated_containers": "" if updated_refs is None else len(updated_refs),
+        "failed_containers": "" if failed_refs is None else len(failed_refs),
+        "unhandled_data_file": unhandled_data_filename,
+        "plan_file": str(plan_filename) if plan_filename and not args.resume else "",
+        "journal_file": str(journal_filename) if updated_refs else "",
+        "alma_fetch_seconds": round(stage_seconds.get("fetch_alma", 0), 1),
+        "aspace_fetch_seconds": round(stage_seconds.get("fetch_aspace", 0), 1),
+    }
+
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,319 @@
+import argparse
+import asnake.logging as logging
+import csv
+
+from alma_api_client import AlmaAPIClient
+from asnake.client import ASnakeClient
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import add_alma_barcodes_to_archivesspace as barcoding
+from config.profile_compiler import resolve_profile_name
+from utils import configure_logging, load_config, write_dicts_to_csv
+from utils.alma_utils import DEFAULT_ALMA_CALLS_PER_SECOND
+from utils.aspace_utils import DEFAULT_MAX_WORKERS
+from utils.cache_utils import DEFAULT_CACHE_DIR
+from utils.journal_utils import get_run_id
+
+# Logger available globally within this module.
+# Configuration is done by configure_logging(), which is called by main().
+# Made available globally so that tests can use the same logger with their own configuration.
+logger = logging.get_logger(Path(__file__).stem)
+
+# Default number of collections barcoded at once, each in its own process.
+DEFAULT_MAX_COLLECTIONS = 2
+
+
+def _get_args() -> argparse.Namespace:
+    """Returns the command-line arguments for this program.
+
+    :return: Parsed CLI arguments.
+    """
+    parser = argparse.ArgumentParser(
+        description=(
+            "Run add_alma_barcodes_to_archivesspace.py for each collection "
+            "in a CSV export of LSC Airtable data."
+        )
+    )
+    parser.add_argument(
+        "--file_name",
+        help="CSV export of LSC Airtable data with collection identifiers.",
+        required=True,
+    )
+    parser.add_argument(
+        "--config_file",
+        help="Path to config file with ASpace and Alma info",
+        required=True,
+    )
+    parser.add_argument(
+        "--dry_run",
+        help="Dry run: do not update top containers in ArchivesSpace",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--use_db",
+        help="Get containers from database instead of API",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--trace_memory",
+        help="Log the memory used by each stage of each collection (slows the runs)",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--use_cache",
+        help="Read Alma and ASpace data from cached files (if available)",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--cache_dir",
+        help=f"Directory for cached Alma and ASpace data. Defaults to {DEFAULT_CACHE_DIR}.",
+        default=DEFAULT_CACHE_DIR,
+    )
+    parser.add_argument(
+        "--repo_id",
+        help="ArchivesSpace repository ID. Defaults to 2.",
+        default="2",
+    )
+    parser.add_argument(
+        "--batch_size",
+        help="Retrieve top containers in batches of this size; see the barcoding script.",
+        type=int,
+        required=False,
+    )
+    parser.add_argument(
+        "--bulk_update_size",
+        help="Add barcodes via the bulk barcodes endpoint; see the barcoding script.",
+        type=int,
+        required=False,
+    )
+    parser.add_argument(
+        "--max_collections",
+        help=(
+            "Maximum number of collections barcoded at once. "
+            f"Defaults to {DEFAULT_MAX_COLLECTIONS}."
+        ),
+        type=int,
+        default=DEFAULT_MAX_COLLECTIONS,
+    )
+    parser.add_argument(
+        "--max_aspace_requests",
+        help=(
+            "Maximum number of concurrent ArchivesSpace requests across all collections, "
+            f"shared equally between them. Defaults to {DEFAULT_MAX_WORKERS}."
+        ),
+        type=int,
+        default=DEFAULT_MAX_WORKERS,
+    )
+    parser.add_argument(
+        "--alma_calls_per_second",
+        help=(
+            "Maximum sustained rate of Alma API calls across all collections, "
+            f"shared equally between them. Defaults to {DEFAULT_ALMA_CALLS_PER_SECOND}."
+        ),
+        type=float,
+        default=DEFAULT_ALMA_CALLS_PER_SECOND,
+    )
+    parser.add_argument(
+        "--resource_id_column",
+        help="CSV column with the ArchivesSpace resource ID.",
+        default="ArchivesSpace Rec ID",
+    )
+    parser.add_argument(
+        "--bib_id_column",
+        help="CSV column with the Alma bib MMS ID.",
+        default="Alma Bib ID",
+    )
+    parser.add_argument(
+        "--holdings_id_column",
+        help="CSV column with the Alma holdings MMS ID.",
+        default="Alma Holdings ID",
+    )
+    parser.add_argument(
+        "--profile_column",
+        help=(
+            "CSV column with the matching profile, "
+            "e.g. `indicator_type_matching.py` or a YAML profile file."
+        ),
+        default="Profile",
+    )
+    return parser.parse_args()
+
+
+def _get_max_collections(args: argparse.Namespace) -> int:
+    """Returns the number of collections to barcode at once.
+    Each collection needs at least one ArchivesSpace request at a time,
+    so no more collections run at once than `max_aspace_requests` allows.
+
+    :param argparse.Namespace args: CLI arguments for this program.
+    :return: The number of collections to barcode at once.
+    """
+    return max(1, min(args.max_collections, args.max_aspace_requests))
+
+
+def _get_collection_argv(row: dict, args: argparse.Namespace) -> list[str] | None:
+    """Returns arguments for add_alma_barcodes_to_archivesspace.py
+    for the collection in one row of the Airtable data.
+
+    :param dict row: A row of the Airtable data.
+    :param argparse.Namespace args: CLI arguments for this program.
+    :return: A list of CLI arguments, or None if the row is missing required values.
+    """
+    resource_id = row.get(args.resource_id_column, "").strip()
+    bib_id = row.get(args.bib_id_column, "").strip()
+    holdings_id = row.get(args.holdings_id_column, "").strip()
+    profile = row.get(args.profile_column, "").strip()
+    if not (resource_id.isdigit() and bib_id and holdings_id and profile):
+        return None
+
+    # The ArchivesSpace request cap and Alma rate are split equally between
+    # the collections barcoded at once, so their totals are never exceeded.
+    max_collections = _get_max_collections(args)
+    per_collection_workers = max(1, args.max_aspace_requests // max_collections)
+    per_collection_alma_rate = args.alma_calls_per_second / max_collections
+    argv = [
+        "--resource_id",
+        resource_id,
+        "--bib_id",
+        bib_id,
+        "--holdings_id",
+        holdings_id,
+        "--profile",
+        resolve_profile_name(profile),
+        "--config_file",
+        args.config_file,
+        "--repo_id",
+        str(args.repo_id),
+        "--cache_dir",
+        args.cache_dir,
+        "--max_workers",
+        str(per_collection_workers),
+        "--alma_calls_per_second",
+        str(per_collection_alma_rate),
+    ]
+    for flag in ("dry_run", "use_db", "use_cache", "trace_memory"):
+        if getattr(args, flag):
+            argv.append(f"--{flag}")
+    for option in ("batch_size", "bulk_update_size"):
+        if getattr(args, option):
+            argv.extend([f"--{option}", str(getattr(args, option))])
+    return argv
+
+
+def _barcode_collection_in_process(argv: list[str]) -> dict:
+    """Barcodes one collection, with its own log file and unhandled data file.
+    Runs in a worker process, so logging can be configured per collection.
+
+    :param list[str] argv: CLI arguments for add_alma_barcodes_to_archivesspace.py.
+    :return: A dict summarizing the run, including any error.
+    """
+    args = barcoding._get_args(argv)
+    output_filename_base = f"{Path(barcoding.__file__).stem}_{args.resource_id}"
+    log_filename = configure_logging(output_filename_base)
+    summary = {
+        "resource_id": args.resource_id,
+        "bib_id": args.bib_id,
+        "holdings_id": args.holdings_id,
+        "profile": args.profile,
+        "status": "completed",
+        "error": "",
+        "log_file": log_filename,
+        "alma_items": "",
+        "aspace_containers": "",
+        "matched_containers": "",
+        "updated_containers": "",
+        "failed_containers": "",
+        "unhandled_data_file": "",
+        "plan_file": "",
+        "journal_file": "",
+        "alma_fetch_seconds": "",
+        "aspace_fetch_seconds": "",
+    }
+    try:
+        config = load_config(args.config_file)
+        alma_client = AlmaAPIClient(config["alma_config"]["alma_api_key"])
+        aspace_client = ASnakeClient(**config)
+        summary.update(
+            barcoding.barcode_collection(
+                args,
+                alma_client,
+                aspace_client,
+                output_filename_base,
+                get_run_id(log_filename),
+            )
+        )
+    except Exception as err:
+        barcoding.logger.exception(f"Barcoding failed: {err}")
+        summary.update(status="failed", error=str(err))
+    return summary
+
+
+def main() -> None:
+    """Barcode every collection in the LSC Airtable data
+    which has a resource ID, Alma bib and holdings IDs, and a profile,
+    then write a summary of all runs to a CSV file.
+    """
+    log_filename = configure_logging(Path(__file__).stem)
+    print(f"Logging to {log_filename}...")
+    args = _get_args()
+
+    jobs = []
+    with open(args.file_name, "r", newline="", encoding="utf-8") as file:
+        for row in csv.DictReader(file):
+            argv = _get_collection_argv(row, args)
+            if argv is None:
+                logger.info(
+                    f"Skipping {row.get('Identifier', 'row')}: "
+                    "missing resource ID, Alma IDs or profile"
+                )
+                continue
+            jobs.append(argv)
+    logger.info(f"Barcoding {len(jobs)} collections")
+    print(f"Barcoding {len(jobs)} collections...")
+
+    # One process per collection, so each gets its own log configuration.
+    max_collections = _get_max_collections(args)
+    if max_collections < args.max_collections:
+        logger.info(
+            f"Barcoding {max_collections} collections at once, "
+            f"to stay within {args.max_aspace_requests} ArchivesSpace requests"
+        )
+    results = []
+    with ProcessPoolExecutor(
+        max_workers=max_collections, max_tasks_per_child=1
+    ) as executor:
+        for summary in executor.map(_barcode_collection_in_process, jobs):
+            logger.info(
+                f"Resource {summary['resource_id']}: {summary['status']}"
+                + (f" ({summary['error']})" if summary["error"] else "")
+            )
+            print(
+                f"Resource {summary['resource_id']}: {summary['status']} "
+                f"(log: {summary['log_file']})"
+            )
+            results.append(summary)
+
+    if results:
+        output_filename = Path(args.file_name).stem + "_barcoding_summary.csv"
+        write_dicts_to_csv(Path(output_filename), results)
+        print(f"Summary written to {output_filename}")
+
+    completed = [summary for summary in results if summary["status"] == "completed"]
+    matched_count = sum(summary["matched_containers"] for summary in completed)
+    summary_info = [
+        f"Collections completed: {len(completed)} of {len(results)}",
+        f"Collections failed: {len(results) - len(completed)}",
+        f"Matched ASpace top containers: {matched_count}",
+    ]
+    if not args.dry_run:
+        updated_count = sum(summary["updated_containers"] for summary in completed)
+        failed_count = sum(summary["failed_containers"] for summary in completed)
+        summary_info.append(f"ASpace top containers updated: {updated_count}")
+        summary_info.append(f"ASpace top containers failed to update: {failed_count}")
+    for message in summary_info:
+        logger.info(message)
+        print(message)
+
+
+if __name__ == "__main__":
+    main()
@@ -9,8 +9,10 @@ from asnake.client import ASnakeClient
 
 from utils import configure_logging
 from utils.aspace_utils import (
-    get_ao_refs_for_top_container_from_db,
+    DEFAULT_BATCH_SIZE,
+    get_ao_refs_for_top_containers_from_db,
     get_container_refs_from_db,
+    get_top_containers_from_refs,
 )
 
 
@@ -54,6 +56,18 @@ def _get_args() -> argparse.Namespace:
         action="store_true",
         help="Log intended actions without updating ArchivesSpace.",
     )
+    parser.add_argument(
+        "--batch_size",
+        type=int,
+        required=False,
+        default=DEFAULT_BATCH_SIZE,
+        help=(
+            "Retrieve top containers in batches of this size, "
+            "or one request per container if 0. "
+            f"Defaults to {DEFAULT_BATCH_SIZE}, "
+            "and larger values may be capped by ArchivesSpace."
+        ),
+    )
     return parser.parse_args()
 
 
@@ -124,6 +138,7 @@ def _get_all_top_containers(
     resource_uri: str,
     resource_id: int,
     db_config: dict,
+    batch_size: int = DEFAULT_BATCH_SIZE,
 ) -> tuple[list[dict], set[str], dict[str, list[dict]]]:
     """Fetch all top containers linked to the given resource.
 
@@ -131,6 +146,8 @@ def _get_all_top_containers(
     :param str resource_uri: The URI of the resource to process.
     :param int resource_id: The ID of the resource to process.
     :param dict db_config: DB connection settings.
+    :param int batch_size: Retrieve top containers in batches of this size,
+        or one request per container if 0.
     :return: A tuple of:
         - all_tcs: full dictionaries for every top container linked to the resource.
         - existing_indicators: set of all existing indicator strings for the resource.
@@ -145,14 +162,9 @@ def _get_all_top_containers(
         f"from {resource_uri}"
     )
 
-    all_tcs: list[dict] = []
-    for ref in container_refs:
-        try:
-            tc = aspace_client.get(ref).json()
-        except Exception as err:
-            logger.error(f"Error fetching top container {ref}: {err}. Skipping.")
-            continue
-        all_tcs.append(tc)
+    all_tcs: list[dict] = get_top_containers_from_refs(
+        aspace_client, container_refs, batch_size=batch_size
+    )
 
     existing_indicators: set[str] = {tc.get("indicator", "") for tc in all_tcs}
 
@@ -235,11 +247,23 @@ def _update_archival_object(
     )
 
 
+def _get_tc_id(tc: dict) -> int:
+    """Parse the numeric ID from a top container's URI,
+    because it's much faster when querying the DB.
+    "0" is used as default to satisfy int conversion,
+    while also yielding no results from DB queries.
+
+    :param dict tc: A top container record.
+    :return: The top container ID.
+    """
+    return int(tc.get("uri", "0").split("/")[-1])
+
+
 def _relink_archival_objects(
     aspace_client: ASnakeClient,
     original_tc: dict,
     new_tc_uris: list[str],
-    db_config: dict,
+    ao_refs_by_tc_id: dict[int, list[str]],
     dry_run: bool,
 ) -> None:
     """Handles relinking archival objects from `original_tc`
@@ -248,19 +272,12 @@ def _relink_archival_objects(
     :param ASnakeClient aspace_client: An authenticated ASnakeClient instance.
     :param dict original_tc: The compound top container record being replaced.
     :param list[str] new_tc_uris: URIs of individual top containers to link.
-    :param dict db_config: DB connection settings.
+    :param dict[int, list[str]] ao_refs_by_tc_id: AO refs keyed by top container ID,
+        loaded in bulk for all compound top containers.
     :param bool dry_run: If True, log the intended updates without POSTing.
     """
-    # Parse ID from original TC URI,
-    # because it's much faster when querying the DB.
-    # "0" used as default to satisfy int conversion in subsequent line,
-    # while also yielding an empty set from db query.
     original_tc_uri = original_tc.get("uri", "0")
-    original_tc_id = int(original_tc_uri.split("/")[-1])
-
-    # There is no good way to retrieve all AOs linked to a TC via the API,
-    # so we use a database query instead.
-    ao_refs = get_ao_refs_for_top_container_from_db(db_config, original_tc_id)
+    ao_refs = ao_refs_by_tc_id.get(_get_tc_id(original_tc), [])
     if not ao_refs:
         return  # no AOs linked to the original TC, so nothing to do.
     logger.info(
@@ -282,12 +299,23 @@ def _relink_archival_objects(
         original_instances = archival_object.get("instances", [])
         new_instances = []
         instance_type = ""
+        found_original_tc = False
         for instance in original_instances:
             sub_container = instance.get("sub_container", {})
             top_container = sub_container.get("top_container", {})
             if top_container.get("ref", "") == original_tc_uri:
                 # Preserve instance type from original instance.
                 instance_type = instance.get("instance_type", "")
+                found_original_tc = True
+
+        # AO links are loaded up front for all compound TCs, so an AO may already
+        # have been relinked while processing another compound TC in this run.
+        if not found_original_tc:
+            logger.info(
+                f"Archival object {ao_ref} is no longer linked to "
+                f"{original_tc_uri}. Skipping."
+            )
+            continue
 
         # Add new instances to the AO with ref to each of the new, individual TCs,
         # with instance type preserved from original instance.
@@ -336,6 +364,7 @@ def _cleanup_compound_indicators(
     resource_id: int,
     db_config: dict,
     dry_run: bool,
+    batch_size: int = DEFAULT_BATCH_SIZE,
 ) -> None:
     """Cleanup compound box indicators for the given resource.
 
@@ -344,6 +373,8 @@ def _cleanup_compound_indicators(
     :param int resource_id: ASpace resource ID for the target collection.
     :param dict db_config: DB connection settings.
     :param bool dry_run: If True, log all intended changes without making API writes.
+    :param int batch_size: Retrieve top containers in batches of this size,
+        or one request per container if 0.
     """
     if dry_run:
         logger.info("DRY RUN--NO UPDATES WILL BE MADE")
@@ -352,7 +383,7 @@ def _cleanup_compound_indicators(
     logger.info(f"Processing resource at {resource_uri}")
 
     all_tcs, existing_indicators, tcs_by_indicator = _get_all_top_containers(
-        aspace_client, resource_uri, resource_id, db_config
+        aspace_client, resource_uri, resource_id, db_config, batch_size
     )
 
     # Regex checks for commas, numeric ranges, "&", or " and " (case-insensitive)
@@ -370,6 +401,12 @@ def _cleanup_compound_indicators(
         f"with compound indicators at {resource_uri}"
     )
 
+    # There is no good way to retrieve all AOs linked to a TC via the API,
+    # so we use a database query instead, for all compound TCs at once.
+    ao_refs_by_tc_id = get_ao_refs_for_top_containers_from_db(
+        db_config, [_get_tc_id(tc) for tc in compound_tcs]
+    )
+
     for compound_tc in compound_tcs:
         compound_uri = compound_tc.get("uri", "")
         compound_indicator = compound_tc.get("indicator", "")
@@ -435,7 +472,7 @@ def _cleanup_compound_indicators(
         # Use list of reused or new top containers to relink archival objects
         # then delete the original compound top container.
         _relink_archival_objects(
-            aspace_client, compound_tc, individual_uris, db_config, dry_run
+            aspace_client, compound_tc, individual_uris, ao_refs_by_tc_id, dry_run
         )
         _delete_top_container(aspace_client, compound_uri, dry_run)
 
@@ -470,6 +507,7 @@ def main() -> None:
         resource_id=args.resource_id,
         db_config=db_config,
         dry_run=args.dry_run,
+        batch_size=args.batch_size,
     )
 
 
@@ -60,3 +60,105 @@ def match_containers(
     }
 
     return matched_aspace_containers, unhandled_data
+
+
+def cascade_match_containers(
+    alma_items: list[dict],
+    aspace_containers: list[dict],
+    profiles: list[tuple[str, Any]],
+    logger: Optional[Any] = None,
+) -> tuple[list[dict], dict[str, list], dict[str, str]]:
+    """
+    Matches Alma items with ASpace top containers with an ordered list of profiles,
+    for collections which mix layouts. Each profile is a tier: it builds keys
+    for the items and top containers which earlier tiers left unmatched,
+    and matches them as match_containers does.
+
+    Args:
+        alma_items: list of Alma items (JSON from Alma API)
+        aspace_containers: list of ASpace top containers (JSON from ASpace API)
+        profiles: list of (name, profile module) tuples, in the order to try them
+    Returns:
+        tuple containing three elements:
+            matched_aspace_containers - list of JSON data elements with barcodes added,
+            unhandled_data - dict containing:
+                unmatched_alma_items - list of items unmatched by every tier,
+                    other than those with duplicate keys,
+                unmatched_aspace_containers - the same, for top containers,
+                items_with_duplicate_keys - (tier name, pid, *key) tuples for items
+                    with duplicate keys in a tier, which no tier matched,
+                tcs_with_duplicate_keys - the same, for top containers (by uri),
+            match_tiers - dict of the name of the tier which matched each container,
+                by container uri
+    """
+    matched_aspace_containers: list[dict] = []
+    match_tiers: dict[str, str] = {}
+    items_with_duplicate_keys: list[tuple] = []
+    tcs_with_duplicate_keys: list[tuple] = []
+    remaining_alma_items = alma_items
+    remaining_aspace_containers = aspace_containers
+
+    for name, profile in profiles:
+        alma_match_data, tier_items_with_duplicate_keys = profile.get_alma_match_data(
+            remaining_alma_items, logger
+        )
+        aspace_match_data, tier_tcs_with_duplicate_keys = profile.get_aspace_match_data(
+            remaining_aspace_containers, logger
+        )
+        matched_keys = alma_match_data.keys() & aspace_match_data.keys()
+        matched_pids = {alma_match_data[key].get("pid") for key in matched_keys}
+        tier_matched_containers, _ = match_containers(
+            alma_match_data, aspace_match_data, logger
+        )
+        for tc in tier_matched_containers:
+            match_tiers[tc.get("uri")] = name
+        matched_aspace_containers.extend(tier_matched_containers)
+        if logger:
+            logger.info(
+                f"Matched {len(tier_matched_containers)} top containers with {name}"
+            )
+
+        # keep duplicate key bookkeeping for each tier, tagged with the tier
+        items_with_duplicate_keys.extend(
+            (name, *item) for item in tier_items_with_duplicate_keys
+        )
+        tcs_with_duplicate_keys.extend(
+            (name, *tc) for tc in tier_tcs_with_duplicate_keys
+        )
+
+        # later tiers only see what this tier left unmatched
+        remaining_alma_items = [
+            item for item in remaining_alma_items if item.get("pid") not in matched_pids
+        ]
+        remaining_aspace_containers = [
+            tc for tc in remaining_aspace_containers if tc.get("uri") not in match_tiers
+        ]
+
+    # records with duplicate keys in one tier may have been matched by another;
+    # those which weren't are reported as duplicates, as with a single profile
+    remaining_pids = {item.get("pid") for item in remaining_alma_items}
+    remaining_uris = {tc.get("uri") for tc in remaining_aspace_containers}
+    items_with_duplicate_keys = [
+        item for item in items_with_duplicate_keys if item[1] in remaining_pids
+    ]
+    tcs_with_duplicate_keys = [
+        tc for tc in tcs_with_duplicate_keys if tc[1] in remaining_uris
+    ]
+    duplicate_pids = {item[1] for item in items_with_duplicate_keys}
+    duplicate_uris = {tc[1] for tc in tcs_with_duplicate_keys}
+    unhandled_data: dict[str, list] = {
+        "unmatched_alma_items": [
+            item
+            for item in remaining_alma_items
+            if item.get("pid") not in duplicate_pids
+        ],
+        "unmatched_aspace_containers": [
+            tc
+            for tc in remaining_aspace_containers
+            if tc.get("uri") not in duplicate_uris
+        ],
+        "items_with_duplicate_keys": items_with_duplicate_keys,
+        "tcs_with_duplicate_keys": tcs_with_duplicate_keys,
+    }
+
+    return matched_aspace_containers, unhandled_data, match_tiers
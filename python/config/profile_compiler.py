@@ -0,0 +1,384 @@
+r"""
+Compiles declarative matching profiles into match data functions.
+
+A profile spec is a dict (or a YAML/JSON file) describing how to build
+a match key from an Alma item and from an ASpace top container:
+
+    {
+        # Parts of the match key, in order. A single part gives a plain string key.
+        "key": ["indicator", "type"],
+        "alma": {
+            # Record field to parse with the patterns below.
+            "source": "description",
+            # How to parse the source: a list of alternatives, each either
+            # - a regex with a named group for each key part it provides,
+            #   which must match exactly once, e.g.
+            #   {"pattern": r"(?P<indicator>\d+)(?P<series>\w+)"}, or
+            # - a split on a delimiter, naming the key part at each position
+            #   (null to skip one), or splitting it further, e.g.
+            #   {"split": ".", "groups": ["type", "indicator"]} for "box.001".
+            # The first alternative whose optional `when` regex matches the start
+            # of the source is used.
+            "patterns": [{"split": ".", "groups": ["type", "indicator"]}],
+            # Key parts taken as-is from record fields.
+            "fields": {},
+            # Normalization rules applied to each key part, in order.
+            "normalize": {"indicator": ["strip_leading_zeros", "remove_restricted"]},
+            # Key parts which must not be empty once normalized.
+            "required": [],
+        },
+        "aspace": {
+            "fields": {"indicator": "indicator", "type": "type"},
+        },
+    }
+
+`compile_profile` turns a spec into `get_alma_match_data` and `get_aspace_match_data`
+functions, with the same contract as hand-written profiles. The spec is checked and
+its regexes compiled once, into a key-extraction function built from small parsing
+closures and the functions in `NORMALIZATION_RULES`.
+Profiles can only read the fields kept by the compact records used for matching
+(see `utils.record_utils`). Records whose source does not match a pattern
+(or gives an empty required key part) are keyed by their own ID,
+so they match nothing and are reported as unhandled.
+"""
+
+import json
+import re
+import yaml
+
+from importlib import import_module
+from pathlib import Path
+from types import ModuleType
+from typing import Optional, Any, Callable, Iterable
+from utils.record_utils import AlmaItemRecord, TopContainerRecord
+
+DECLARATIVE_PROFILE_SUFFIXES = {".yml", ".yaml", ".json"}
+
+# Separates the profiles of a cascade, e.g. "indicator_type_matching.py,indicator_only_matching.py".
+PROFILE_SEPARATOR = ","
+
+# Directory with the registered profiles: the profile modules and profile files here.
+PROFILES_DIR = Path(__file__).parent
+
+
+def _remove_restricted(value: str) -> str:
+    return value[:-11] if value.endswith(" RESTRICTED") else value
+
+
+# Normalization rules, applied to a non-empty key part.
+NORMALIZATION_RULES: dict[str, Callable[[str], str]] = {
+    "strip_leading_zeros": lambda value: value.lstrip("0"),
+    "remove_restricted": _remove_restricted,
+    "upper": str.upper,
+    "lower": str.lower,
+    "strip": str.strip,
+}
+
+# How each side identifies its records and describes them in log messages,
+# and the fields profiles can read, which are those kept by its compact records.
+SIDES = {
+    "alma": {
+        "id_field": "pid",
+        "record": "Alma item",
+        "source": "description",
+        "record_fields": AlmaItemRecord.__slots__,
+    },
+    "aspace": {
+        "id_field": "uri",
+        "record": "top container",
+        "source": "indicator",
+        "record_fields": TopContainerRecord.__slots__,
+    },
+}
+
+
+def _compile_pattern(
+    pattern: re.Pattern, key_parts: list[str]
+) -> Callable[[str, dict], bool]:
+    """Returns a function which matches a regex against a value, and sets
+    the key parts it has groups for. The function returns False unless
+    the regex matches exactly once.
+    """
+    parts = [part for part in key_parts if part in pattern.groupindex]
+    # A pattern anchored at the start can only match once; others must be checked.
+    anchored = pattern.pattern.startswith("^") and not pattern.flags & re.MULTILINE
+
+    def parse(value: str, key: dict) -> bool:
+        if anchored:
+            match = pattern.match(value)
+            if match is None:
+                return False
+        else:
+            match = pattern.search(value)
+            if match is None or pattern.search(value, match.end()):
+                return False
+        for part in parts:
+            key[part] = match.group(part)
+        return True
+
+    return parse
+
+
+def _compile_split(
+    split_spec: dict, key_parts: list[str]
+) -> tuple[Callable[[str, dict], bool], set[str]]:
+    """Returns a function which splits a value on a delimiter, and sets the key parts
+    at each position, splitting positions further as the spec says.
+    The function returns False if there are too few positions.
+
+    :return: A tuple of (the function, the key parts it sets).
+    """
+    delimiter = split_spec["split"]
+    groups = split_spec["groups"]
+    assigned = set()
+    positions = []
+    nested_splits = []
+    for position, group in enumerate(groups):
+        if isinstance(group, dict):
+            nested_split, nested_parts = _compile_split(group, key_parts)
+            nested_splits.append((position, nested_split))
+            assigned |= nested_parts
+        elif group is not None and group in key_parts:
+            positions.append((position, group))
+            assigned.add(group)
+
+    def parse(value: str, key: dict) -> bool:
+        # Only the positions named are needed, so the rest is left unsplit.
+        tokens = value.split(delimiter, len(groups))
+        if len(tokens) < len(groups):
+            return False
+        for position, part in positions:
+            key[part] = tokens[position]
+        for position, nested_split in nested_splits:
+            if not nested_split(tokens[position], key):
+                return False
+        return True
+
+    return parse, assigned
+
+
+def _compile_key_function(
+    side: str, spec: dict, key_parts: list[str]
+) -> Callable[[dict], tuple | str | None]:
+    """Returns a function which extracts the match key from a record,
+    or returns None if the record cannot be parsed.
+    """
+    source = spec.get("source", SIDES[side]["source"])
+    fields = spec.get("fields", {})
+    for field in (source, *fields.values()):
+        if field not in SIDES[side]["record_fields"]:
+            raise ValueError(
+                f"Cannot read {field!r}, which is not kept for matching ({side});"
+                f" use one of {', '.join(SIDES[side]['record_fields'])}"
+            )
+
+    # Alternatives as (`when` regex or None, parse function) tuples.
+    alternatives = []
+    parsed_parts = set()
+    for pattern_spec in spec.get("patterns", []):
+        when = re.compile(pattern_spec["when"]) if "when" in pattern_spec else None
+        if "split" in pattern_spec:
+            parse, parts = _compile_split(pattern_spec, key_parts)
+        else:
+            pattern = re.compile(pattern_spec["pattern"])
+            parse = _compile_pattern(pattern, key_parts)
+            parts = set(pattern.groupindex) & set(key_parts)
+        alternatives.append((when, parse))
+        parsed_parts |= parts
+        if when is None:
+            break  # later patterns could never be used
+
+    field_parts = [(part, fields[part]) for part in key_parts if part in fields]
+    for part in key_parts:
+        if part not in fields and part not in parsed_parts:
+            raise ValueError(
+                f"No pattern group or field for key part {part!r} ({side})"
+            )
+
+    normalizers = []
+    for part, rule_names in spec.get("normalize", {}).items():
+        if part not in key_parts:
+            raise ValueError(
+                f"Cannot normalize {part!r}, which is not a key part ({side})"
+            )
+        for rule_name in rule_names:
+            if rule_name not in NORMALIZATION_RULES:
+                raise ValueError(f"Unknown normalization rule {rule_name!r} ({side})")
+        normalizers.append(
+            (part, [NORMALIZATION_RULES[rule_name] for rule_name in rule_names])
+        )
+
+    required = spec.get("required", [])
+    for part in required:
+        if part not in key_parts:
+            raise ValueError(
+                f"Cannot require {part!r}, which is not a key part ({side})"
+            )
+
+    def get_key(record: dict) -> tuple | str | None:
+        key = dict.fromkeys(key_parts)
+        if alternatives:
+            value = record.get(source) or ""
+            for when, parse in alternatives:
+                if when is None or when.match(value):
+                    if not parse(value, key):
+                        return None
+                    break
+            else:
+                return None
+        for part, field in field_parts:
+            key[part] = record.get(field)
+        for part, rules in normalizers:
+            if key[part]:
+                for rule in rules:
+                    key[part] = rule(key[part])
+        for part in required:
+            if not key[part]:
+                return None
+        if len(key_parts) == 1:
+            return key[key_parts[0]]
+        return tuple(key.values())
+
+    return get_key
+
+
+def _compile_match_data_function(
+    side: str, spec: dict, key_parts: list[str]
+) -> Callable[[Iterable[dict], Optional[Any]], tuple[dict, list[tuple]]]:
+    get_key = _compile_key_function(side, spec, key_parts)
+    source = spec.get("source", SIDES[side]["source"])
+    id_field = SIDES[side]["id_field"]
+    record_name = SIDES[side]["record"]
+    single_part = len(key_parts) == 1
+
+    def get_match_data(
+        records: Iterable[dict], logger: Optional[Any] = None
+    ) -> tuple[dict, list[tuple]]:
+        match_data = {}
+        records_with_duplicate_keys = []
+        for record in records:
+            key = get_key(record)
+            # if the record can't be parsed, key it by its ID, which is unique,
+            # so it won't match anything, and will be reported as unhandled data
+            if key is None:
+                if logger:
+                    logger.error(
+                        f"{record_name.capitalize()} {record.get(id_field)} has an"
+                        f" incorrect {source} format: {record.get(source)}."
+                    )
+                match_data[record.get(id_field)] = record
+                continue
+            # check for duplicates
+            if key in match_data:
+                previous_record = match_data.pop(key)
+                if logger:
+                    logger.error(
+                        f"Duplicate {record_name} key: {key}"
+                        f" for {record.get(id_field)}."
+                        f" Existing {record_name}: {previous_record.get(id_field)}."
+                        " Skipping both."
+                    )
+                parts = (key,) if single_part else key
+                records_with_duplicate_keys.append((record.get(id_field), *parts))
+                records_with_duplicate_keys.append(
+                    (previous_record.get(id_field), *parts)
+                )
+                continue
+            match_data[key] = record
+        return match_data, records_with_duplicate_keys
+
+    return get_match_data
+
+
+def compile_profile(spec: dict) -> tuple[Callable, Callable]:
+    """Compiles a declarative profile spec into match data functions.
+
+    :param dict spec: The profile spec; see the module docstring.
+    :return: A tuple of (get_alma_match_data, get_aspace_match_data) functions.
+    :raises ValueError: If the spec is invalid.
+    """
+    key_parts = list(spec["key"])
+    get_alma_match_data = _compile_match_data_function("alma", spec["alma"], key_parts)
+    get_aspace_match_data = _compile_match_data_function(
+        "aspace", spec["aspace"], key_parts
+    )
+    return get_alma_match_data, get_aspace_match_data
+
+
+def resolve_profile_name(profile: str) -> str:
+    """Returns the name a matching profile is loaded by, so one profile given
+    in different ways has one name: the module name for a profile module,
+    and the absolute path for a declarative profile file.
+    A comma-separated cascade of profiles is resolved profile by profile.
+
+    :param str profile: The profile, e.g. "indicator_type_matching.py",
+        "indicator_type_matching" or "config.indicator_type_matching".
+    :return: The resolved name, e.g. "config.indicator_type_matching".
+    """
+    if PROFILE_SEPARATOR in profile:
+        return PROFILE_SEPARATOR.join(
+            resolve_profile_name(part.strip())
+            for part in profile.split(PROFILE_SEPARATOR)
+            if part.strip()
+        )
+    path = Path(profile)
+    if path.suffix in DECLARATIVE_PROFILE_SUFFIXES:
+        return str(path.resolve())
+    # A filename, or the bare name of a module in `config`.
+    if path.suffix == ".py" or "." not in profile:
+        return f"config.{path.stem}"
+    return profile
+
+
+def load_profile(profile: str) -> ModuleType:
+    """Loads a matching profile, which may be a declarative profile file
+    (YAML or JSON), a module name, or the name or filename of a module in `config`.
+
+    :param str profile: The profile, e.g. "config.indicator_type_matching",
+        "indicator_type_matching.py" or "profiles/my_collection.yml".
+    :return: A module with `get_alma_match_data` and `get_aspace_match_data`.
+    """
+    suffix = Path(profile).suffix
+    if suffix in DECLARATIVE_PROFILE_SUFFIXES:
+        with open(profile, "r") as f:
+            spec = json.load(f) if suffix == ".json" else yaml.safe_load(f)
+        module = ModuleType(Path(profile).stem)
+        module.PROFILE = spec
+        module.get_alma_match_data, module.get_aspace_match_data = compile_profile(spec)
+        return module
+    return import_module(resolve_profile_name(profile))
+
+
+def get_registered_profiles() -> list[str]:
+    """Returns the registered profiles: the modules in `config` which define
+    match data functions, and any declarative profile files there.
+
+    :return: Profile filenames, e.g. "indicator_type_matching.py", sorted by name,
+        which can be passed to `load_profile`.
+    """
+    profiles = []
+    for path in sorted(PROFILES_DIR.iterdir()):
+        if path.suffix in DECLARATIVE_PROFILE_SUFFIXES:
+            profiles.append(str(path))
+        elif path.suffix == ".py" and not path.name.startswith("_"):
+            module = load_profile(path.name)
+            if hasattr(module, "get_alma_match_data") and hasattr(
+                module, "get_aspace_match_data"
+            ):
+                profiles.append(path.name)
+    return profiles
+
+
+def load_profiles(profiles: str) -> list[tuple[str, ModuleType]]:
+    """Loads a comma-separated list of matching profiles, to be applied in order
+    as the tiers of a cascade (see `cascade_match_containers`).
+
+    :param str profiles: The profiles, e.g.
+        "indicator_type_matching.py,indicator_only_matching.py", or a single profile.
+    :return: A list of (profile, module) tuples, as loaded by `load_profile`.
+    """
+    return [
+        (profile.strip(), load_profile(profile.strip()))
+        for profile in profiles.split(PROFILE_SEPARATOR)
+        if profile.strip()
+    ]
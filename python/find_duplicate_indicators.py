@@ -5,6 +5,7 @@ from asnake.client import ASnakeClient
 from pathlib import Path
 
 from utils import configure_logging, load_config, write_dicts_to_csv
+from utils.aspace_utils import get_top_containers_from_db
 
 # Logger available globally within this module.
 # Configuration is done by configure_logging(), which is called by main().
@@ -40,6 +41,12 @@ def _get_args() -> argparse.Namespace:
         help="AS collection ID to end checking at. Only collections with IDs less than or equal "
         "to this will be checked.",
     )
+    parser.add_argument(
+        "--use_db",
+        action="store_true",
+        help="Get container indicators, types and locations from the database "
+        "in one query per collection, instead of one API call per container.",
+    )
     return parser.parse_args()
 
 
@@ -80,6 +87,18 @@ def get_collection_title(aspace_client: ASnakeClient, collection_id: str) -> str
     return collection.get("title")
 
 
+def get_location_titles_from_container(container: dict) -> list[str]:
+    """Given container data with resolved locations, as returned by
+    `get_top_containers_from_db`, returns a list of names for the linked locations.
+
+    :param dict container: Top container data with resolved `container_locations`.
+    """
+    return [
+        loc.get("_resolved", {}).get("title") or "Unknown Location"
+        for loc in container.get("container_locations", [])
+    ]
+
+
 def get_indicator_and_type_from_container_uri(
     aspace_client: ASnakeClient, container_uri: str
 ) -> tuple[str, str]:
@@ -212,6 +231,10 @@ def main() -> None:
     config = load_config(args.config_file)
     base_url = config.get("baseurl", "")
     aspace_client = ASnakeClient(**config)
+    db_config = config.get("database")
+    if args.use_db and not db_config:
+        logger.error("DB connection settings are required with --use_db.")
+        return
 
     # Check that provided start, end, and specific collection IDs make sense together.
     # If collection_id is provided, we should not have start_collection_id or end_collection_id.
@@ -256,8 +279,17 @@ def main() -> None:
         logger.info(
             f"Checking collection {collection_title} (ID: {collection_id}) for duplicates."
         )
-        # Get all containers in the collection
-        container_refs = get_containers_in_collection(aspace_client, collection_id)
+        # Get all containers in the collection.
+        # With --use_db, indicator, type and locations for every container
+        # come back from a single query, keyed by container URI.
+        if args.use_db:
+            containers_by_ref = {
+                tc["uri"]: tc
+                for tc in get_top_containers_from_db(db_config, int(collection_id))
+            }
+            container_refs = set(containers_by_ref)
+        else:
+            container_refs = get_containers_in_collection(aspace_client, collection_id)
         logger.info(
             f"Found {len(container_refs)} containers in collection "
             f"{collection_title} (ID: {collection_id})."
@@ -268,9 +300,13 @@ def main() -> None:
         # Create a dictionary where the key is a tuple of (indicator, type)
         # and the value is a list of container URIs that have that indicator and type
         for container_ref in container_refs:
-            tc_indicator, tc_type = get_indicator_and_type_from_container_uri(
-                aspace_client, container_ref
-            )
+            if args.use_db:
+                tc_indicator = containers_by_ref[container_ref].get("indicator")
+                tc_type = containers_by_ref[container_ref].get("type")
+            else:
+                tc_indicator, tc_type = get_indicator_and_type_from_container_uri(
+                    aspace_client, container_ref
+                )
             key = (tc_indicator, tc_type)
             if key not in indicator_type_pairs_seen:
                 indicator_type_pairs_seen[key] = []
@@ -297,9 +333,14 @@ def main() -> None:
                     f"in collection {collection_id} ({len(container_uri_list)} occurrences)"
                 )
                 for container_ref in container_uri_list:
-                    locations_refs = get_locations_from_container_uri(
-                        aspace_client, container_ref
-                    )
+                    if args.use_db:
+                        locations_refs = get_location_titles_from_container(
+                            containers_by_ref[container_ref]
+                        )
+                    else:
+                        locations_refs = get_locations_from_container_uri(
+                            aspace_client, container_ref
+                        )
 
                     tcs_with_duplicates.append(
                         {
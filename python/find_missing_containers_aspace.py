@@ -6,8 +6,12 @@ from asnake.client import ASnakeClient
 from pathlib import Path
 
 from utils import load_config, write_dicts_to_csv
-from utils.alma_utils import get_alma_items_from_alma
-from utils.aspace_utils import get_container_refs_from_db
+from utils.alma_utils import iter_alma_items_from_alma
+from utils.aspace_utils import get_top_containers_from_db
+from utils.record_utils import (
+    compact_alma_items,
+    compact_top_containers,
+)
 
 from config.base_match import match_containers
 from config.indicator_type_matching import get_aspace_match_data, get_alma_match_data
@@ -76,28 +80,18 @@ def _get_args() -> argparse.Namespace:
 
 
 def _get_all_top_containers_for_resource(
-    aspace_client: ASnakeClient,
     db_config: dict,
     resource_id: int,
 ) -> list[dict]:
     """Fetch all top containers linked to the given resource.
+    This report only needs the indicator and type of each container,
+    so a database projection is used instead of fetching full records via the API.
 
-    :param ASnakeClient aspace_client: An authenticated ASnakeClient instance.
     :param dict db_config: DB connection settings.
     :param int resource_id: The ID of the resource to process.
-    :return: A list of top container dictionaries.
+    :return: A list of compact top container records.
     """
-    container_refs = get_container_refs_from_db(db_config, resource_id)
-
-    all_tcs: list[dict] = []
-    for ref in container_refs:
-        try:
-            tc = aspace_client.get(ref).json()
-        except Exception as err:
-            print(f"Error fetching top container {ref}: {err}. Skipping.")
-            continue
-        all_tcs.append(tc)
-    return all_tcs
+    return compact_top_containers(get_top_containers_from_db(db_config, resource_id))
 
 
 def _get_aspace_resource_info(
@@ -185,7 +179,7 @@ def main() -> None:
 
     # Get all top containers for the given collection from ASpace
     aspace_top_containers = _get_all_top_containers_for_resource(
-        aspace_client, db_config, args.resource_id
+        db_config, args.resource_id
     )
     print(
         f"Fetched {len(aspace_top_containers)} "
@@ -203,7 +197,11 @@ def main() -> None:
     # Now get all items for the given collection from Alma
     alma_api_key = config["alma_config"]["alma_api_key"]
     alma_client = AlmaAPIClient(alma_api_key)
-    alma_items = get_alma_items_from_alma(alma_client, args.bib_id, args.holdings_id)
+    # Keep only the fields used for matching, as each page of items arrives,
+    # so the complete items for the collection are never all held at once.
+    alma_items = compact_alma_items(
+        iter_alma_items_from_alma(alma_client, args.bib_id, args.holdings_id)
+    )
     print(
         f"Fetched {len(alma_items)} "
         f"item{'s' if len(alma_items) > 1 else ''} from Alma"
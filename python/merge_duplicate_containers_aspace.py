@@ -3,13 +3,14 @@ import argparse
 from asnake import logging
 from asnake.client import ASnakeClient
 from asnake.jsonmodel import JM
-from collections import defaultdict
 from pathlib import Path
 
 from utils import configure_logging, load_config
 from utils.aspace_utils import (
-    get_container_refs_from_db,
-    get_ao_refs_for_top_container_from_db,
+    DEFAULT_BATCH_SIZE,
+    get_ao_titles_for_top_containers_from_db,
+    get_container_rankings_from_db,
+    get_top_containers_from_refs,
 )
 
 # Logger available globally within this module.
@@ -53,71 +54,96 @@ def _get_args() -> argparse.Namespace:
     return parser.parse_args()
 
 
-def _get_tcs_grouped_by_type_and_indicator(
+def _get_tcs_for_duplicate_groups(
     aspace_client: ASnakeClient,
-    db_config: dict,
-    resource_id: int,
-) -> defaultdict[tuple[str, str], list[dict]]:
-    """Get all top containers in the resource grouped by (type, indicator).
+    duplicate_groups: list[tuple[str, str, list[dict]]],
+) -> dict[str, dict]:
+    """Get the full records of the top containers in the duplicate groups,
+    which are needed only to check their location data.
 
     :param ASnakeClient aspace_client: An authenticated ASnakeClient instance.
+    :param list duplicate_groups: Duplicate groups as returned by `_get_duplicate_groups`.
+    :return: A dict with top container URIs as keys, and top container records as values.
+    """
+    container_refs = [tc["uri"] for _, _, tcs in duplicate_groups for tc in tcs]
+    tcs_by_uri = {
+        tc["uri"]: tc
+        for tc in get_top_containers_from_refs(
+            aspace_client, container_refs, batch_size=DEFAULT_BATCH_SIZE
+        )
+    }
+    logger.info(f"Fetched {len(tcs_by_uri)} top containers in duplicate groups")
+    return tcs_by_uri
+
+
+def _get_aos_for_duplicate_groups(
+    db_config: dict,
+    duplicate_groups: list[tuple[str, str, list[dict]]],
+) -> dict[int, list[dict]]:
+    """Get the URI and title of the archival objects linked to every top container
+    in every duplicate group, using a handful of bulk DB queries rather than
+    one query per top container, or one API request per archival object.
+
     :param dict db_config: DB connection settings.
-    :param int resource_id: The ID of the resource to process.
-    :return: A dictionary with (type, indicator) keys, and lists of top container records as values.
+    :param list duplicate_groups: Duplicate groups as returned by `_get_duplicate_groups`.
+    :return: A dict with top container IDs as keys,
+        and lists of `{"uri": ..., "title": ...}` dicts as values.
     """
-    container_refs = get_container_refs_from_db(db_config, resource_id)
+    tc_ids = [
+        int(tc.get("uri", "0").split("/")[-1])
+        for _, _, tcs in duplicate_groups
+        for tc in tcs
+    ]
+    aos_by_tc_id = get_ao_titles_for_top_containers_from_db(db_config, tc_ids)
     logger.info(
-        f"Fetched {len(container_refs)} container{'s' if len(container_refs) > 1 else ''} "
-        f"for resource ID {resource_id}"
+        f"Fetched archival object titles for {len(aos_by_tc_id)} top containers "
+        "in duplicate groups"
     )
+    return aos_by_tc_id
 
-    # Group top containers by (type, indicator) to identify duplicates
-    tcs_grouped_by_type_and_indicator: defaultdict[tuple[str, str], list[dict]] = (
-        defaultdict(list)
-    )
-    for ref in container_refs:
-        try:
-            response = aspace_client.get(ref)
-            response.raise_for_status()
-            tc = response.json()
-        except Exception as err:
-            logger.error(f"Error fetching top container {ref}: {err}. Skipping.")
-            continue
-        type = tc.get("type", "")
-        indicator = tc.get("indicator", "")
-        tcs_grouped_by_type_and_indicator[(type, indicator)].append(tc)
-    return tcs_grouped_by_type_and_indicator
 
-
-def _resolve_aos_for_tcs(
-    aspace_client: ASnakeClient, db_config: dict, tcs: list[dict]
+def _attach_aos_to_tcs(
+    aos_by_tc_id: dict[int, list[dict]],
+    tcs: list[dict],
 ) -> list[dict]:
-    """Resolve archival object refs to archival object dicts for a list of top container records.
+    """Attach the archival objects linked to each top container in a list,
+    as compact `{"uri": ..., "title": ...}` dicts, in a temporary field.
 
-    :param ASnakeClient aspace_client: An authenticated ASnakeClient instance.
-    :param dict db_config: DB connection settings.
+    :param dict[int, list[dict]] aos_by_tc_id: Archival objects keyed by top container ID,
+        as returned by `_get_aos_for_duplicate_groups`.
     :param list[dict] tcs: List of top container records.
     :return: A list of top container records
         with related archival object dicts stored in a temporary field.
     """
     for tc in tcs:
-        tc["_related_aos_temp"] = []
         tc_id = int(tc.get("uri", "0").split("/")[-1])
-        ao_refs = get_ao_refs_for_top_container_from_db(db_config, tc_id)
-        for ao_ref in ao_refs:
-            try:
-                response = aspace_client.get(ao_ref)
-                response.raise_for_status()
-                archival_object = response.json()
-                tc["_related_aos_temp"].append(archival_object)
-            except Exception as err:
-                logger.error(
-                    f"Error fetching archival object {ao_ref}: {err}. Skipping."
-                )
-                continue
+        tc["_related_aos_temp"] = aos_by_tc_id.get(tc_id, [])
     return tcs
 
 
+def _get_fetched_tcs(
+    tcs_by_uri: dict[str, dict],
+    tcs: list[dict],
+) -> list[dict] | None:
+    """Get the full records of the top containers in a duplicate group.
+    If any could not be fetched, its location data can't be checked,
+    so an error is logged and None returned, to skip the whole group.
+
+    :param dict[str, dict] tcs_by_uri: Top container records keyed by URI,
+        as returned by `_get_tcs_for_duplicate_groups`.
+    :param list[dict] tcs: The top container rankings of a duplicate group.
+    :return: A list of top container records, or None if any could not be fetched.
+    """
+    unfetched_refs = [tc["uri"] for tc in tcs if tc["uri"] not in tcs_by_uri]
+    if unfetched_refs:
+        logger.error(
+            f"Could not fetch top container(s) {unfetched_refs} "
+            "to check for location data; skipping group"
+        )
+        return None
+    return [tcs_by_uri[tc["uri"]] for tc in tcs]
+
+
 def _has_location_data(tcs: list[dict]) -> bool:
     """Check for location data on a list of top container records,
     logging a warning and returning True if found, False otherwise.
@@ -147,7 +173,8 @@ def _has_recent_accession_keywords(tcs: list[dict]) -> bool:
     for tc in tcs:
         for ao in tc["_related_aos_temp"]:
             if any(
-                keyword in ao["title"].lower() for keyword in recent_accession_keywords
+                keyword in (ao.get("title") or "").lower()
+                for keyword in recent_accession_keywords
             ):
                 logger.warning("Manual review required")
                 return True
@@ -160,7 +187,8 @@ def _determine_canonical_tc(tcs: list[dict]) -> tuple[dict, list[dict]]:
     Uses the record with the most related archival objects,
     or the oldest creation time if there are ties.
 
-    :param list[dict] tcs: List of top container records.
+    :param list[dict] tcs: List of top container rankings,
+        with `ao_count` and `create_time`, as returned by `_get_duplicate_groups`.
     :return: A tuple of the canonical top container and the remaining duplicate TCs.
     """
     # Had help from LLM for this concise implementation.
@@ -170,7 +198,7 @@ def _determine_canonical_tc(tcs: list[dict]) -> tuple[dict, list[dict]]:
     canonical = min(
         tcs,
         key=lambda tc: (
-            -len(tc.get("_related_aos_temp", [])),
+            -tc.get("ao_count", 0),
             # If a TC is missing the `create_time` field,
             # default to a value that sorts after TCs with a create time
             tc.get("create_time", "9999-01-01T00:00:00Z"),
@@ -240,6 +268,10 @@ def _print_summary(summary: dict, dry_run: bool) -> None:
         f"{'*' * 5} {'DRY RUN' if dry_run else ''} SUMMARY {'*' * 5}",
         f"Total duplicate groups: {summary['Total duplicate groups']}",
         f"Groups with location data: {summary['Groups with location data']}",
+        (
+            f"Groups with unfetched top containers:"
+            f" {summary['Groups with unfetched top containers']}"
+        ),
         (
             f"Groups with recent accession keywords:"
             f" {summary['Groups with recent accession keywords']}"
@@ -260,26 +292,29 @@ def _print_summary(summary: dict, dry_run: bool) -> None:
 
 
 def _get_duplicate_groups(
-    aspace_client: ASnakeClient,
     db_config: dict,
     resource_id: int,
 ) -> list[tuple[str, str, list[dict]]]:
-    """Retrieve top containers in the resource
-    and identify duplicate groups as those with the same type and indicator.
+    """Identify duplicate groups as top containers in the resource
+    with the same type and indicator, using a single aggregate DB query
+    which also returns the values used to choose the canonical top container.
 
-    :param ASnakeClient aspace_client: An authenticated ASnakeClient instance.
     :param dict db_config: DB connection settings.
     :param int resource_id: The ID of the resource to process.
     :return: A list of tuples representing duplicate groups,
-    comprising type, indicator, and a list of top container records.
+    comprising type, indicator, and a list of top container rankings
+    (dicts with `uri`, `ao_count` and `create_time`).
     """
-    tcs_grouped_by_type_and_indicator = _get_tcs_grouped_by_type_and_indicator(
-        aspace_client, db_config, resource_id
+    rankings = get_container_rankings_from_db(db_config, resource_id)
+    container_count = sum(len(tcs) for tcs in rankings.values())
+    logger.info(
+        f"Fetched {container_count} container{'s' if container_count > 1 else ''} "
+        f"for resource ID {resource_id}"
     )
 
     duplicate_groups: list[tuple[str, str, list[dict]]] = [
         (type, indicator, tcs)
-        for (type, indicator), tcs in tcs_grouped_by_type_and_indicator.items()
+        for (type, indicator), tcs in rankings.items()
         if len(tcs) > 1
     ]
     # Now sort the duplicate groups,
@@ -316,35 +351,54 @@ def _process_duplicates_in_collection(
         preserving archival object links in the process.
         5. Delete the duplicate top container(s).
     """
-    duplicate_groups = _get_duplicate_groups(aspace_client, db_config, resource_id)
+    duplicate_groups = _get_duplicate_groups(db_config, resource_id)
     # If no duplicate groups are found, log a note and return
     if not duplicate_groups:
         logger.info(f"No duplicate top containers found for Resource ID {resource_id}.")
         return
 
+    # Choose the canonical top container of every group up front,
+    # from the rankings computed by the DB, before any merge is requested.
+    ranked_groups = [
+        (type, indicator, tcs, *_determine_canonical_tc(tcs))
+        for type, indicator, tcs in duplicate_groups
+    ]
+    # Load full top containers (for location data)
+    # and AO titles for all duplicate groups at once, up front.
+    tcs_by_uri = _get_tcs_for_duplicate_groups(aspace_client, duplicate_groups)
+    aos_by_tc_id = _get_aos_for_duplicate_groups(db_config, duplicate_groups)
+
     summary = {
         "Total duplicate groups": len(duplicate_groups),
         "Groups with location data": 0,
+        "Groups with unfetched top containers": 0,
         "Groups with recent accession keywords": 0,
         "Successful merges": 0,
         "Failed merges": 0,
     }
-    for type, indicator, tcs in duplicate_groups:
+    for type, indicator, tcs, canonical_tc, duplicate_tcs in ranked_groups:
         logger.info(
             f"Found {len(tcs)} top containers "
             f"with type '{type}' and indicator '{indicator}'"
         )
 
+        # A group with a top container which could not be fetched
+        # can't be checked for location data, so is left unmerged.
+        fetched_tcs = _get_fetched_tcs(tcs_by_uri, tcs)
+        if fetched_tcs is None:
+            summary["Groups with unfetched top containers"] += 1
+            continue
+
         # Check for any location data in the duplicate group.
         # Per ticket, this should not stop processing (no `continue` statement)
         # but should be logged for visibility.
-        if _has_location_data(tcs):
+        if _has_location_data(fetched_tcs):
             summary["Groups with location data"] += 1
 
-        # Resolve AO refs to their full dictionaries
-        # to make it easier to check AO titles for recent accession keywords
+        # Attach AO titles to the top containers
+        # to make it easier to check them for recent accession keywords
         # on the whole top container group at once.
-        tcs = _resolve_aos_for_tcs(aspace_client, db_config, tcs)
+        tcs = _attach_aos_to_tcs(aos_by_tc_id, tcs)
         # Check for recent accession keywords in the titles of related archival objects
         # in the duplicate group, and stop processing the group if any are found.
         if _has_recent_accession_keywords(tcs):
@@ -352,8 +406,6 @@ def _process_duplicates_in_collection(
             summary["Groups with recent accession keywords"] += 1
             continue
 
-        canonical_tc, duplicate_tcs = _determine_canonical_tc(tcs)
-
         logger.info(
             f"Identified canonical top container '{canonical_tc['uri']}' "
             f"and {len(duplicate_tcs)} duplicate top container(s): "
@@ -0,0 +1,131 @@
+import argparse
+import asnake.logging as logging
+import csv
+
+from alma_api_client import AlmaAPIClient
+from pathlib import Path
+
+from utils import configure_logging, load_config
+from utils.alma_utils import (
+    DEFAULT_ALMA_CALLS_PER_SECOND,
+    DEFAULT_ALMA_MAX_WORKERS,
+    AlmaRateLimiter,
+    get_alma_cache_key,
+    get_alma_items_for_holdings,
+)
+from utils.cache_utils import DEFAULT_CACHE_DIR, CacheStore
+
+# Logger available globally within this module.
+# Configuration is done by configure_logging(), which is called by main().
+# Made available globally so that tests can use the same logger with their own configuration.
+logger = logging.get_logger(Path(__file__).stem)
+
+
+def _get_args() -> argparse.Namespace:
+    """Returns the command-line arguments for this program.
+
+    :return: Parsed CLI arguments.
+    """
+    parser = argparse.ArgumentParser(
+        description=(
+            "Fetch Alma items for many bib and holdings pairs at once, "
+            "writing each to the cache used by add_alma_barcodes_to_archivesspace.py."
+        )
+    )
+    parser.add_argument(
+        "--pairs_file",
+        help="CSV file with `bib_id` and `holdings_id` columns, one pair per row.",
+        required=True,
+    )
+    parser.add_argument(
+        "--config_file",
+        help="Path to config file with Alma info",
+        required=True,
+    )
+    parser.add_argument(
+        "--calls_per_second",
+        help=(
+            "Maximum sustained rate of Alma API calls. "
+            f"Defaults to {DEFAULT_ALMA_CALLS_PER_SECOND}."
+        ),
+        type=float,
+        default=DEFAULT_ALMA_CALLS_PER_SECOND,
+    )
+    parser.add_argument(
+        "--max_calls",
+        help="Stop making Alma API calls after this many, e.g. to stay within a daily quota.",
+        type=int,
+        required=False,
+    )
+    parser.add_argument(
+        "--max_workers",
+        help=(
+            "Maximum number of holdings fetched at once. "
+            f"Defaults to {DEFAULT_ALMA_MAX_WORKERS}."
+        ),
+        type=int,
+        default=DEFAULT_ALMA_MAX_WORKERS,
+    )
+    parser.add_argument(
+        "--cache_dir",
+        help=f"Directory for cached Alma data. Defaults to {DEFAULT_CACHE_DIR}.",
+        default=DEFAULT_CACHE_DIR,
+    )
+    return parser.parse_args()
+
+
+def _read_pairs_file(filename: str) -> list[tuple[str, str]]:
+    """Returns de-duped (bib_id, holdings_id) pairs from the given CSV file,
+    skipping rows where either value is missing.
+
+    :param str filename: Path to the CSV file.
+    :return: A list of (bib_id, holdings_id) tuples, in file order.
+    """
+    with open(filename, "r", newline="", encoding="utf-8") as f:
+        pairs = [
+            (row["bib_id"].strip(), row["holdings_id"].strip())
+            for row in csv.DictReader(f)
+            if row.get("bib_id", "").strip() and row.get("holdings_id", "").strip()
+        ]
+    return list(dict.fromkeys(pairs))
+
+
+def main() -> None:
+    """Fetch Alma items for a batch of collections through one shared rate limiter,
+    and cache each collection's items under the key `alma_data_<holdings_id>`.
+    """
+    log_filename = configure_logging(Path(__file__).stem)
+    print(f"Logging to {log_filename}...")
+    args = _get_args()
+    config = load_config(args.config_file)
+    alma_client = AlmaAPIClient(config["alma_config"]["alma_api_key"])
+
+    pairs = _read_pairs_file(args.pairs_file)
+    logger.info(f"Fetching Alma items for {len(pairs)} holdings")
+
+    rate_limiter = AlmaRateLimiter(args.calls_per_second, max_calls=args.max_calls)
+    items_by_holdings, errors_by_holdings = get_alma_items_for_holdings(
+        alma_client, pairs, rate_limiter, args.max_workers
+    )
+
+    cache_store = CacheStore(args.cache_dir)
+    for holdings_id, alma_items in items_by_holdings.items():
+        alma_cache_key = get_alma_cache_key(holdings_id)
+        logger.info(f"Caching {len(alma_items)} Alma items in {alma_cache_key}")
+        cache_store.put(alma_cache_key, alma_items)
+    for holdings_id, error in errors_by_holdings.items():
+        logger.error(f"Failed to fetch Alma items for holdings {holdings_id}: {error}")
+
+    summary_info = [
+        f"Holdings fetched: {len(items_by_holdings)} of {len(pairs)}",
+        f"Holdings failed: {len(errors_by_holdings)}",
+        f"Alma items fetched: {sum(len(items) for items in items_by_holdings.values())}",
+        f"Alma API calls consumed: {rate_limiter.calls}",
+    ]
+    for message in summary_info:
+        logger.info(message)
+        print(message)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+import threading
+import time
+import unittest
+
+from tests.test_aspace_utils import FakeResponse
+from utils.alma_utils import (
+    AlmaRateLimiter,
+    get_alma_items_for_holdings,
+    get_alma_items_from_alma,
+    iter_alma_items_from_alma,
+)
+
+
+class FakeAlmaAPIClient:
+    """Stand-in for `AlmaAPIClient` serving `total` items for any holdings."""
+
+    def __init__(self, total: int):
+        self.total = total
+        self.calls: list[dict] = []
+
+    def get_items(self, bib_id: str, holdings_id: str, parameters: dict):
+        self.calls.append(parameters)
+        if holdings_id == "bad":
+            return FakeResponse(500)
+        offset, limit = parameters.get("offset", 0), parameters["limit"]
+        items = [
+            {"item_data": {"pid": str(i), "description": f"box.{i}"}}
+            for i in range(offset, min(offset + limit, self.total))
+        ]
+        return FakeResponse(200, {"total_record_count": self.total, "item": items})
+
+
+class ConcurrencyTrackingAlmaAPIClient(FakeAlmaAPIClient):
+    """Stand-in for `AlmaAPIClient` which records the most requests made at once."""
+
+    def __init__(self, total: int):
+        super().__init__(total)
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+
+    def get_items(self, bib_id: str, holdings_id: str, parameters: dict):
+        with self._lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        time.sleep(0.01)
+        try:
+            return super().get_items(bib_id, holdings_id, parameters)
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+
+class TestAlmaItemPager(unittest.TestCase):
+    """Tests for `get_alma_items_from_alma` and `iter_alma_items_from_alma`."""
+
+    def test_all_items_returned_in_order(self):
+        alma_client = FakeAlmaAPIClient(total=250)
+        items = get_alma_items_from_alma(alma_client, "bib", "holdings")
+        self.assertEqual([item["pid"] for item in items], [str(i) for i in range(250)])
+        # First page is reused rather than discarded: 3 pages, 3 requests.
+        self.assertEqual(len(alma_client.calls), 3)
+
+    def test_no_items(self):
+        alma_client = FakeAlmaAPIClient(total=0)
+        self.assertEqual(get_alma_items_from_alma(alma_client, "bib", "holdings"), [])
+        self.assertEqual(len(alma_client.calls), 1)
+
+    def test_iterator_yields_first_page_lazily(self):
+        alma_client = FakeAlmaAPIClient(total=150)
+        items = iter_alma_items_from_alma(alma_client, "bib", "holdings")
+        self.assertEqual(next(items)["pid"], "0")
+        self.assertEqual(len(list(items)), 149)
+
+
+class TestAlmaRateLimiter(unittest.TestCase):
+    """Tests for `AlmaRateLimiter`."""
+
+    def test_calls_are_counted(self):
+        rate_limiter = AlmaRateLimiter(calls_per_second=1000)
+        for _ in range(5):
+            rate_limiter.acquire()
+        self.assertEqual(rate_limiter.calls, 5)
+
+    def test_max_calls_is_enforced(self):
+        rate_limiter = AlmaRateLimiter(calls_per_second=1000, max_calls=2)
+        rate_limiter.acquire()
+        rate_limiter.acquire()
+        with self.assertRaises(RuntimeError):
+            rate_limiter.acquire()
+        self.assertEqual(rate_limiter.calls, 2)
+
+
+class TestGetAlmaItemsForHoldings(unittest.TestCase):
+    """Tests for `get_alma_items_for_holdings`."""
+
+    def test_items_and_errors_by_holdings(self):
+        alma_client = FakeAlmaAPIClient(total=150)
+        rate_limiter = AlmaRateLimiter(calls_per_second=1000)
+        items_by_holdings, errors_by_holdings = get_alma_items_for_holdings(
+            alma_client, [("bib1", "h1"), ("bib2", "bad"), ("bib3", "h3")], rate_limiter
+        )
+        self.assertEqual(sorted(items_by_holdings), ["h1", "h3"])
+        self.assertEqual(len(items_by_holdings["h1"]), 150)
+        self.assertEqual(list(errors_by_holdings), ["bad"])
+        # 2 pages for each good holdings, 1 failed request for the bad one
+        self.assertEqual(rate_limiter.calls, 5)
+
+    def test_call_limit_stops_fetching(self):
+        alma_client = FakeAlmaAPIClient(total=150)
+        rate_limiter = AlmaRateLimiter(calls_per_second=1000, max_calls=1)
+        items_by_holdings, errors_by_holdings = get_alma_items_for_holdings(
+            alma_client, [("bib1", "h1")], rate_limiter
+        )
+        self.assertEqual(items_by_holdings, {})
+        self.assertIn("limit", errors_by_holdings["h1"])
+
+    def test_requests_are_capped_by_max_workers(self):
+        # 5 pages for each of 4 holdings, fetched with 2 workers
+        alma_client = ConcurrencyTrackingAlmaAPIClient(total=450)
+        rate_limiter = AlmaRateLimiter(calls_per_second=1000)
+        pairs = [(f"bib{i}", f"h{i}") for i in range(4)]
+        items_by_holdings, _ = get_alma_items_for_holdings(
+            alma_client, pairs, rate_limiter, max_workers=2
+        )
+        self.assertEqual(len(items_by_holdings), 4)
+        self.assertEqual(rate_limiter.calls, 20)
+        self.assertLessEqual(alma_client.max_in_flight, 2)
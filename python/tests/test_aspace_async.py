@@ -0,0 +1,99 @@
+import asyncio
+import io
+import threading
+import time
+import unittest
+
+from asnake import logging
+from tests.test_aspace_utils import FakeResponse
+from utils.aspace_async import AsyncASnakeClient
+
+
+def setUpModule():
+    # Log to in-memory buffer so no output to console or file
+    logging.setup_logging(stream=io.StringIO(), level="INFO")
+
+
+class FakePagedASnakeClient:
+    """Stand-in for `ASnakeClient` serving a paged listing of `total` records,
+    which tracks the peak number of concurrent requests.
+    """
+
+    def __init__(self, total: int, delay: float = 0.01):
+        self.total = total
+        self.delay = delay
+        self.config = {"session_header_name": "X-ArchivesSpace-Session"}
+        self.session = FakeSession()
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self._lock = threading.Lock()
+
+    def authorize(self) -> str:
+        self.session.headers[self.config["session_header_name"]] = "token"
+        return "token"
+
+    def get(self, url: str, params: dict | None = None, **kwargs) -> FakeResponse:
+        with self._lock:
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        time.sleep(self.delay)
+        with self._lock:
+            self.in_flight -= 1
+        if params is None:
+            # Single record, e.g. "/repositories/2/top_containers/3"
+            return FakeResponse(200, {"uri": url})
+        page, page_size = params["page"], params["page_size"]
+        last_page = max(1, -(-self.total // page_size))
+        start = (page - 1) * page_size
+        results = [
+            {"uri": f"/{url}/{i}"}
+            for i in range(start + 1, min(start + page_size, self.total) + 1)
+        ]
+        return FakeResponse(
+            200, {"this_page": page, "last_page": last_page, "results": results}
+        )
+
+
+class FakeSession:
+    """Stand-in for `requests.Session`."""
+
+    def __init__(self):
+        self.headers: dict[str, str] = {}
+
+    def mount(self, prefix: str, adapter) -> None:
+        pass
+
+
+class TestAsyncASnakeClient(unittest.TestCase):
+    """Tests for `AsyncASnakeClient`."""
+
+    def test_get_paged_yields_all_records_in_order(self):
+        fake_client = FakePagedASnakeClient(total=25)
+
+        async def _get_all() -> list[dict]:
+            async with AsyncASnakeClient(fake_client, max_concurrency=3) as client:
+                return [
+                    obj
+                    async for obj in client.get_paged(
+                        "repositories/2/top_containers", page_size=5
+                    )
+                ]
+
+        records = asyncio.run(_get_all())
+        self.assertEqual(
+            [record["uri"] for record in records],
+            [f"/repositories/2/top_containers/{i}" for i in range(1, 26)],
+        )
+
+    def test_concurrency_is_limited(self):
+        fake_client = FakePagedASnakeClient(total=0)
+        refs = [f"/repositories/2/top_containers/{i}" for i in range(20)]
+
+        async def _get_all() -> list[dict]:
+            async with AsyncASnakeClient(fake_client, max_concurrency=4) as client:
+                return await client.get_json_many(refs)
+
+        records = asyncio.run(_get_all())
+        self.assertEqual([record["uri"] for record in records], refs)
+        self.assertLessEqual(fake_client.peak_in_flight, 4)
+        self.assertGreater(fake_client.peak_in_flight, 1)
@@ -0,0 +1,669 @@
+import io
+import unittest
+
+from asnake import logging
+from MySQLdb import OperationalError
+from utils.aspace_utils import (
+    DBConnectionPool,
+    get_changed_container_refs,
+    get_top_containers_by_id_set,
+    get_top_containers_from_refs,
+    partition_containers_by_barcode,
+    restore_top_container_barcodes,
+    update_top_container_barcodes,
+    update_top_container_barcodes_in_bulk,
+)
+from utils.record_utils import TopContainerRecord
+
+# Structlog comes with a context manager for capturing logs
+# before they hit the logging processors, making testing cleaner and easier.
+# See docs @https://www.structlog.org/en/stable/testing.html
+capture_logs = logging.structlog.testing.capture_logs
+
+
+def setUpModule():
+    # Log to in-memory buffer so no output to console or file.
+    # Done once per module, since structlog caches loggers on first use
+    # and reconfiguring per class would detach the cached `aspace_utils` logger.
+    logging.setup_logging(stream=io.StringIO(), level="INFO")
+
+
+class FakeResponse:
+    """Minimal stand-in for a `requests.Response`."""
+
+    def __init__(self, status_code: int, data: dict | list | None = None):
+        self.status_code = status_code
+        self._data = data
+        self.text = "" if data is None else str(data)
+
+    def raise_for_status(self) -> None:
+        if self.status_code >= 400:
+            raise Exception(f"HTTP {self.status_code}")
+
+    def json(self) -> dict | list | None:
+        return self._data
+
+
+class FakeASnakeClient:
+    """Stand-in for `ASnakeClient` that serves canned responses by URI.
+    Each URI maps to a list of responses, returned in order on successive calls;
+    the last response is repeated once the list is exhausted.
+    """
+
+    def __init__(self, responses: dict[str, list[FakeResponse]]):
+        self.responses = responses
+        self.calls: list[str] = []
+        self.params: list[dict] = []
+
+    def get(self, uri: str, **kwargs) -> FakeResponse:
+        self.calls.append(uri)
+        self.params.append(kwargs.get("params", {}))
+        queue = self.responses[uri]
+        return queue.pop(0) if len(queue) > 1 else queue[0]
+
+
+class TestGetTopContainersFromRefs(unittest.TestCase):
+    """Tests for `get_top_containers_from_refs`."""
+
+    def test_results_are_sorted_by_ref(self):
+        refs = [f"/repositories/2/top_containers/{i}" for i in (3, 1, 2)]
+        client = FakeASnakeClient(
+            {ref: [FakeResponse(200, {"uri": ref})] for ref in refs}
+        )
+        top_containers = get_top_containers_from_refs(client, set(refs), max_workers=3)
+        self.assertEqual([tc["uri"] for tc in top_containers], sorted(refs))
+
+    def test_failed_request_is_retried(self):
+        ref = "/repositories/2/top_containers/1"
+        client = FakeASnakeClient(
+            {ref: [FakeResponse(500), FakeResponse(200, {"uri": ref})]}
+        )
+        top_containers = get_top_containers_from_refs(
+            client, [ref], retries=1, backoff=0
+        )
+        self.assertEqual(top_containers, [{"uri": ref}])
+        self.assertEqual(len(client.calls), 2)
+
+    def test_failed_ref_is_skipped_and_logged(self):
+        good_ref = "/repositories/2/top_containers/1"
+        bad_ref = "/repositories/2/top_containers/2"
+        client = FakeASnakeClient(
+            {
+                good_ref: [FakeResponse(200, {"uri": good_ref})],
+                bad_ref: [FakeResponse(404)],
+            }
+        )
+        with capture_logs() as logs:
+            top_containers = get_top_containers_from_refs(
+                client, [good_ref, bad_ref], retries=0
+            )
+        self.assertEqual(top_containers, [{"uri": good_ref}])
+        self.assertEqual(len(logs), 1)
+        self.assertEqual(logs[0]["log_level"], "error")
+        self.assertIn(bad_ref, logs[0]["event"])
+
+
+class FakeIdSetClient(FakeASnakeClient):
+    """Stand-in for `ASnakeClient` that serves the `top_containers?id_set[]=` endpoint
+    from a set of existing top container IDs.
+    """
+
+    def __init__(self, existing_ids: set[int]):
+        super().__init__({})
+        self.existing_ids = existing_ids
+
+    def get(self, uri: str, **kwargs) -> FakeResponse:
+        self.calls.append(uri)
+        ids = kwargs["params"]["id_set"]
+        self.params.append(kwargs["params"])
+        return FakeResponse(
+            200,
+            [
+                {"uri": f"{uri}/{id}", "indicator": str(id)}
+                for id in ids
+                if id in self.existing_ids
+            ],
+        )
+
+
+class TestGetTopContainersByIdSet(unittest.TestCase):
+    """Tests for `get_top_containers_by_id_set`."""
+
+    def test_containers_are_requested_in_batches(self):
+        refs = {f"/repositories/2/top_containers/{i}" for i in range(1, 6)}
+        client = FakeIdSetClient(existing_ids={1, 2, 3, 4, 5})
+        top_containers, missing_refs = get_top_containers_by_id_set(
+            client, refs, batch_size=2
+        )
+        # 5 containers in batches of 2 should take 3 requests
+        self.assertEqual(len(client.calls), 3)
+        self.assertTrue(
+            all(uri == "/repositories/2/top_containers" for uri in client.calls)
+        )
+        self.assertEqual([tc["uri"] for tc in top_containers], sorted(refs))
+        self.assertEqual(missing_refs, [])
+
+    def test_missing_containers_are_reported(self):
+        refs = {f"/repositories/2/top_containers/{i}" for i in range(1, 4)}
+        client = FakeIdSetClient(existing_ids={1, 3})
+        with capture_logs() as logs:
+            top_containers, missing_refs = get_top_containers_by_id_set(client, refs)
+        self.assertEqual(len(top_containers), 2)
+        self.assertEqual(missing_refs, ["/repositories/2/top_containers/2"])
+        self.assertEqual(len(logs), 1)
+        self.assertEqual(logs[0]["log_level"], "warning")
+
+    def test_failed_batch_falls_back_to_single_requests(self):
+        refs = [f"/repositories/2/top_containers/{i}" for i in (1, 2, 3)]
+        responses = {
+            "/repositories/2/top_containers": [FakeResponse(500)],
+            refs[0]: [FakeResponse(200, {"uri": refs[0]})],
+            refs[1]: [FakeResponse(404)],
+            refs[2]: [FakeResponse(200, {"uri": refs[2]})],
+        }
+        client = FakeASnakeClient(responses)
+        with capture_logs() as logs:
+            top_containers, missing_refs = get_top_containers_by_id_set(
+                client, refs, retries=0
+            )
+        # The batch failed, so each container was requested on its own,
+        # and only the one which also failed on its own was skipped.
+        self.assertEqual([tc["uri"] for tc in top_containers], [refs[0], refs[2]])
+        self.assertEqual(missing_refs, [])
+        self.assertEqual([log["log_level"] for log in logs], ["warning", "error"])
+        self.assertIn(refs[1], logs[1]["event"])
+
+
+class FakeCursor:
+    """Stand-in for a MySQLdb `DictCursor`."""
+
+    def __init__(self, connection: "FakeConnection"):
+        self.connection = connection
+
+    def execute(self, query: str, params: tuple) -> None:
+        if self.connection.fail_execute:
+            raise OperationalError(2013, "Lost connection to MySQL server")
+        self.connection.queries.append(params)
+
+    def fetchall(self) -> list[dict]:
+        return [{"value": self.connection.id}]
+
+    def close(self) -> None:
+        pass
+
+
+class FakeConnection:
+    """Stand-in for a MySQLdb connection."""
+
+    def __init__(self, id: int, fail_execute: bool = False):
+        self.id = id
+        self.fail_execute = fail_execute
+        self.alive = True
+        self.closed = False
+        self.queries: list[tuple] = []
+
+    def ping(self) -> None:
+        if not self.alive:
+            raise OperationalError(2006, "MySQL server has gone away")
+
+    def cursor(self, cursor_class=None) -> FakeCursor:
+        return FakeCursor(self)
+
+    def close(self) -> None:
+        self.closed = True
+
+
+class FakeDBConnectionPool(DBConnectionPool):
+    """`DBConnectionPool` which hands out fake connections,
+    failing the first query on each of the connection IDs in `failing_ids`.
+    """
+
+    def __init__(self, failing_ids: set[int] | None = None):
+        super().__init__({})
+        self.failing_ids = failing_ids or set()
+        self.connections: list[FakeConnection] = []
+
+    def _connect(self) -> FakeConnection:
+        id = len(self.connections) + 1
+        connection = FakeConnection(id, fail_execute=id in self.failing_ids)
+        self.connections.append(connection)
+        return connection
+
+
+class TestDBConnectionPool(unittest.TestCase):
+    """Tests for `DBConnectionPool`."""
+
+    def test_connection_is_reused(self):
+        pool = FakeDBConnectionPool()
+        pool.fetch_all("select 1", ())
+        pool.fetch_all("select 1", ())
+        self.assertEqual(len(pool.connections), 1)
+        self.assertEqual(len(pool.connections[0].queries), 2)
+
+    def test_stale_connection_is_replaced(self):
+        pool = FakeDBConnectionPool()
+        pool.fetch_all("select 1", ())
+        pool.connections[0].alive = False
+        rows = pool.fetch_all("select 1", ())
+        self.assertEqual(rows, [{"value": 2}])
+        self.assertTrue(pool.connections[0].closed)
+
+    def test_query_is_retried_after_connection_failure(self):
+        pool = FakeDBConnectionPool(failing_ids={1})
+        rows = pool.fetch_all("select 1", ())
+        self.assertEqual(rows, [{"value": 2}])
+        self.assertTrue(pool.connections[0].closed)
+
+
+class TestGetChangedContainerRefs(unittest.TestCase):
+    """Tests for `get_changed_container_refs`."""
+
+    def test_only_added_and_changed_containers_are_refetched(self):
+        cached_containers = [
+            {"uri": "/repositories/2/top_containers/1", "lock_version": 0},
+            {"uri": "/repositories/2/top_containers/2", "lock_version": 3},
+            {"uri": "/repositories/2/top_containers/3", "lock_version": 1},
+        ]
+        current_stamps = {
+            "/repositories/2/top_containers/1": {  # unchanged
+                "lock_version": 0,
+                "system_mtime": None,
+            },
+            "/repositories/2/top_containers/2": {  # changed
+                "lock_version": 4,
+                "system_mtime": None,
+            },
+            "/repositories/2/top_containers/4": {  # added
+                "lock_version": 0,
+                "system_mtime": None,
+            },
+        }
+        unchanged_containers, changed_refs, removed_refs = get_changed_container_refs(
+            cached_containers, current_stamps
+        )
+        self.assertEqual(unchanged_containers, cached_containers[:1])
+        self.assertEqual(
+            changed_refs,
+            {"/repositories/2/top_containers/2", "/repositories/2/top_containers/4"},
+        )
+        self.assertEqual(removed_refs, {"/repositories/2/top_containers/3"})
+
+    def test_seen_containers_are_compared_by_stamp(self):
+        cached_containers = [
+            {
+                "uri": "/repositories/2/top_containers/1",
+                "lock_version": 2,
+                "system_mtime": "2025-01-01T00:00:00Z",
+            },
+        ]
+        seen_stamps = {
+            "/repositories/2/top_containers/1": {
+                "lock_version": 2,
+                "system_mtime": "2025-01-01T00:00:00Z",
+            },
+            # Seen but not cached, e.g. not linked to a published record
+            "/repositories/2/top_containers/2": {
+                "lock_version": 5,
+                "system_mtime": "2025-01-01T00:00:00Z",
+            },
+        }
+        current_stamps = {
+            # Same lock_version, but saved since
+            "/repositories/2/top_containers/1": {
+                "lock_version": 2,
+                "system_mtime": "2025-02-01T00:00:00Z",
+            },
+            "/repositories/2/top_containers/2": {
+                "lock_version": 5,
+                "system_mtime": "2025-01-01T00:00:00Z",
+            },
+        }
+        unchanged_containers, changed_refs, removed_refs = get_changed_container_refs(
+            cached_containers, current_stamps, seen_stamps
+        )
+        # The skipped container is unchanged, so is not refetched.
+        self.assertEqual(unchanged_containers, [])
+        self.assertEqual(changed_refs, {"/repositories/2/top_containers/1"})
+        self.assertEqual(removed_refs, set())
+
+
+class TestPartitionContainersByBarcode(unittest.TestCase):
+    """Tests for `partition_containers_by_barcode`."""
+
+    def test_containers_are_partitioned_in_order(self):
+        containers = [
+            {"uri": "/repositories/2/top_containers/1", "barcode": "A1"},
+            {"uri": "/repositories/2/top_containers/2"},
+            {"uri": "/repositories/2/top_containers/3", "barcode": ""},
+            {"uri": "/repositories/2/top_containers/4", "barcode": "A4"},
+        ]
+        without_barcodes, with_barcodes = partition_containers_by_barcode(
+            iter(containers)
+        )
+        self.assertEqual(without_barcodes, [containers[1], containers[2]])
+        self.assertEqual(with_barcodes, [containers[0], containers[3]])
+
+    def test_identical_containers_are_kept(self):
+        # Containers are partitioned by position, not compared by value.
+        containers = [{"indicator": "1", "barcode": "A1"}] * 2 + [{"indicator": "2"}]
+        without_barcodes, with_barcodes = partition_containers_by_barcode(containers)
+        self.assertEqual(len(with_barcodes), 2)
+        self.assertEqual(len(without_barcodes), 1)
+
+
+class FakeWriteClient(FakeASnakeClient):
+    """Stand-in for `ASnakeClient` that serves canned responses to `post` by URI,
+    and the current version of each container to `get`.
+    """
+
+    def __init__(
+        self,
+        post_responses: dict[str, list[FakeResponse]],
+        current_containers: dict[str, dict] | None = None,
+    ):
+        super().__init__(
+            {
+                uri: [FakeResponse(200, tc)]
+                for uri, tc in (current_containers or {}).items()
+            }
+        )
+        self.post_responses = post_responses
+        self.posted: list[dict] = []
+
+    def post(self, uri: str, **kwargs) -> FakeResponse:
+        self.posted.append(kwargs["json"])
+        queue = self.post_responses[uri]
+        return queue.pop(0) if len(queue) > 1 else queue[0]
+
+
+class TestUpdateTopContainerBarcodes(unittest.TestCase):
+    """Tests for `update_top_container_barcodes`."""
+
+    def test_successes_and_failures_are_counted(self):
+        refs = [f"/repositories/2/top_containers/{i}" for i in range(1, 4)]
+        client = FakeWriteClient(
+            {
+                refs[0]: [FakeResponse(200)],
+                refs[1]: [FakeResponse(400)],
+                refs[2]: [FakeResponse(200)],
+            }
+        )
+        with capture_logs() as logs:
+            updated_refs, failed_refs = update_top_container_barcodes(
+                client, [{"uri": ref, "barcode": "123"} for ref in refs], retries=0
+            )
+        self.assertEqual(updated_refs, [refs[0], refs[2]])
+        self.assertEqual(list(failed_refs), [refs[1]])
+        # Only successful updates are logged as added, for use by undo.
+        added_events = [
+            log["event"]
+            for log in logs
+            if log["event"].startswith("Added barcode to top container")
+        ]
+        self.assertEqual(len(added_events), 2)
+
+    def test_server_error_is_retried(self):
+        ref = "/repositories/2/top_containers/1"
+        client = FakeWriteClient({ref: [FakeResponse(503), FakeResponse(200)]})
+        updated_refs, failed_refs = update_top_container_barcodes(
+            client, [{"uri": ref, "barcode": "123"}], retries=1, backoff=0
+        )
+        self.assertEqual(updated_refs, [ref])
+        self.assertEqual(len(client.posted), 2)
+
+    def test_conflict_is_resolved_with_current_version(self):
+        ref = "/repositories/2/top_containers/1"
+        current_tc = {"uri": ref, "lock_version": 5, "indicator": "1"}
+        client = FakeWriteClient(
+            {ref: [FakeResponse(409), FakeResponse(200)]}, {ref: current_tc}
+        )
+        stale_tc = {"uri": ref, "lock_version": 4, "barcode": "123"}
+        updated_refs, failed_refs = update_top_container_barcodes(
+            client, [stale_tc], retries=1, backoff=0
+        )
+        self.assertEqual(updated_refs, [ref])
+        self.assertEqual(client.posted[-1]["lock_version"], 5)
+        self.assertEqual(client.posted[-1]["barcode"], "123")
+
+    def test_conflicting_barcode_is_not_overwritten(self):
+        ref = "/repositories/2/top_containers/1"
+        client = FakeWriteClient(
+            {ref: [FakeResponse(409)]}, {ref: {"uri": ref, "barcode": "999"}}
+        )
+        updated_refs, failed_refs = update_top_container_barcodes(
+            client, [{"uri": ref, "barcode": "123"}], retries=1, backoff=0
+        )
+        self.assertEqual(updated_refs, [])
+        self.assertIn("999", failed_refs[ref])
+        self.assertEqual(len(client.posted), 1)
+
+    def test_updated_containers_are_passed_to_callback(self):
+        refs = [f"/repositories/2/top_containers/{i}" for i in range(1, 3)]
+        client = FakeWriteClient(
+            {refs[0]: [FakeResponse(200)], refs[1]: [FakeResponse(400)]}
+        )
+        updated = []
+        update_top_container_barcodes(
+            client,
+            [{"uri": ref, "barcode": "123", "lock_version": 1} for ref in refs],
+            retries=0,
+            on_updated=updated.append,
+        )
+        self.assertEqual(
+            updated, [{"uri": refs[0], "barcode": "123", "lock_version": 1}]
+        )
+
+    def test_compact_records_are_posted_as_complete_json(self):
+        ref = "/repositories/2/top_containers/1"
+        complete_tc = {
+            "uri": ref,
+            "lock_version": 3,
+            "indicator": "1",
+            "container_locations": [{"ref": "/locations/1"}],
+        }
+        client = FakeWriteClient({ref: [FakeResponse(200)]}, {ref: complete_tc})
+        record = TopContainerRecord(uri=ref, indicator="1", barcode="123")
+        updated = []
+        updated_refs, failed_refs = update_top_container_barcodes(
+            client, [record], retries=0, on_updated=updated.append
+        )
+        self.assertEqual(updated_refs, [ref])
+        self.assertEqual(client.posted, [dict(complete_tc, barcode="123")])
+        self.assertEqual(updated, [dict(complete_tc, barcode="123")])
+
+    def test_compact_record_with_new_barcode_is_not_overwritten(self):
+        ref = "/repositories/2/top_containers/1"
+        client = FakeWriteClient(
+            {ref: [FakeResponse(200)]}, {ref: {"uri": ref, "barcode": "999"}}
+        )
+        record = TopContainerRecord(uri=ref, barcode="123")
+        updated_refs, failed_refs = update_top_container_barcodes(
+            client, [record], retries=0
+        )
+        self.assertEqual(updated_refs, [])
+        self.assertIn("999", failed_refs[ref])
+        self.assertEqual(client.posted, [])
+
+
+class FakeBulkWriteClient(FakeWriteClient):
+    """Stand-in for `ASnakeClient` that also serves the current version
+    of containers to `top_containers?id_set[]=` requests.
+    """
+
+    def get(self, uri: str, **kwargs) -> FakeResponse:
+        if "id_set" not in kwargs.get("params", {}):
+            return super().get(uri, **kwargs)
+        self.calls.append(uri)
+        current_tcs = [response[0].json() for response in self.responses.values()]
+        ids = kwargs["params"]["id_set"]
+        return FakeResponse(
+            200,
+            [tc for tc in current_tcs if int(tc["uri"].split("/")[-1]) in ids],
+        )
+
+
+class TestUpdateTopContainerBarcodesInBulk(unittest.TestCase):
+    """Tests for `update_top_container_barcodes_in_bulk`."""
+
+    bulk_uri = "/repositories/2/top_containers/bulk/barcodes"
+
+    def test_barcodes_are_posted_in_chunks(self):
+        tcs = [
+            {"uri": f"/repositories/2/top_containers/{i}", "barcode": f"b{i}"}
+            for i in range(1, 6)
+        ]
+        client = FakeBulkWriteClient(
+            {self.bulk_uri: [FakeResponse(200)]},
+            {tc["uri"]: {"uri": tc["uri"], "lock_version": 0} for tc in tcs},
+        )
+        with capture_logs() as logs:
+            updated_refs, failed_refs = update_top_container_barcodes_in_bulk(
+                client, tcs, chunk_size=2
+            )
+        # 5 barcodes in chunks of 2 should take 3 requests
+        self.assertEqual(len(client.posted), 3)
+        self.assertEqual(client.posted[0], {tcs[0]["uri"]: "b1", tcs[1]["uri"]: "b2"})
+        self.assertEqual(updated_refs, [tc["uri"] for tc in tcs])
+        self.assertEqual(failed_refs, {})
+        # Each container is still logged, for use by undo.
+        self.assertEqual(
+            sum(
+                log["event"].startswith("Added barcode to top container")
+                for log in logs
+            ),
+            5,
+        )
+
+    def test_failed_chunk_falls_back_to_single_updates(self):
+        good_ref = "/repositories/2/top_containers/1"
+        bad_ref = "/repositories/2/top_containers/2"
+        client = FakeBulkWriteClient(
+            {
+                self.bulk_uri: [FakeResponse(400)],
+                good_ref: [FakeResponse(200)],
+                bad_ref: [FakeResponse(400)],
+            },
+            {good_ref: {"uri": good_ref}, bad_ref: {"uri": bad_ref}},
+        )
+        updated_refs, failed_refs = update_top_container_barcodes_in_bulk(
+            client,
+            [{"uri": good_ref, "barcode": "1"}, {"uri": bad_ref, "barcode": "1"}],
+            backoff=0,
+        )
+        self.assertEqual(updated_refs, [good_ref])
+        self.assertEqual(list(failed_refs), [bad_ref])
+
+    def test_changed_containers_are_not_overwritten(self):
+        unchanged_ref = "/repositories/2/top_containers/1"
+        barcoded_ref = "/repositories/2/top_containers/2"
+        saved_ref = "/repositories/2/top_containers/3"
+        client = FakeBulkWriteClient(
+            {
+                self.bulk_uri: [FakeResponse(200)],
+                barcoded_ref: [FakeResponse(200)],
+                saved_ref: [FakeResponse(200)],
+            },
+            {
+                unchanged_ref: {"uri": unchanged_ref, "lock_version": 1},
+                # Barcoded by someone else since matching
+                barcoded_ref: {
+                    "uri": barcoded_ref,
+                    "lock_version": 2,
+                    "barcode": "999",
+                },
+                # Saved by someone else since matching, without a barcode
+                saved_ref: {"uri": saved_ref, "lock_version": 2},
+            },
+        )
+        records = [
+            TopContainerRecord(uri=ref, barcode=f"b{i}", lock_version=1)
+            for i, ref in enumerate([unchanged_ref, barcoded_ref, saved_ref])
+        ]
+        updated = []
+        updated_refs, failed_refs = update_top_container_barcodes_in_bulk(
+            client, records, retries=0, on_updated=updated.append
+        )
+        # Only the unchanged container is sent in bulk.
+        self.assertIn({unchanged_ref: "b0"}, client.posted)
+        # The container barcoded since is refused, not overwritten.
+        self.assertEqual(list(failed_refs), [barcoded_ref])
+        self.assertIn("999", failed_refs[barcoded_ref])
+        self.assertEqual(sorted(updated_refs), [unchanged_ref, saved_ref])
+        # Each change is reported with the version it was applied to.
+        self.assertEqual(
+            sorted((tc["uri"], tc["lock_version"]) for tc in updated),
+            [(unchanged_ref, 1), (saved_ref, 2)],
+        )
+
+
+class TestRestoreTopContainerBarcodes(unittest.TestCase):
+    """Tests for `restore_top_container_barcodes`."""
+
+    ref = "/repositories/2/top_containers/1"
+
+    def test_added_barcode_is_removed(self):
+        client = FakeWriteClient(
+            {self.ref: [FakeResponse(200)]},
+            {self.ref: {"uri": self.ref, "barcode": "123", "lock_version": 2}},
+        )
+        done = []
+        restored_refs, failed_refs = restore_top_container_barcodes(
+            client,
+            [{"uri": self.ref, "old_barcode": None, "new_barcode": "123"}],
+            on_done=lambda change, error: done.append((change["uri"], error)),
+        )
+        self.assertEqual(restored_refs, [self.ref])
+        self.assertNotIn("barcode", client.posted[0])
+        self.assertEqual(done, [(self.ref, None)])
+
+    def test_previous_barcode_is_restored(self):
+        client = FakeWriteClient(
+            {self.ref: [FakeResponse(200)]},
+            {self.ref: {"uri": self.ref, "barcode": "123", "lock_version": 2}},
+        )
+        restore_top_container_barcodes(
+            client,
+            [{"uri": self.ref, "old_barcode": "999", "new_barcode": "123"}],
+        )
+        self.assertEqual(client.posted[0]["barcode"], "999")
+
+    def test_barcode_changed_since_is_not_restored(self):
+        client = FakeWriteClient(
+            {self.ref: [FakeResponse(200)]},
+            {self.ref: {"uri": self.ref, "barcode": "456"}},
+        )
+        restored_refs, failed_refs = restore_top_container_barcodes(
+            client,
+            [{"uri": self.ref, "old_barcode": None, "new_barcode": "123"}],
+        )
+        self.assertEqual(restored_refs, [])
+        self.assertIn("456", failed_refs[self.ref])
+        self.assertEqual(client.posted, [])
+
+    def test_already_restored_barcode_is_not_posted(self):
+        client = FakeWriteClient(
+            {self.ref: [FakeResponse(200)]}, {self.ref: {"uri": self.ref}}
+        )
+        restored_refs, failed_refs = restore_top_container_barcodes(
+            client,
+            [{"uri": self.ref, "old_barcode": None, "new_barcode": "123"}],
+        )
+        self.assertEqual(restored_refs, [self.ref])
+        self.assertEqual(client.posted, [])
+
+    def test_conflict_is_retried_with_current_version(self):
+        client = FakeWriteClient({self.ref: [FakeResponse(409), FakeResponse(200)]})
+        # The container is refetched before each attempt.
+        client.responses[self.ref] = [
+            FakeResponse(200, {"uri": self.ref, "barcode": "123", "lock_version": v})
+            for v in (2, 3)
+        ]
+        restored_refs, failed_refs = restore_top_container_barcodes(
+            client,
+            [{"uri": self.ref, "old_barcode": None, "new_barcode": "123"}],
+            retries=1,
+            backoff=0,
+        )
+        self.assertEqual(restored_refs, [self.ref])
+        self.assertEqual(len(client.posted), 2)
+        self.assertEqual(client.posted[-1]["lock_version"], 3)
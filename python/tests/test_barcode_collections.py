@@ -0,0 +1,80 @@
+import argparse
+import unittest
+
+from add_alma_barcodes_to_archivesspace import _get_args as get_barcoding_args
+from barcode_collections import (
+    _get_collection_argv,
+    _get_max_collections,
+)
+
+
+class TestGetCollectionArgv(unittest.TestCase):
+    """Tests for building barcoding arguments from rows of Airtable data."""
+
+    def setUp(self):
+        self.args = argparse.Namespace(
+            config_file=".archivessnake.yml",
+            dry_run=True,
+            use_db=True,
+            use_cache=False,
+            trace_memory=False,
+            cache_dir="cache",
+            repo_id="2",
+            batch_size=None,
+            bulk_update_size=100,
+            max_collections=4,
+            max_aspace_requests=8,
+            alma_calls_per_second=10,
+            resource_id_column="ArchivesSpace Rec ID",
+            bib_id_column="Alma Bib ID",
+            holdings_id_column="Alma Holdings ID",
+            profile_column="Profile",
+        )
+
+    def test_row_is_converted_to_barcoding_args(self):
+        row = {
+            "ArchivesSpace Rec ID": "1234",
+            "Alma Bib ID": "991",
+            "Alma Holdings ID": "221",
+            "Profile": "indicator_type_matching.py",
+        }
+        barcoding_args = get_barcoding_args(_get_collection_argv(row, self.args))
+        self.assertEqual(barcoding_args.resource_id, "1234")
+        self.assertEqual(barcoding_args.profile, "config.indicator_type_matching")
+        self.assertTrue(barcoding_args.dry_run)
+        self.assertTrue(barcoding_args.use_db)
+        self.assertFalse(barcoding_args.use_cache)
+        self.assertEqual(barcoding_args.bulk_update_size, 100)
+        # The ASpace request cap is shared between concurrent collections.
+        self.assertEqual(barcoding_args.max_workers, 2)
+
+    def test_request_caps_hold_across_collections(self):
+        row = {
+            "ArchivesSpace Rec ID": "1234",
+            "Alma Bib ID": "991",
+            "Alma Holdings ID": "221",
+            "Profile": "indicator_type_matching.py",
+        }
+        for max_collections, max_aspace_requests in ((4, 8), (4, 2), (3, 8), (1, 1)):
+            with self.subTest(
+                max_collections=max_collections,
+                max_aspace_requests=max_aspace_requests,
+            ):
+                self.args.max_collections = max_collections
+                self.args.max_aspace_requests = max_aspace_requests
+                barcoding_args = get_barcoding_args(
+                    _get_collection_argv(row, self.args)
+                )
+                collections_at_once = _get_max_collections(self.args)
+                self.assertLessEqual(
+                    collections_at_once * barcoding_args.max_workers,
+                    max_aspace_requests,
+                )
+                self.assertLessEqual(
+                    collections_at_once * barcoding_args.alma_calls_per_second,
+                    self.args.alma_calls_per_second,
+                )
+
+    def test_incomplete_row_is_skipped(self):
+        row = {"ArchivesSpace Rec ID": "1234", "Alma Bib ID": "991"}
+        self.assertIsNone(_get_collection_argv(row, self.args))
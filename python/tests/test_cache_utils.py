@@ -0,0 +1,128 @@
+import gzip
+import hashlib
+import io
+import json
+import os
+import tempfile
+import unittest
+
+from asnake import logging
+from datetime import datetime, timedelta
+from utils.cache_utils import CacheIntegrityError, CacheStore
+
+
+def setUpModule():
+    # Log to in-memory buffer so no output to console or file.
+    logging.setup_logging(stream=io.StringIO(), level="INFO")
+
+
+class TestCacheStore(unittest.TestCase):
+    """Tests for `CacheStore`."""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.cache_store = CacheStore(self.temp_dir.name)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def _set_metadata(self, key: str, **changes) -> None:
+        meta_path = self.cache_store._meta_path(key)
+        metadata = json.loads(meta_path.read_text())
+        metadata.update(changes)
+        meta_path.write_text(json.dumps(metadata))
+
+    def test_round_trip_with_metadata(self):
+        data = [{"uri": "/repositories/2/top_containers/1"}]
+        metadata = self.cache_store.put("aspace_data_1", data, source="http://test")
+        self.assertEqual(self.cache_store.get("aspace_data_1"), data)
+        self.assertEqual(metadata["record_count"], 1)
+        self.assertEqual(metadata["source"], "http://test")
+        # Only the complete files remain; no temporary files.
+        self.assertEqual(
+            sorted(path.name for path in self.cache_store.cache_dir.iterdir()),
+            ["aspace_data_1.jsonl.gz", "aspace_data_1.meta.json"],
+        )
+
+    def test_missing_entry(self):
+        self.assertIsNone(self.cache_store.get("aspace_data_1"))
+
+    def test_stale_entry_is_ignored(self):
+        self.cache_store.put("alma_data_1", [{"pid": "1"}])
+        fetched_at = datetime.now() - timedelta(hours=2)
+        self._set_metadata("alma_data_1", fetched_at=fetched_at.isoformat())
+        self.assertIsNone(self.cache_store.get("alma_data_1", timedelta(hours=1)))
+        self.assertIsNotNone(self.cache_store.get("alma_data_1", timedelta(hours=3)))
+
+    def test_entry_from_other_source_is_ignored(self):
+        self.cache_store.put("aspace_data_1", [{}], source="http://test")
+        self.assertIsNone(self.cache_store.get("aspace_data_1", source="http://prod"))
+
+    def test_corrupt_entry_is_ignored(self):
+        self.cache_store.put("alma_data_1", [{"pid": "1"}])
+        self._set_metadata("alma_data_1", content_hash="not the hash")
+        self.assertIsNone(self.cache_store.get("alma_data_1"))
+
+    def test_truncated_entry_is_ignored(self):
+        self.cache_store.put("alma_data_1", [{"pid": str(i)} for i in range(100)])
+        data_path = self.cache_store._data_path("alma_data_1")
+        data_path.write_bytes(data_path.read_bytes()[:20])
+        self.assertIsNone(self.cache_store.get("alma_data_1"))
+
+    def test_least_recently_used_entry_is_evicted(self):
+        for key in ("a", "b", "c"):
+            self.cache_store.put(key, [{"key": key}])
+        # Set access order explicitly, regardless of clock resolution.
+        self._set_metadata("a", last_accessed="2000-01-01T00:00:00")
+        self._set_metadata("b", last_accessed="2000-01-01T00:00:02")
+        self._set_metadata("c", last_accessed="2000-01-01T00:00:01")
+        entry_size = self.cache_store.get_metadata("a")["size_bytes"]
+        self.cache_store.max_bytes = entry_size * 2
+        self.cache_store.put("d", [{"key": "d"}])
+        remaining = sorted(metadata["key"] for metadata in self.cache_store.entries())
+        self.assertEqual(remaining, ["b", "d"])
+
+    def test_records_are_streamed(self):
+        records = ({"pid": str(i)} for i in range(1000))
+        metadata = self.cache_store.put("alma_data_1", records)
+        self.assertEqual(metadata["record_count"], 1000)
+        cached_records = self.cache_store.iter_records("alma_data_1")
+        self.assertEqual(next(cached_records), {"pid": "0"})
+        self.assertEqual(len(list(cached_records)), 999)
+
+    def test_corrupt_entry_raises_after_lazy_iteration(self):
+        self.cache_store.put("alma_data_1", [{"pid": "1"}])
+        self._set_metadata("alma_data_1", content_hash="not the hash")
+        with self.assertRaises(CacheIntegrityError):
+            list(self.cache_store.iter_records("alma_data_1"))
+
+    def test_previous_format_entry_is_read(self):
+        data = [{"pid": "1"}, {"pid": "2"}]
+        content = json.dumps(data).encode()
+        self.cache_store._data_path("alma_data_1", version=1).write_bytes(
+            gzip.compress(content)
+        )
+        metadata = {
+            "version": 1,
+            "key": "alma_data_1",
+            "source": None,
+            "fetched_at": datetime.now().isoformat(),
+            "last_accessed": datetime.now().isoformat(),
+            "record_count": 2,
+            "content_hash": hashlib.sha256(content).hexdigest(),
+            "size_bytes": 0,
+        }
+        self.cache_store._meta_path("alma_data_1").write_text(json.dumps(metadata))
+        self.assertEqual(self.cache_store.get("alma_data_1"), data)
+
+    def test_legacy_json_file_is_read(self):
+        data = [{"uri": "/repositories/2/top_containers/1"}]
+        legacy_path = self.cache_store.cache_dir / "aspace_data_1.json"
+        legacy_path.write_text(json.dumps(data))
+        self.assertEqual(
+            self.cache_store.get("aspace_data_1", source="http://test"), data
+        )
+        # Legacy files have no fetch time, so their modification time is used.
+        old_time = (datetime.now() - timedelta(days=2)).timestamp()
+        os.utime(legacy_path, (old_time, old_time))
+        self.assertIsNone(self.cache_store.get("aspace_data_1", timedelta(days=1)))
@@ -0,0 +1,106 @@
+import unittest
+
+from config import indicator_only_matching, indicator_type_matching
+from config import series_description_matching
+from config.base_match import cascade_match_containers
+
+PROFILES = [
+    ("indicator_type_matching.py", indicator_type_matching),
+    ("indicator_only_matching.py", indicator_only_matching),
+    ("series_description_matching.py", series_description_matching),
+]
+
+
+def _item(pid: str, description: str) -> dict:
+    return {"pid": pid, "description": description, "barcode": f"barcode-{pid}"}
+
+
+def _tc(uri: str, indicator: str, type: str = "box") -> dict:
+    return {"uri": uri, "indicator": indicator, "type": type}
+
+
+class TestCascadeMatching(unittest.TestCase):
+    """Tests for matching with a cascade of profiles."""
+
+    def test_each_tier_matches_what_earlier_tiers_left(self):
+        alma_items = [
+            _item("1", "box.001"),
+            _item("2", "folder.002"),
+            _item("3", "ser.P box.0003"),
+            _item("4", "box.004"),
+        ]
+        aspace_containers = [
+            _tc("/tc/1", "1"),
+            # matches item 2 on indicator only, as the type differs
+            _tc("/tc/2", "2"),
+            _tc("/tc/3", "3P"),
+            _tc("/tc/5", "5"),
+        ]
+        matched, unhandled_data, match_tiers = cascade_match_containers(
+            alma_items, aspace_containers, PROFILES
+        )
+        self.assertEqual(
+            match_tiers,
+            {
+                "/tc/1": "indicator_type_matching.py",
+                "/tc/2": "indicator_only_matching.py",
+                "/tc/3": "series_description_matching.py",
+            },
+        )
+        self.assertEqual(
+            {tc["uri"]: tc["barcode"] for tc in matched},
+            {"/tc/1": "barcode-1", "/tc/2": "barcode-2", "/tc/3": "barcode-3"},
+        )
+        self.assertEqual(
+            [item["pid"] for item in unhandled_data["unmatched_alma_items"]], ["4"]
+        )
+        self.assertEqual(
+            [tc["uri"] for tc in unhandled_data["unmatched_aspace_containers"]],
+            ["/tc/5"],
+        )
+
+    def test_duplicates_are_kept_per_tier(self):
+        alma_items = [_item("1", "box.001"), _item("2", "folder.001")]
+        aspace_containers = [_tc("/tc/1", "1", "box"), _tc("/tc/2", "1", "box")]
+        matched, unhandled_data, match_tiers = cascade_match_containers(
+            alma_items, aspace_containers, PROFILES[:2]
+        )
+        self.assertEqual(matched, [])
+        # both tiers see the duplicate top containers, and the second tier
+        # also sees the items as duplicates
+        self.assertEqual(
+            sorted(unhandled_data["tcs_with_duplicate_keys"]),
+            [
+                ("indicator_only_matching.py", "/tc/1", "1"),
+                ("indicator_only_matching.py", "/tc/2", "1"),
+                ("indicator_type_matching.py", "/tc/1", "1", "box"),
+                ("indicator_type_matching.py", "/tc/2", "1", "box"),
+            ],
+        )
+        self.assertEqual(
+            sorted(unhandled_data["items_with_duplicate_keys"]),
+            [
+                ("indicator_only_matching.py", "1", "1"),
+                ("indicator_only_matching.py", "2", "1"),
+            ],
+        )
+        self.assertEqual(unhandled_data["unmatched_alma_items"], [])
+        self.assertEqual(unhandled_data["unmatched_aspace_containers"], [])
+
+    def test_duplicates_matched_by_later_tier_are_not_reported(self):
+        alma_items = [_item("1", "box.001"), _item("2", "box.002")]
+        # duplicate on indicator alone, but not on indicator and type
+        aspace_containers = [_tc("/tc/1", "1", "box"), _tc("/tc/2", "1", "folder")]
+        _, unhandled_data, match_tiers = cascade_match_containers(
+            alma_items,
+            aspace_containers,
+            [PROFILES[1], PROFILES[0]],
+        )
+        self.assertEqual(match_tiers, {"/tc/1": "indicator_type_matching.py"})
+        self.assertEqual(
+            unhandled_data["tcs_with_duplicate_keys"],
+            [("indicator_only_matching.py", "/tc/2", "1")],
+        )
+        self.assertEqual(
+            [tc["uri"] for tc in unhandled_data["unmatched_aspace_containers"]], []
+        )
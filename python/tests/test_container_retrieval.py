@@ -1,8 +1,14 @@
 import unittest
 from asnake.client import ASnakeClient
 from utils.aspace_utils import (
+    get_ao_refs_for_top_container_from_db,
+    get_ao_refs_for_top_containers_from_db,
+    get_ao_titles_for_top_containers_from_db,
+    get_container_rankings_from_db,
     get_container_refs_from_api,
     get_container_refs_from_db,
+    get_top_containers_from_db,
+    get_top_containers_from_refs,
 )
 
 
@@ -20,3 +26,74 @@ class TestContainerRetrieval(unittest.TestCase):
         db_refs = get_container_refs_from_db(self.db_settings, resource_id)
         # Don't check sizes as local data can change, but confirm the values are the same.
         self.assertEqual(api_refs, db_refs)
+
+    def test_db_projection_matches_api(self):
+        resource_id = 3002  # should have just a few top containers
+        db_refs = get_container_refs_from_db(self.db_settings, resource_id)
+        api_tcs = get_top_containers_from_refs(self.aspace_client, db_refs)
+        db_tcs = get_top_containers_from_db(self.db_settings, resource_id)
+        # The projection should cover the same containers,
+        # with the same values for the fields used in matching.
+        fields = ("uri", "indicator", "type", "barcode", "lock_version")
+        self.assertEqual(
+            [tuple(tc.get(field) for field in fields) for tc in api_tcs],
+            [tuple(tc.get(field) for field in fields) for tc in db_tcs],
+        )
+        self.assertEqual(
+            [[loc["ref"] for loc in tc["container_locations"]] for tc in api_tcs],
+            [[loc["ref"] for loc in tc["container_locations"]] for tc in db_tcs],
+        )
+
+    def test_bulk_ao_refs_match_single_queries(self):
+        resource_id = 3002  # should have just a few top containers
+        db_refs = get_container_refs_from_db(self.db_settings, resource_id)
+        tc_ids = [int(ref.split("/")[-1]) for ref in db_refs]
+        # Use a small chunk size to exercise chunking
+        bulk_ao_refs = get_ao_refs_for_top_containers_from_db(
+            self.db_settings, tc_ids, chunk_size=2
+        )
+        self.assertEqual(set(bulk_ao_refs), set(tc_ids))
+        for tc_id in tc_ids:
+            self.assertEqual(
+                bulk_ao_refs[tc_id],
+                get_ao_refs_for_top_container_from_db(self.db_settings, tc_id),
+            )
+
+    def test_db_ao_titles_match_api(self):
+        resource_id = 3002  # should have just a few top containers
+        db_refs = get_container_refs_from_db(self.db_settings, resource_id)
+        tc_ids = [int(ref.split("/")[-1]) for ref in db_refs]
+        aos_by_tc_id = get_ao_titles_for_top_containers_from_db(
+            self.db_settings, tc_ids
+        )
+        for aos in aos_by_tc_id.values():
+            for ao in aos:
+                api_ao = self.aspace_client.get(ao["uri"]).json()
+                self.assertEqual(ao["title"], api_ao.get("title"))
+
+    def test_db_rankings_match_api(self):
+        resource_id = 3002  # should have just a few top containers
+        rankings = get_container_rankings_from_db(self.db_settings, resource_id)
+        ranked_tcs = [tc for tcs in rankings.values() for tc in tcs]
+        self.assertEqual(
+            sorted(tc["uri"] for tc in ranked_tcs),
+            sorted(get_container_refs_from_db(self.db_settings, resource_id)),
+        )
+        tc_ids = [int(tc["uri"].split("/")[-1]) for tc in ranked_tcs]
+        ao_refs = get_ao_refs_for_top_containers_from_db(self.db_settings, tc_ids)
+        api_tcs = {
+            tc["uri"]: tc
+            for tc in get_top_containers_from_refs(
+                self.aspace_client, [tc["uri"] for tc in ranked_tcs]
+            )
+        }
+        for (type, indicator), tcs in rankings.items():
+            for tc in tcs:
+                api_tc = api_tcs[tc["uri"]]
+                self.assertEqual(
+                    (type, indicator), (api_tc.get("type", ""), api_tc["indicator"])
+                )
+                self.assertEqual(tc["create_time"], api_tc["create_time"])
+                self.assertEqual(
+                    tc["ao_count"], len(ao_refs[int(tc["uri"].split("/")[-1])])
+                )
@@ -0,0 +1,91 @@
+import io
+import tempfile
+import tracemalloc
+import unittest
+
+from asnake import logging
+from pathlib import Path
+from utils.generic_utils import iter_jsonl, log_stage, write_jsonl
+
+# Structlog comes with a context manager for capturing logs
+# before they hit the logging processors, making testing cleaner and easier.
+# See docs @https://www.structlog.org/en/stable/testing.html
+capture_logs = logging.structlog.testing.capture_logs
+
+
+def setUpModule():
+    # Log to in-memory buffer so no output to console or file.
+    logging.setup_logging(stream=io.StringIO(), level="INFO")
+
+
+class TestJsonLines(unittest.TestCase):
+    """Tests for `iter_jsonl` and `write_jsonl`."""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.filename = Path(self.temp_dir.name) / "records.jsonl"
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_round_trip(self):
+        records = [{"pid": "1"}, {"pid": "2", "tags": ["a", "b"]}]
+        self.assertEqual(write_jsonl(iter(records), self.filename), 2)
+        self.assertEqual(list(iter_jsonl(self.filename)), records)
+
+    def test_append(self):
+        write_jsonl([{"pid": "1"}], self.filename)
+        write_jsonl([{"pid": "2"}], self.filename, append=True)
+        self.assertEqual(
+            [record["pid"] for record in iter_jsonl(self.filename)], ["1", "2"]
+        )
+
+
+class TestLogStage(unittest.TestCase):
+    """Tests for `log_stage`."""
+
+    def test_stage_is_logged_with_counts(self):
+        logger = logging.get_logger("test_generic_utils")
+        stages = []
+        with capture_logs() as logs:
+            with log_stage("match", logger, stages) as stage:
+                stage["matched"] = 3
+        self.assertEqual(len(stages), 1)
+        self.assertEqual(stages[0]["stage"], "match")
+        self.assertEqual(stages[0]["matched"], 3)
+        self.assertGreaterEqual(stages[0]["seconds"], 0)
+        self.assertEqual(logs[0]["event"], "Completed stage match")
+        self.assertEqual(logs[0]["matched"], 3)
+        # Memory is only measured when asked for.
+        self.assertNotIn("peak_memory_mb", logs[0])
+        self.assertFalse(tracemalloc.is_tracing())
+
+    def test_memory_is_measured_per_stage(self):
+        logger = logging.get_logger("test_generic_utils")
+        stages = []
+        with capture_logs():
+            with log_stage("fetch", logger, stages, trace_memory=True):
+                items = [0] * 2_000_000
+                del items
+            with log_stage("match", logger, stages, trace_memory=True):
+                pass
+        # 2 million list slots take about 15 MB.
+        self.assertGreaterEqual(stages[0]["peak_memory_mb"], 10)
+        self.assertLess(stages[0]["memory_growth_mb"], 1)
+        # A later stage doesn't report the earlier stage's peak.
+        self.assertLess(stages[1]["peak_memory_mb"], 1)
+        # Tracing is stopped once the traced stages complete.
+        self.assertFalse(tracemalloc.is_tracing())
+
+    def test_overlapping_stages_keep_their_own_peaks(self):
+        logger = logging.get_logger("test_generic_utils")
+        stages = []
+        with capture_logs():
+            with log_stage("outer", logger, stages, trace_memory=True):
+                items = [0] * 2_000_000
+                del items
+                with log_stage("inner", logger, stages, trace_memory=True):
+                    pass
+        inner, outer = stages
+        self.assertLess(inner["peak_memory_mb"], 1)
+        self.assertGreaterEqual(outer["peak_memory_mb"], 10)
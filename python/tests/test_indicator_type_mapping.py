@@ -46,6 +46,18 @@ class TestIndicatorTypeMapping(unittest.TestCase):
             alma_items[0]["barcode"],
         )
 
+    def test_match_data_from_iterators(self):
+        # profiles consume each source once, so records can be streamed from a cache
+        alma_match_data, _ = get_alma_match_data(
+            item["item_data"] for item in alma_data
+        )
+        aspace_match_data, _ = get_aspace_match_data(iter(aspace_data))
+        self.assertEqual(
+            alma_match_data,
+            get_alma_match_data([item["item_data"] for item in alma_data])[0],
+        )
+        self.assertEqual(aspace_match_data, get_aspace_match_data(aspace_data)[0])
+
     def test_match_containers_no_match(self):
         # second item in each set should not match
         alma_items = [alma_data[1]["item_data"]]
@@ -0,0 +1,97 @@
+import io
+import tempfile
+import threading
+import unittest
+
+from asnake import logging
+from pathlib import Path
+from utils.journal_utils import (
+    ChangeJournal,
+    get_barcode_changes,
+    get_checkpoint_filename,
+    get_journal_filename,
+    get_plan_filename,
+    get_run_id,
+    iter_journal,
+)
+
+
+def setUpModule():
+    # Log to in-memory buffer so no output to console or file.
+    logging.setup_logging(stream=io.StringIO(), level="INFO")
+
+
+class TestChangeJournal(unittest.TestCase):
+    """Tests for `ChangeJournal` and reading journals."""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.filename = Path(self.temp_dir.name) / "run.journal.jsonl"
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_changes_are_recorded(self):
+        with ChangeJournal(self.filename) as journal:
+            journal.record_barcode_change("/tc/1", "", "123", 4)
+        entries = list(iter_journal(self.filename))
+        self.assertEqual(len(entries), 1)
+        self.assertEqual(entries[0]["uri"], "/tc/1")
+        self.assertIsNone(entries[0]["old_barcode"])
+        self.assertEqual(entries[0]["new_barcode"], "123")
+        self.assertEqual(entries[0]["lock_version"], 4)
+
+    def test_concurrent_appends_are_not_interleaved(self):
+        with ChangeJournal(self.filename) as journal:
+            threads = [
+                threading.Thread(
+                    target=lambda i=i: [
+                        journal.append({"uri": f"/tc/{i}_{j}"}) for j in range(100)
+                    ]
+                )
+                for i in range(8)
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(len(list(iter_journal(self.filename))), 800)
+
+    def test_incomplete_final_entry_is_ignored(self):
+        with ChangeJournal(self.filename) as journal:
+            journal.append({"uri": "/tc/1"})
+        with open(self.filename, "a") as f:
+            f.write('{"uri": "/tc/')
+        self.assertEqual(list(iter_journal(self.filename)), [{"uri": "/tc/1"}])
+        # A resumed run appends after the incomplete entry.
+        with ChangeJournal(self.filename) as journal:
+            journal.append({"uri": "/tc/2"})
+        self.assertEqual(
+            list(iter_journal(self.filename)), [{"uri": "/tc/1"}, {"uri": "/tc/2"}]
+        )
+
+    def test_net_change_per_container(self):
+        with ChangeJournal(self.filename) as journal:
+            journal.record_barcode_change("/tc/1", None, "123", 1)
+            journal.record_barcode_change("/tc/2", None, "456", 1)
+            journal.record_barcode_change("/tc/1", "123", "789", 2)
+        changes = get_barcode_changes(self.filename)
+        self.assertEqual([change["uri"] for change in changes], ["/tc/1", "/tc/2"])
+        self.assertIsNone(changes[0]["old_barcode"])
+        self.assertEqual(changes[0]["new_barcode"], "789")
+        self.assertEqual(changes[0]["lock_version"], 2)
+
+    def test_filenames(self):
+        run_id = get_run_id("run_20250101_120000.log")
+        self.assertEqual(run_id, "run_20250101_120000")
+        journal_filename = get_journal_filename(run_id)
+        self.assertEqual(
+            journal_filename, Path("logs/run_20250101_120000.journal.jsonl")
+        )
+        self.assertEqual(
+            get_plan_filename(run_id), Path("logs/run_20250101_120000.plan.jsonl")
+        )
+        self.assertEqual(
+            get_checkpoint_filename(journal_filename),
+            Path("logs/run_20250101_120000.undo.jsonl"),
+        )
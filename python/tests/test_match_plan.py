@@ -0,0 +1,277 @@
+import io
+import os
+import tempfile
+import unittest
+
+from asnake import logging
+from pathlib import Path
+from utils.journal_utils import ChangeJournal, get_journal_filename, get_plan_filename
+from utils.record_utils import TopContainerRecord
+from tests.test_aspace_utils import FakeBulkWriteClient, FakeResponse
+from add_alma_barcodes_to_archivesspace import (
+    _get_args,
+    _load_match_plan,
+    _revalidate_match_plan,
+    _save_match_plan,
+    barcode_collection,
+)
+
+
+def setUpModule():
+    # Log to in-memory buffer so no output to console or file.
+    logging.setup_logging(stream=io.StringIO(), level="INFO")
+
+
+class TestMatchPlan(unittest.TestCase):
+    """Tests for saving and loading the match plan used by `--resume`."""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.plan_filename = Path(self.temp_dir.name) / "run.plan.jsonl"
+        self.argv = [
+            "--bib_id",
+            "1",
+            "--holdings_id",
+            "2",
+            "--resource_id",
+            "3",
+            "--profile",
+            "config.indicator_type_matching",
+            "--config_file",
+            "config.yml",
+        ]
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_round_trip(self):
+        plan = {
+            "alma_item_count": 3,
+            "aspace_container_count": 2,
+            "matched_containers": [
+                {"uri": "/repositories/2/top_containers/1", "barcode": "123"}
+            ],
+            "unhandled_data": {
+                "unmatched_alma_items": [{"pid": "1"}, {"pid": "2"}],
+                "tcs_with_duplicate_keys": [],
+            },
+        }
+        _save_match_plan(self.plan_filename, _get_args(self.argv), plan)
+        loaded_plan = _load_match_plan(
+            self.plan_filename, _get_args(self.argv + ["--resume", "run"])
+        )
+        self.assertEqual(loaded_plan["alma_item_count"], 3)
+        self.assertEqual(loaded_plan["aspace_container_count"], 2)
+        # Matched containers are loaded as compact records, so their complete JSON
+        # is fetched again before they are written.
+        self.assertEqual(
+            [tc.to_dict() for tc in loaded_plan["matched_containers"]],
+            plan["matched_containers"],
+        )
+        for tc in loaded_plan["matched_containers"]:
+            self.assertIsInstance(tc, TopContainerRecord)
+        # Empty categories are not written.
+        self.assertEqual(
+            loaded_plan["unhandled_data"],
+            {"unmatched_alma_items": [{"pid": "1"}, {"pid": "2"}]},
+        )
+
+    def test_plan_for_other_collection_is_rejected(self):
+        plan = {
+            "alma_item_count": 0,
+            "aspace_container_count": 0,
+            "matched_containers": [],
+            "unhandled_data": {},
+        }
+        _save_match_plan(self.plan_filename, _get_args(self.argv), plan)
+        other_argv = [arg if arg != "3" else "4" for arg in self.argv]
+        with self.assertRaises(ValueError):
+            _load_match_plan(self.plan_filename, _get_args(other_argv))
+
+    def test_plan_for_same_profile_given_differently_is_accepted(self):
+        plan = {
+            "alma_item_count": 0,
+            "aspace_container_count": 0,
+            "matched_containers": [],
+            "unhandled_data": {},
+        }
+        _save_match_plan(self.plan_filename, _get_args(self.argv), plan)
+        for profile in ("indicator_type_matching.py", "indicator_type_matching"):
+            with self.subTest(profile=profile):
+                argv = [
+                    arg if arg != "config.indicator_type_matching" else profile
+                    for arg in self.argv
+                ]
+                _load_match_plan(self.plan_filename, _get_args(argv))
+        other_argv = [
+            (
+                arg
+                if arg != "config.indicator_type_matching"
+                else "indicator_only_matching.py"
+            )
+            for arg in self.argv
+        ]
+        with self.assertRaises(ValueError):
+            _load_match_plan(self.plan_filename, _get_args(other_argv))
+
+    def test_round_trip_with_match_tiers(self):
+        plan = {
+            "alma_item_count": 2,
+            "aspace_container_count": 2,
+            "matched_containers": [
+                {"uri": "/repositories/2/top_containers/1", "barcode": "123"},
+                {"uri": "/repositories/2/top_containers/2", "barcode": "456"},
+            ],
+            "unhandled_data": {},
+            "match_tiers": {
+                "/repositories/2/top_containers/1": "indicator_type_matching.py",
+                "/repositories/2/top_containers/2": "indicator_only_matching.py",
+            },
+        }
+        _save_match_plan(self.plan_filename, _get_args(self.argv), plan)
+        loaded_plan = _load_match_plan(self.plan_filename, _get_args(self.argv))
+        # Matched containers are loaded as compact records, so their complete JSON
+        # is fetched again before they are written.
+        self.assertEqual(
+            [tc.to_dict() for tc in loaded_plan["matched_containers"]],
+            plan["matched_containers"],
+        )
+        for tc in loaded_plan["matched_containers"]:
+            self.assertIsInstance(tc, TopContainerRecord)
+        self.assertEqual(loaded_plan["match_tiers"], plan["match_tiers"])
+
+
+class TestRevalidateMatchPlan(unittest.TestCase):
+    """Tests for revalidating a match plan applied with `--apply_plan`."""
+
+    def test_changed_containers_are_not_written(self):
+        refs = [f"/repositories/2/top_containers/{i}" for i in range(1, 4)]
+        plan = {
+            "alma_item_count": 3,
+            "aspace_container_count": 3,
+            "matched_containers": [
+                TopContainerRecord(uri=ref, barcode=f"b{i}", lock_version=1)
+                for i, ref in enumerate(refs)
+            ],
+            "unhandled_data": {},
+        }
+        client = FakeBulkWriteClient(
+            {},
+            {
+                refs[0]: {"uri": refs[0], "lock_version": 1, "indicator": "1"},
+                # changed since the plan was made
+                refs[1]: {"uri": refs[1], "lock_version": 2, "indicator": "2"},
+                # refs[2] has been deleted
+            },
+        )
+        args = _get_args(
+            [
+                "--bib_id",
+                "1",
+                "--holdings_id",
+                "2",
+                "--resource_id",
+                "3",
+                "--profile",
+                "config.indicator_type_matching",
+                "--config_file",
+                "config.yml",
+                "--apply_plan",
+                "plan.jsonl",
+            ]
+        )
+        stages = []
+        revalidated_plan = _revalidate_match_plan(args, client, plan, stages)
+        # One id_set request for all the containers, whose complete JSON is kept.
+        self.assertEqual(client.calls, ["/repositories/2/top_containers"])
+        self.assertEqual(
+            revalidated_plan["matched_containers"],
+            [{"uri": refs[0], "lock_version": 1, "indicator": "1", "barcode": "b0"}],
+        )
+        self.assertEqual(
+            revalidated_plan["unhandled_data"]["stale_plan_containers"],
+            [
+                {
+                    "uri": refs[1],
+                    "barcode": "b1",
+                    "planned_lock_version": 1,
+                    "current_lock_version": 2,
+                },
+                {
+                    "uri": refs[2],
+                    "barcode": "b2",
+                    "planned_lock_version": 1,
+                    "current_lock_version": None,
+                },
+            ],
+        )
+        self.assertEqual(stages[0]["stale"], 2)
+
+
+class TestResumeRun(unittest.TestCase):
+    """Tests for resuming an interrupted run with `--resume`."""
+
+    def setUp(self):
+        # Plans and journals are kept in the logs directory of the working directory.
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.original_dir = os.getcwd()
+        os.chdir(self.temp_dir.name)
+        self.argv = [
+            "--bib_id",
+            "1",
+            "--holdings_id",
+            "2",
+            "--resource_id",
+            "3",
+            "--profile",
+            "config.indicator_type_matching",
+            "--config_file",
+            "config.yml",
+        ]
+        self.refs = [f"/repositories/2/top_containers/{i}" for i in range(1, 4)]
+        plan = {
+            "alma_item_count": 3,
+            "aspace_container_count": 3,
+            "matched_containers": [
+                {"uri": ref, "barcode": f"b{i}", "lock_version": 1}
+                for i, ref in enumerate(self.refs)
+            ],
+            "unhandled_data": {},
+        }
+        _save_match_plan(get_plan_filename("run"), _get_args(self.argv), plan)
+
+    def tearDown(self):
+        os.chdir(self.original_dir)
+        self.temp_dir.cleanup()
+
+    def test_changed_containers_are_not_written(self):
+        # The interrupted run updated the first container.
+        journal = ChangeJournal(get_journal_filename("run"))
+        journal.record_barcode_change(self.refs[0], None, "b0", 1)
+        journal.close()
+        client = FakeBulkWriteClient(
+            {ref: [FakeResponse(200)] for ref in self.refs},
+            {
+                self.refs[0]: {"uri": self.refs[0], "lock_version": 2, "barcode": "b0"},
+                self.refs[1]: {"uri": self.refs[1], "lock_version": 1},
+                # changed since the plan was made
+                self.refs[2]: {"uri": self.refs[2], "lock_version": 2},
+            },
+        )
+        args = _get_args(self.argv + ["--resume", "run"])
+        summary = barcode_collection(args, None, client, "test", "run")
+        self.assertEqual(
+            client.posted, [{"uri": self.refs[1], "lock_version": 1, "barcode": "b1"}]
+        )
+        self.assertEqual(summary["matched_containers"], 2)
+        self.assertEqual(summary["updated_containers"], 2)
+        with open(summary["unhandled_data_file"], "r") as f:
+            self.assertIn(self.refs[2], f.read())
+
+    def test_run_without_journal_is_not_resumed(self):
+        # A dry run saves its plan, but has no journal.
+        client = FakeBulkWriteClient({}, {})
+        args = _get_args(self.argv + ["--resume", "run"])
+        with self.assertRaises(ValueError):
+            barcode_collection(args, None, client, "test", "run")
+        self.assertEqual(client.calls, [])
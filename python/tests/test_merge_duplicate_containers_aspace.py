@@ -3,7 +3,9 @@ import unittest
 
 from asnake import logging
 from merge_duplicate_containers_aspace import (
+    _attach_aos_to_tcs,
     _determine_canonical_tc,
+    _get_fetched_tcs,
     _has_location_data,
     _has_recent_accession_keywords,
 )
@@ -32,48 +34,21 @@ class TestMergeDuplicateContainers(unittest.TestCase):
                 "uri": "/top_containers/1",
                 "type": "box",
                 "indicator": "1",
-                "_related_aos_temp": [
-                    {
-                        "uri": "/archival_objects/1",
-                        "title": "Archival Object 1",
-                    },
-                    {
-                        "uri": "/archival_objects/2",
-                        "title": "Archival Object 2",
-                    },
-                    {
-                        "uri": "/archival_objects/3",
-                        "title": "Archival Object 3",
-                    },
-                ],
+                "ao_count": 3,
                 "create_time": "2026-01-03T00:00:00Z",  # most recent
             },
             {
                 "uri": "/top_containers/2",
                 "type": "box",
                 "indicator": "1",
-                "_related_aos_temp": [
-                    {
-                        "uri": "/archival_objects/4",
-                        "title": "Archival Object 4",
-                    },
-                    {
-                        "uri": "/archival_objects/5",
-                        "title": "Archival Object 5",
-                    },
-                ],
+                "ao_count": 2,
                 "create_time": "2026-01-02T00:00:00Z",
             },
             {
                 "uri": "/top_containers/3",
                 "type": "box",
                 "indicator": "1",
-                "_related_aos_temp": [
-                    {
-                        "uri": "/archival_objects/6",
-                        "title": "Archival Object 6",
-                    },
-                ],
+                "ao_count": 1,
                 "create_time": "2026-01-01T00:00:00Z",
             },
         ]
@@ -93,44 +68,21 @@ class TestMergeDuplicateContainers(unittest.TestCase):
                 "uri": "/top_containers/1",
                 "type": "box",
                 "indicator": "1",
-                "_related_aos_temp": [
-                    {
-                        "uri": "/archival_objects/1",
-                        "title": "Archival Object 1",
-                    },
-                    {
-                        "uri": "/archival_objects/2",
-                        "title": "Archival Object 2",
-                    },
-                ],
+                "ao_count": 2,
                 "create_time": "2026-01-03T00:00:00Z",
             },
             {
                 "uri": "/top_containers/2",
                 "type": "box",
                 "indicator": "1",
-                "_related_aos_temp": [
-                    {
-                        "uri": "/archival_objects/4",
-                        "title": "Archival Object 4",
-                    },
-                    {
-                        "uri": "/archival_objects/5",
-                        "title": "Archival Object 5",
-                    },
-                ],
+                "ao_count": 2,
                 "create_time": "2026-01-01T00:00:00Z",  # oldest
             },
             {
                 "uri": "/top_containers/3",
                 "type": "box",
                 "indicator": "1",
-                "_related_aos_temp": [
-                    {
-                        "uri": "/archival_objects/6",
-                        "title": "Archival Object 6",
-                    },
-                ],
+                "ao_count": 1,
                 "create_time": "2026-01-02T00:00:00Z",
             },
         ]
@@ -151,44 +103,21 @@ class TestMergeDuplicateContainers(unittest.TestCase):
                 "uri": "/top_containers/1",
                 "type": "box",
                 "indicator": "1",
-                "_related_aos_temp": [
-                    {
-                        "uri": "/archival_objects/1",
-                        "title": "Archival Object 1",
-                    },
-                    {
-                        "uri": "/archival_objects/2",
-                        "title": "Archival Object 2",
-                    },
-                ],
+                "ao_count": 2,
                 "create_time": "2026-01-03T00:00:00Z",
             },
             {
                 "uri": "/top_containers/2",
                 "type": "box",
                 "indicator": "1",
-                "_related_aos_temp": [
-                    {
-                        "uri": "/archival_objects/4",
-                        "title": "Archival Object 4",
-                    },
-                    {
-                        "uri": "/archival_objects/5",
-                        "title": "Archival Object 5",
-                    },
-                ],
+                "ao_count": 2,
                 # missing create time
             },
             {
                 "uri": "/top_containers/3",
                 "type": "box",
                 "indicator": "1",
-                "_related_aos_temp": [
-                    {
-                        "uri": "/archival_objects/6",
-                        "title": "Archival Object 6",
-                    },
-                ],
+                "ao_count": 1,
                 "create_time": "2026-01-02T00:00:00Z",
             },
         ]
@@ -231,6 +160,26 @@ class TestMergeDuplicateContainers(unittest.TestCase):
         )
         self.assertEqual(logs[0]["log_level"], "warning")
 
+    def test_group_with_unfetched_tc_is_skipped(self):
+        """Test that a group is skipped if any of its TCs could not be fetched,
+        since its location data can't be checked."""
+        tcs_by_uri = {
+            "/top_containers/1": {"uri": "/top_containers/1", "indicator": "1"},
+        }
+        test_tcs = [{"uri": "/top_containers/1"}, {"uri": "/top_containers/2"}]
+
+        with capture_logs() as logs:
+            result = _get_fetched_tcs(tcs_by_uri, test_tcs)
+
+        self.assertIsNone(result)
+        self.assertEqual(logs[0]["log_level"], "error")
+        self.assertIn("/top_containers/2", logs[0]["event"])
+        # When all the TCs were fetched, their full records are returned.
+        self.assertEqual(
+            _get_fetched_tcs(tcs_by_uri, test_tcs[:1]),
+            [tcs_by_uri["/top_containers/1"]],
+        )
+
     def test_has_recent_accession_keywords(self):
         """Test that `_has_recent_accession_keywords` returns True
         and logs a warning message if recent accession keywords are found."""
@@ -287,3 +236,31 @@ class TestMergeDuplicateContainers(unittest.TestCase):
         # Function should return False and log no messages
         self.assertFalse(result)
         self.assertEqual(len(logs), 0)
+
+    def test_has_recent_accession_keywords_untitled_ao(self):
+        """Test that `_has_recent_accession_keywords` skips untitled archival objects,
+        whose title is None in the DB results."""
+        test_tcs = [
+            {
+                "uri": "/top_containers/1",
+                "_related_aos_temp": [
+                    {"uri": "/archival_objects/1", "title": None},
+                    {"uri": "/archival_objects/2", "title": "Backlog 2"},
+                ],
+            },
+        ]
+        self.assertTrue(_has_recent_accession_keywords(test_tcs))
+
+    def test_attach_aos_to_tcs(self):
+        """Test that `_attach_aos_to_tcs` attaches the compact AO data
+        for each top container, with an empty list if none are linked."""
+        aos_by_tc_id = {
+            1: [{"uri": "/repositories/2/archival_objects/1", "title": "Folder 1"}],
+        }
+        test_tcs = [
+            {"uri": "/repositories/2/top_containers/1"},
+            {"uri": "/repositories/2/top_containers/2"},
+        ]
+        tcs = _attach_aos_to_tcs(aos_by_tc_id, test_tcs)
+        self.assertEqual(tcs[0]["_related_aos_temp"], aos_by_tc_id[1])
+        self.assertEqual(tcs[1]["_related_aos_temp"], [])
@@ -0,0 +1,204 @@
+import io
+import json
+import tempfile
+import unittest
+
+from asnake import logging
+from pathlib import Path
+from config.profile_compiler import (
+    compile_profile,
+    load_profile,
+    resolve_profile_name,
+)
+
+
+def setUpModule():
+    # Log to in-memory buffer so no output to console or file.
+    logging.setup_logging(stream=io.StringIO(), level="INFO")
+
+
+INDICATOR_TYPE_SPEC = {
+    "key": ["indicator", "type"],
+    "alma": {
+        "patterns": [{"split": ".", "groups": ["type", "indicator"]}],
+        "normalize": {"indicator": ["strip_leading_zeros", "remove_restricted"]},
+    },
+    "aspace": {"fields": {"indicator": "indicator", "type": "type"}},
+}
+
+SERIES_SPEC = {
+    "key": ["indicator", "series"],
+    "alma": {
+        "patterns": [
+            {
+                "split": " ",
+                "groups": [
+                    {"split": ".", "groups": [None, "series"]},
+                    {"split": ".", "groups": [None, "indicator"]},
+                ],
+            }
+        ],
+        "normalize": {
+            "series": ["upper"],
+            "indicator": ["strip_leading_zeros"],
+        },
+    },
+    "aspace": {
+        "patterns": [
+            {"when": r"\d", "pattern": r"(?P<indicator>\d+)(?P<series>\w+)"},
+            {"pattern": r"(?P<series>\w+)-(?P<indicator>\d+)"},
+        ],
+        "normalize": {"series": ["upper"]},
+        "required": ["indicator", "series"],
+    },
+}
+
+
+class TestCompileProfile(unittest.TestCase):
+    """Tests for `compile_profile`."""
+
+    def test_split_with_normalization(self):
+        get_alma_match_data, _ = compile_profile(INDICATOR_TYPE_SPEC)
+        items = [{"pid": "1", "description": "box.001 RESTRICTED"}]
+        match_data, duplicates = get_alma_match_data(items)
+        self.assertEqual(match_data, {("1", "box"): items[0]})
+        self.assertEqual(duplicates, [])
+
+    def test_fields(self):
+        _, get_aspace_match_data = compile_profile(INDICATOR_TYPE_SPEC)
+        tcs = [{"uri": "/tc/1", "indicator": "1", "type": "box"}]
+        match_data, _ = get_aspace_match_data(tcs)
+        self.assertEqual(match_data, {("1", "box"): tcs[0]})
+
+    def test_nested_split(self):
+        get_alma_match_data, _ = compile_profile(SERIES_SPEC)
+        items = [{"pid": "1", "description": "ser.p box.0011"}]
+        match_data, _ = get_alma_match_data(items)
+        self.assertEqual(list(match_data), [("11", "P")])
+
+    def test_pattern_alternatives(self):
+        _, get_aspace_match_data = compile_profile(SERIES_SPEC)
+        tcs = [
+            {"uri": "/tc/1", "indicator": "11p"},
+            {"uri": "/tc/2", "indicator": "Q-12"},
+        ]
+        match_data, _ = get_aspace_match_data(tcs)
+        self.assertEqual(list(match_data), [("11", "P"), ("12", "Q")])
+
+    def test_single_part_key_is_not_a_tuple(self):
+        spec = {
+            "key": ["indicator"],
+            "alma": {"patterns": [{"split": ".", "groups": [None, "indicator"]}]},
+            "aspace": {"fields": {"indicator": "indicator"}},
+        }
+        get_alma_match_data, _ = compile_profile(spec)
+        match_data, _ = get_alma_match_data([{"pid": "1", "description": "box.2"}])
+        self.assertEqual(list(match_data), ["2"])
+
+    def test_unparseable_record_keyed_by_id(self):
+        get_alma_match_data, _ = compile_profile(SERIES_SPEC)
+        _, get_aspace_match_data = compile_profile(SERIES_SPEC)
+        alma_match_data, _ = get_alma_match_data(
+            [{"pid": "1", "description": "box.0011"}]
+        )
+        aspace_match_data, _ = get_aspace_match_data(
+            [{"uri": "/tc/1", "indicator": "11-22"}]
+        )
+        self.assertEqual(list(alma_match_data), ["1"])
+        self.assertEqual(list(aspace_match_data), ["/tc/1"])
+
+    def test_duplicate_keys_are_skipped(self):
+        _, get_aspace_match_data = compile_profile(INDICATOR_TYPE_SPEC)
+        tcs = [
+            {"uri": "/tc/1", "indicator": "1", "type": "box"},
+            {"uri": "/tc/2", "indicator": "1", "type": "box"},
+        ]
+        match_data, duplicates = get_aspace_match_data(tcs)
+        self.assertEqual(match_data, {})
+        self.assertEqual(duplicates, [("/tc/2", "1", "box"), ("/tc/1", "1", "box")])
+
+    def test_invalid_spec(self):
+        spec = {
+            "key": ["indicator", "series"],
+            "alma": {"patterns": [{"split": ".", "groups": [None, "indicator"]}]},
+            "aspace": {"fields": {"indicator": "indicator"}},
+        }
+        with self.assertRaises(ValueError):
+            compile_profile(spec)
+        alma_spec = dict(
+            INDICATOR_TYPE_SPEC["alma"], normalize={"indicator": ["no_such_rule"]}
+        )
+        spec = dict(INDICATOR_TYPE_SPEC, alma=alma_spec)
+        with self.assertRaises(ValueError):
+            compile_profile(spec)
+        aspace_spec = dict(INDICATOR_TYPE_SPEC["aspace"], required=["series"])
+        spec = dict(INDICATOR_TYPE_SPEC, aspace=aspace_spec)
+        with self.assertRaises(ValueError):
+            compile_profile(spec)
+
+
+class TestResolveProfileName(unittest.TestCase):
+    """Tests for `resolve_profile_name`."""
+
+    def test_module_profile(self):
+        for profile in (
+            "indicator_only_matching.py",
+            "config/indicator_only_matching.py",
+            "config.indicator_only_matching",
+            "indicator_only_matching",
+        ):
+            with self.subTest(profile=profile):
+                self.assertEqual(
+                    resolve_profile_name(profile), "config.indicator_only_matching"
+                )
+
+    def test_declarative_profile(self):
+        self.assertEqual(
+            resolve_profile_name("profiles/../profiles/my_collection.yml"),
+            str(Path("profiles/my_collection.yml").resolve()),
+        )
+
+    def test_cascade(self):
+        self.assertEqual(
+            resolve_profile_name("indicator_type_matching.py, indicator_only_matching"),
+            "config.indicator_type_matching,config.indicator_only_matching",
+        )
+
+
+class TestLoadProfile(unittest.TestCase):
+    """Tests for `load_profile`."""
+
+    def test_load_module(self):
+        for profile_name in ("indicator_type_matching.py", "indicator_type_matching"):
+            with self.subTest(profile=profile_name):
+                profile = load_profile(profile_name)
+                self.assertEqual(profile.__name__, "config.indicator_type_matching")
+
+    def test_load_declarative_files(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            yaml_filename = Path(temp_dir) / "profile.yml"
+            yaml_filename.write_text(
+                "key: [indicator]\n"
+                "alma:\n"
+                "  patterns:\n"
+                '    - split: "."\n'
+                "      groups: [null, indicator]\n"
+                "  normalize:\n"
+                "    indicator: [strip_leading_zeros]\n"
+                "aspace:\n"
+                "  fields:\n"
+                "    indicator: indicator\n"
+            )
+            json_filename = Path(temp_dir) / "profile.json"
+            json_filename.write_text(json.dumps(INDICATOR_TYPE_SPEC))
+            yaml_profile = load_profile(str(yaml_filename))
+            json_profile = load_profile(str(json_filename))
+
+        match_data, _ = yaml_profile.get_alma_match_data(
+            [{"pid": "1", "description": "box.007"}]
+        )
+        self.assertEqual(list(match_data), ["7"])
+        match_data, _ = json_profile.get_aspace_match_data(
+            [{"uri": "/tc/1", "indicator": "7", "type": "box"}]
+        )
+        self.assertEqual(list(match_data), [("7", "box")])
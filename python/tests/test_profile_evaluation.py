@@ -0,0 +1,132 @@
+import copy
+import io
+import json
+import os
+import unittest
+
+from asnake import logging
+from contextlib import redirect_stdout
+from add_alma_barcodes_to_archivesspace import (
+    _evaluate_profile,
+    _load_profiles_to_evaluate,
+    print_profile_evaluation,
+)
+from config.base_match import match_containers
+from config.profile_compiler import get_registered_profiles, load_profile
+
+# Get the directory of the test file
+current_dir = os.path.dirname(os.path.abspath(__file__))
+
+with open(os.path.join(current_dir, "alma_data_indicator_type.json"), "r") as f:
+    alma_data = [item["item_data"] for item in json.load(f)]
+
+with open(os.path.join(current_dir, "aspace_data_indicator_type.json"), "r") as f:
+    aspace_data = json.load(f)
+
+
+def setUpModule():
+    # Log to in-memory buffer so no output to console or file.
+    logging.setup_logging(stream=io.StringIO(), level="INFO")
+
+
+class TestProfileEvaluation(unittest.TestCase):
+    """Tests for comparing profiles with `--evaluate_profiles`."""
+
+    def test_registered_profiles(self):
+        self.assertEqual(
+            get_registered_profiles(),
+            [
+                "indicator_only_matching.py",
+                "indicator_type_matching.py",
+                "series_description_matching.py",
+            ],
+        )
+
+    def test_each_profile_is_evaluated_once(self):
+        profile_modules = _load_profiles_to_evaluate(
+            "config.indicator_type_matching,indicator_type_matching,"
+            "indicator_only_matching.py"
+        )
+        self.assertEqual(
+            list(profile_modules),
+            [
+                "indicator_only_matching.py",
+                "indicator_type_matching.py",
+                "series_description_matching.py",
+            ],
+        )
+
+    def test_matching_profile_is_best(self):
+        results = {
+            profile: _evaluate_profile(load_profile(profile), alma_data, aspace_data)
+            for profile in get_registered_profiles()
+        }
+        self.assertGreater(
+            results["indicator_type_matching.py"]["matched"],
+            results["series_description_matching.py"]["matched"],
+        )
+
+    def test_counts_agree_with_matching(self):
+        for profile in get_registered_profiles():
+            with self.subTest(profile=profile):
+                profile_module = load_profile(profile)
+                counts = _evaluate_profile(profile_module, alma_data, aspace_data)
+
+                alma_match_data, items_with_duplicate_keys = (
+                    profile_module.get_alma_match_data(copy.deepcopy(alma_data))
+                )
+                aspace_match_data, tcs_with_duplicate_keys = (
+                    profile_module.get_aspace_match_data(copy.deepcopy(aspace_data))
+                )
+                matched, unhandled_data = match_containers(
+                    alma_match_data, aspace_match_data
+                )
+                self.assertEqual(
+                    counts,
+                    {
+                        "matched": len(matched),
+                        "unmatched_alma_items": len(
+                            unhandled_data["unmatched_alma_items"]
+                        ),
+                        "unmatched_aspace_containers": len(
+                            unhandled_data["unmatched_aspace_containers"]
+                        ),
+                        "items_with_duplicate_keys": len(items_with_duplicate_keys),
+                        "tcs_with_duplicate_keys": len(tcs_with_duplicate_keys),
+                    },
+                )
+
+    def test_evaluation_does_not_change_data(self):
+        aspace_containers = copy.deepcopy(aspace_data)
+        _evaluate_profile(
+            load_profile("indicator_type_matching.py"), alma_data, aspace_containers
+        )
+        self.assertEqual(aspace_containers, aspace_data)
+
+    def test_table_lists_best_profile_first(self):
+        results = [
+            {
+                "profile": "worse.yml",
+                "matched": 1,
+                "unmatched_alma_items": 9,
+                "unmatched_aspace_containers": 9,
+                "items_with_duplicate_keys": 0,
+                "tcs_with_duplicate_keys": 0,
+            },
+            {
+                "profile": "better.yml",
+                "matched": 10,
+                "unmatched_alma_items": 0,
+                "unmatched_aspace_containers": 0,
+                "items_with_duplicate_keys": 0,
+                "tcs_with_duplicate_keys": 2,
+            },
+        ]
+        output = io.StringIO()
+        with redirect_stdout(output):
+            print_profile_evaluation(results)
+        lines = output.getvalue().splitlines()
+        self.assertEqual(len(lines), 3)
+        self.assertTrue(lines[0].startswith("Profile"))
+        self.assertTrue(lines[1].startswith("better.yml"))
+        self.assertTrue(lines[2].startswith("worse.yml"))
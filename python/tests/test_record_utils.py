@@ -0,0 +1,89 @@
+import json
+import tempfile
+import unittest
+
+from pathlib import Path
+from config.base_match import match_containers
+from config.indicator_type_matching import get_alma_match_data, get_aspace_match_data
+from utils import write_jsonl
+from utils.record_utils import (
+    AlmaItemRecord,
+    TopContainerRecord,
+    compact_alma_items,
+    compact_top_containers,
+)
+
+
+class TestCompactRecords(unittest.TestCase):
+    """Tests for compact records used for matching."""
+
+    def setUp(self):
+        self.tc = {
+            "uri": "/repositories/2/top_containers/1",
+            "indicator": "1",
+            "type": "box",
+            "lock_version": 2,
+            "container_locations": [{"ref": "/locations/1"}],
+            "collection": [{"ref": "/repositories/2/resources/1"}],
+        }
+        self.item = {
+            "pid": "231",
+            "barcode": "L000001",
+            "description": "box.001",
+            "physical_material_type": {"value": "BOX"},
+        }
+
+    def test_only_matching_fields_are_kept(self):
+        record = TopContainerRecord.from_dict(self.tc)
+        self.assertEqual(
+            record.to_dict(),
+            {
+                "uri": "/repositories/2/top_containers/1",
+                "indicator": "1",
+                "type": "box",
+                "lock_version": 2,
+            },
+        )
+        self.assertFalse(hasattr(record, "__dict__"))
+
+    def test_dict_interface(self):
+        record = AlmaItemRecord.from_dict(self.item)
+        self.assertEqual(record["description"], "box.001")
+        self.assertEqual(record.get("physical_material_type"), None)
+        self.assertEqual(record.get("missing", "default"), "default")
+        tc = TopContainerRecord.from_dict(self.tc)
+        self.assertNotIn("barcode", tc)
+        with self.assertRaises(KeyError):
+            tc["barcode"]
+        tc["barcode"] = "L000001"
+        self.assertEqual(tc["barcode"], "L000001")
+        with self.assertRaises(KeyError):
+            tc["container_locations"] = []
+
+    def test_matching_with_compact_records(self):
+        alma_items = compact_alma_items(iter([self.item]))
+        aspace_containers = compact_top_containers([self.tc])
+        alma_match_data, _ = get_alma_match_data(alma_items)
+        aspace_match_data, _ = get_aspace_match_data(aspace_containers)
+        matched, _ = match_containers(alma_match_data, aspace_match_data)
+        self.assertEqual(matched, [aspace_containers[0]])
+        self.assertEqual(matched[0]["barcode"], "L000001")
+
+    def test_written_as_json(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            filename = Path(temp_dir) / "records.jsonl"
+            write_jsonl(
+                [{"category": "x", "record": AlmaItemRecord.from_dict(self.item)}],
+                filename,
+            )
+            self.assertEqual(
+                json.loads(filename.read_text()),
+                {
+                    "category": "x",
+                    "record": {
+                        "pid": "231",
+                        "barcode": "L000001",
+                        "description": "box.001",
+                    },
+                },
+            )
@@ -8,14 +8,16 @@ from .generic_utils import (
     configure_logging,
     load_config,
     write_dicts_to_csv,
-    read_from_cache,
-    write_to_cache,
+    iter_jsonl,
+    write_jsonl,
+    log_stage,
 )
 
 __all__ = [
     "configure_logging",
     "load_config",
     "write_dicts_to_csv",
-    "read_from_cache",
-    "write_to_cache",
+    "iter_jsonl",
+    "write_jsonl",
+    "log_stage",
 ]
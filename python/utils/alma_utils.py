@@ -5,11 +5,159 @@ This module provides utilities for interacting with Alma
 that can be reused across multiple scripts in the toolkit.
 """
 
+import threading
+import time
+
 from alma_api_client import AlmaAPIClient
+from collections.abc import Iterator
+from concurrent.futures import ThreadPoolExecutor
+
+# Maximum number of items Alma returns per request.
+ALMA_PAGE_SIZE = 100
+# Default number of concurrent page requests.
+# Kept low, as Alma enforces a per-second limit on API calls.
+DEFAULT_ALMA_MAX_WORKERS = 4
+# Default maximum sustained rate of Alma API calls.
+DEFAULT_ALMA_CALLS_PER_SECOND = 10
+
+
+class AlmaRateLimiter:
+    """Thread-safe token bucket limiting the rate of Alma API calls,
+    with an optional cap on the total number of calls (e.g. a daily quota).
+    Share one instance between all requests which should count against the same limits.
+    """
+
+    def __init__(
+        self,
+        calls_per_second: float,
+        burst: int | None = None,
+        max_calls: int | None = None,
+    ):
+        """
+        :param float calls_per_second: Sustained rate at which calls are allowed.
+        :param int | None burst: Maximum number of calls allowed at once after idling.
+            Defaults to one second's worth of calls.
+        :param int | None max_calls: If set, raise once this many calls have been made.
+        """
+        self.calls_per_second = calls_per_second
+        self.burst = burst or max(1, int(calls_per_second))
+        self.max_calls = max_calls
+        self.calls = 0
+        self._tokens = float(self.burst)
+        self._last_refill = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        """Blocks until a call is allowed, then counts it.
+
+        :raises RuntimeError: If `max_calls` has been reached.
+        """
+        while True:
+            with self._lock:
+                if self.max_calls is not None and self.calls >= self.max_calls:
+                    raise RuntimeError(
+                        f"Alma API call limit of {self.max_calls} reached"
+                    )
+                now = time.monotonic()
+                self._tokens = min(
+                    self.burst,
+                    self._tokens + (now - self._last_refill) * self.calls_per_second,
+                )
+                self._last_refill = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    self.calls += 1
+                    return
+                wait = (1 - self._tokens) / self.calls_per_second
+            time.sleep(wait)
+
+
+def get_alma_cache_key(holdings_id: str) -> str:
+    """Returns the cache key for Alma items in the given holdings.
+
+    :param str holdings_id: Holdings ID for the target collection.
+    :return: The cache key.
+    """
+    return f"alma_data_{holdings_id}"
+
+
+def _get_alma_items_page(
+    alma_client: AlmaAPIClient,
+    bib_id: str,
+    holdings_id: str,
+    offset: int,
+    rate_limiter: AlmaRateLimiter | None = None,
+) -> dict:
+    """Returns one page of the Alma items API response, starting at `offset`.
+
+    :param alma_client: AlmaAPIClient instance.
+    :param str bib_id: Bib ID (AKA MMS ID) for the target collection.
+    :param str holdings_id: Holdings ID for the target collection.
+    :param int offset: Offset of the first item on the page.
+    :param AlmaRateLimiter | None rate_limiter: If set, wait for it before the request.
+    :return: The decoded JSON response.
+    :raises ValueError: If the request fails.
+    """
+    if rate_limiter:
+        rate_limiter.acquire()
+    try:
+        response = alma_client.get_items(
+            bib_id, holdings_id, {"limit": ALMA_PAGE_SIZE, "offset": offset}
+        )
+        response.raise_for_status()
+        return response.json()
+    except Exception as e:
+        raise ValueError(f"Failed to get items from Alma: {e}")
+
+
+def iter_alma_items_from_alma(
+    alma_client: AlmaAPIClient,
+    bib_id: str,
+    holdings_id: str,
+    max_workers: int = DEFAULT_ALMA_MAX_WORKERS,
+    rate_limiter: AlmaRateLimiter | None = None,
+) -> Iterator[dict]:
+    """Yields item data from Alma for the given bib_id and holdings_id,
+    one dictionary per item, in the order Alma returns them.
+
+    The first page also provides the total number of items;
+    the remaining pages are then requested concurrently,
+    and items are yielded as soon as each page (in order) is available.
+
+    :param alma_client: AlmaAPIClient instance.
+    :param str bib_id: Bib ID (AKA MMS ID) for the target collection.
+    :param str holdings_id: Holdings ID for the target collection.
+    :param int max_workers: Maximum number of concurrent page requests.
+    :param AlmaRateLimiter | None rate_limiter: If set, all requests wait for it.
+    :return: An iterator of dictionaries representing Alma items.
+    """
+    first_page = _get_alma_items_page(alma_client, bib_id, holdings_id, 0, rate_limiter)
+    total_items = first_page.get("total_record_count", 0)
+    remaining_offsets = range(ALMA_PAGE_SIZE, total_items, ALMA_PAGE_SIZE)
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        # Submit the remaining pages before yielding anything,
+        # so they are fetched while the caller works on the first page.
+        # `executor.map` yields pages in offset order.
+        pages = executor.map(
+            lambda offset: _get_alma_items_page(
+                alma_client, bib_id, holdings_id, offset, rate_limiter
+            ),
+            remaining_offsets,
+        )
+        for item in first_page.get("item", []):
+            yield item.get("item_data")
+        for page in pages:
+            for item in page.get("item", []):
+                yield item.get("item_data")
 
 
 def get_alma_items_from_alma(
-    alma_client: AlmaAPIClient, bib_id: str, holdings_id: str
+    alma_client: AlmaAPIClient,
+    bib_id: str,
+    holdings_id: str,
+    max_workers: int = DEFAULT_ALMA_MAX_WORKERS,
+    rate_limiter: AlmaRateLimiter | None = None,
 ) -> list[dict]:
     """Returns item data from Alma for the given bib_id and holdings_id.
     The data is a list of dictionaries, each containing Alma data for one item.
@@ -17,30 +165,57 @@ def get_alma_items_from_alma(
     :param alma_client: AlmaAPIClient instance.
     :param str bib_id: Bib ID (AKA MMS ID) for the target collection.
     :param str holdings_id: Holdings ID for the target collection.
+    :param int max_workers: Maximum number of concurrent page requests.
+    :param AlmaRateLimiter | None rate_limiter: If set, all requests wait for it.
     :return: A list of dictionaries representing Alma items.
     """
-    alma_items = []
-    offset = 0
-    # Get the total expected number of items
-    try:
-        response = alma_client.get_items(bib_id, holdings_id, {"limit": 1})
-        response.raise_for_status()
-        data = response.json()
-        total_items = data.get("total_record_count", 0)
-    except Exception as e:
-        raise ValueError(f"Failed to get items from Alma: {e}")
+    return list(
+        iter_alma_items_from_alma(
+            alma_client, bib_id, holdings_id, max_workers, rate_limiter
+        )
+    )
+
 
-    while len(alma_items) < total_items:
+def get_alma_items_for_holdings(
+    alma_client: AlmaAPIClient,
+    bib_holdings_pairs: list[tuple[str, str]],
+    rate_limiter: AlmaRateLimiter,
+    max_workers: int = DEFAULT_ALMA_MAX_WORKERS,
+) -> tuple[dict[str, list[dict]], dict[str, str]]:
+    """Returns Alma item data for each of the given (bib_id, holdings_id) pairs,
+    fetched concurrently, with all requests sharing one rate limiter.
+    Each holdings' pages are fetched one after another, so no more than
+    `max_workers` requests are made at once.
+
+    :param alma_client: AlmaAPIClient instance.
+    :param list[tuple[str, str]] bib_holdings_pairs: (bib_id, holdings_id) pairs to fetch.
+    :param AlmaRateLimiter rate_limiter: Rate limiter shared by all requests.
+    :param int max_workers: Maximum number of holdings (and so requests) fetched at once.
+    :return: A tuple of:
+        - a dict with holdings IDs as keys, and lists of Alma items as values.
+        - a dict with holdings IDs as keys, and error messages as values,
+            for holdings which could not be fetched.
+    """
+
+    def _fetch(pair: tuple[str, str]) -> list[dict] | str:
+        bib_id, holdings_id = pair
         try:
-            response = alma_client.get_items(
-                bib_id, holdings_id, {"limit": 100, "offset": offset}
+            # Pages are fetched sequentially within each holdings,
+            # as the holdings are already fetched concurrently.
+            return get_alma_items_from_alma(
+                alma_client, bib_id, holdings_id, 1, rate_limiter
             )
-            response.raise_for_status()
-            data = response.json()
-            items = data.get("item", [])
         except Exception as e:
-            raise ValueError(f"Failed to get items from Alma: {e}")
-        for item in items:
-            alma_items.append(item.get("item_data"))
-        offset += 100
-    return alma_items
+            return str(e)
+
+    items_by_holdings: dict[str, list[dict]] = {}
+    errors_by_holdings: dict[str, str] = {}
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        for (_, holdings_id), result in zip(
+            bib_holdings_pairs, executor.map(_fetch, bib_holdings_pairs)
+        ):
+            if isinstance(result, str):
+                errors_by_holdings[holdings_id] = result
+            else:
+                items_by_holdings[holdings_id] = result
+    return items_by_holdings, errors_by_holdings
@@ -0,0 +1,191 @@
+"""
+Asyncio wrapper around ASnakeClient for high-concurrency ArchivesSpace runs.
+
+ASnakeClient is synchronous, so a script using it has one request in flight at a time.
+`AsyncASnakeClient` runs the same client's requests on worker threads,
+with an `asyncio.Semaphore` limiting how many are in flight at once.
+It reuses the ASnake session (and its session token) and the `.archivessnake.yml`
+config format, and sizes the session's connection pool so keep-alive connections
+are shared between concurrent requests.
+
+Scripts can move to it one hot loop at a time, e.g.:
+
+    async def _get_all(refs):
+        async with AsyncASnakeClient(config_file=args.config_file) as client:
+            return await client.get_json_many(refs)
+
+    top_containers = asyncio.run(_get_all(container_refs))
+"""
+
+import asyncio
+
+from asnake import logging
+from asnake.client import ASnakeClient
+from asnake.client.web_client import ASnakeWeirdReturnError
+from collections.abc import AsyncIterator, Iterable
+from numbers import Number
+from pathlib import Path
+from requests import Response
+from requests.adapters import HTTPAdapter
+
+from .aspace_utils import DEFAULT_MAX_WORKERS
+
+# Logger available globally within this module.
+# Configuration is done by the calling script, via configure_logging().
+logger = logging.get_logger(Path(__file__).stem)
+
+
+class AsyncASnakeClient:
+    """Async wrapper for an ASnakeClient, with a limit on concurrent requests.
+    An instance should be used within a single event loop (i.e. one `asyncio.run`).
+    """
+
+    def __init__(
+        self,
+        client: ASnakeClient | None = None,
+        max_concurrency: int = DEFAULT_MAX_WORKERS,
+        **config,
+    ):
+        """
+        :param ASnakeClient | None client: An existing client to wrap, e.g. one already
+            used by the calling script. If None, a new client is created from `config`.
+        :param int max_concurrency: Maximum number of requests in flight at once.
+        :param config: Passed to ASnakeClient if `client` is not provided,
+            e.g. `config_file=".archivessnake.yml"` or the loaded config dict.
+        """
+        self.client = client or ASnakeClient(**config)
+        self.max_concurrency = max(1, max_concurrency)
+        # requests keeps 10 connections per host by default; size the pool to match
+        # the concurrency limit so every in-flight request can reuse a connection.
+        adapter = HTTPAdapter(pool_maxsize=self.max_concurrency)
+        self.client.session.mount("http://", adapter)
+        self.client.session.mount("https://", adapter)
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self._auth_lock = asyncio.Lock()
+
+    async def __aenter__(self) -> "AsyncASnakeClient":
+        await self.authorize()
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        pass  # the session belongs to the wrapped client, which may still be in use
+
+    @property
+    def _session_header_name(self) -> str:
+        return self.client.config["session_header_name"]
+
+    async def authorize(self) -> str:
+        """Authorizes the wrapped client once, reusing an existing session token if set.
+        Without this, many concurrent first requests would each get a 403
+        and log in separately.
+
+        :return: The session token.
+        """
+        async with self._auth_lock:
+            token = self.client.session.headers.get(self._session_header_name)
+            if not token:
+                token = await asyncio.to_thread(self.client.authorize)
+            return token
+
+    async def _request(self, method: str, url: str, **kwargs) -> Response:
+        async with self._semaphore:
+            return await asyncio.to_thread(getattr(self.client, method), url, **kwargs)
+
+    async def get(self, url: str, **kwargs) -> Response:
+        """Async version of `ASnakeClient.get`."""
+        return await self._request("get", url, **kwargs)
+
+    async def post(self, url: str, **kwargs) -> Response:
+        """Async version of `ASnakeClient.post`."""
+        return await self._request("post", url, **kwargs)
+
+    async def delete(self, url: str, **kwargs) -> Response:
+        """Async version of `ASnakeClient.delete`."""
+        return await self._request("delete", url, **kwargs)
+
+    async def get_json_many(self, refs: Iterable[str]) -> list[dict]:
+        """Returns the JSON for each of the given refs, fetched concurrently.
+        Refs which cannot be retrieved are logged and skipped.
+        Results are returned in the order of `refs`.
+
+        :param Iterable[str] refs: URIs of records to retrieve.
+        :return: A list of record dicts.
+        """
+
+        async def _fetch(ref: str) -> dict | None:
+            try:
+                response = await self.get(ref)
+                response.raise_for_status()
+                return response.json()
+            except Exception as err:
+                logger.error(f"Error fetching {ref}: {err}. Skipping.")
+                return None
+
+        records = await asyncio.gather(*(_fetch(ref) for ref in refs))
+        return [record for record in records if record is not None]
+
+    async def get_paged(
+        self, url: str, page_size: int = 100, **kwargs
+    ) -> AsyncIterator[dict]:
+        """Async version of `ASnakeClient.get_paged`:
+        yields each JSON object from a paged listing, in the same order.
+        Once the first page gives the number of pages,
+        the remaining pages are requested concurrently.
+
+        :param str url: URL of the paged listing, e.g. "repositories/2/top_containers".
+        :param int page_size: Number of records per page.
+        :param kwargs: Passed through to the requests, e.g. `params`.
+        """
+        params = dict(kwargs.pop("params", {}))
+        # special-cased in ASnake bc all_ids doesn't work on repositories index route
+        if "all_ids" in params and url in {"/repositories", "repositories"}:
+            del params["all_ids"]
+        params.update(page_size=page_size, page=1)
+
+        first_page = (await self.get(url, params=params, **kwargs)).json()
+
+        # Regular paged object
+        if hasattr(first_page, "keys") and {
+            "results",
+            "this_page",
+            "last_page",
+        } <= set(first_page.keys()):
+            remaining_pages = range(
+                first_page["this_page"] + 1, first_page["last_page"] + 1
+            )
+            # Create all page requests up front, before yielding anything,
+            # so they run concurrently while the caller works on the first page.
+            # They are awaited in order so objects are yielded in page order.
+            tasks = [
+                asyncio.ensure_future(
+                    self.get(url, params={**params, "page": page}, **kwargs)
+                )
+                for page in remaining_pages
+            ]
+            try:
+                for obj in first_page["results"]:
+                    yield obj
+                for task in tasks:
+                    for obj in (await task).json()["results"]:
+                        yield obj
+            finally:
+                for task in tasks:
+                    task.cancel()
+        # routes that just return a list, or ids, i.e. queries with all_ids param
+        elif isinstance(first_page, list):
+            if first_page and hasattr(first_page[0], "keys"):
+                for obj in first_page:
+                    yield obj
+            elif first_page and isinstance(first_page[0], Number):
+                for obj in await self.get_json_many(
+                    "/".join([url, str(id)]) for id in first_page
+                ):
+                    yield obj
+            elif first_page:
+                raise ASnakeWeirdReturnError(
+                    f"get_paged doesn't know how to handle {first_page}"
+                )
+        else:
+            raise ASnakeWeirdReturnError(
+                f"get_paged doesn't know how to handle {first_page}"
+            )
@@ -5,10 +5,171 @@ This module provides utilities for interacting with ArchivesSpace
 that can be reused across multiple scripts in the toolkit.
 """
 
+import atexit
+import threading
+import time
+
+from asnake import logging
 from asnake.client import ASnakeClient
-from MySQLdb import connect
+from collections import defaultdict
+from collections.abc import Callable, Iterable
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from MySQLdb import InterfaceError, OperationalError, connect
+from MySQLdb.connections import Connection
 from MySQLdb.cursors import DictCursor
 
+from .record_utils import CompactRecord
+
+# Logger available globally within this module.
+# Configuration is done by the calling script, via configure_logging().
+logger = logging.get_logger(Path(__file__).stem)
+
+# Default number of concurrent API requests when fetching records by ref.
+# Kept modest so hosted ArchivesSpace instances are not overloaded.
+DEFAULT_MAX_WORKERS = 8
+# Default number of times a failed GET is retried before the record is skipped.
+DEFAULT_RETRIES = 2
+# Default number of top containers requested per `id_set` call.
+# ArchivesSpace caps list responses at its `max_page_size`, which defaults to 250.
+DEFAULT_BATCH_SIZE = 250
+# Default number of IDs per `IN (...)` clause in bulk database queries.
+DEFAULT_DB_CHUNK_SIZE = 1000
+# Default number of barcodes per `top_containers/bulk/barcodes` request.
+# Each request is one server-side transaction, so keep them modest.
+DEFAULT_BULK_CHUNK_SIZE = 100
+
+
+class DBConnectionPool:
+    """A small pool of reusable MySQL connections for one set of DB settings.
+
+    Connections are checked with `ping()` before reuse, and replaced if they
+    have gone away (e.g. a dropped SSH tunnel or server-side timeout).
+    Each connection is used by one thread at a time.
+    """
+
+    def __init__(self, db_settings: dict, max_idle: int = DEFAULT_MAX_WORKERS):
+        """
+        :param dict db_settings: A dict with DB connection details.
+        :param int max_idle: Maximum number of idle connections kept for reuse.
+        """
+        self.db_settings = db_settings
+        self.max_idle = max_idle
+        self._idle: list[Connection] = []
+        self._lock = threading.Lock()
+
+    def _connect(self) -> Connection:
+        # Autocommit ends each query's implicit transaction,
+        # so a reused connection does not keep reading from a stale snapshot.
+        return connect(
+            host=self.db_settings.get("host"),
+            database=self.db_settings.get("database"),
+            user=self.db_settings.get("user"),
+            password=self.db_settings.get("password"),
+            autocommit=True,
+        )
+
+    def acquire(self) -> Connection:
+        """Returns a healthy connection, reusing an idle one if possible."""
+        while True:
+            with self._lock:
+                if not self._idle:
+                    break
+                mysql_client = self._idle.pop()
+            try:
+                mysql_client.ping()
+                return mysql_client
+            except (OperationalError, InterfaceError):
+                # Stale connection: discard it and try the next one.
+                self._discard(mysql_client)
+        return self._connect()
+
+    def release(self, mysql_client: Connection) -> None:
+        """Returns a connection to the pool, or closes it if the pool is full."""
+        with self._lock:
+            if len(self._idle) < self.max_idle:
+                self._idle.append(mysql_client)
+                return
+        self._discard(mysql_client)
+
+    def _discard(self, mysql_client: Connection) -> None:
+        try:
+            mysql_client.close()
+        except Exception:
+            pass  # already closed or broken
+
+    def fetch_all(self, query: str, params: tuple, retries: int = 1) -> list[dict]:
+        """Runs a query and returns all rows as dicts.
+        If the connection fails mid-query, it is discarded and the query is retried
+        on a fresh connection.
+
+        :param str query: Parameterized SQL query.
+        :param tuple params: Values for the query parameters.
+        :param int retries: Number of times to retry on a connection failure.
+        :return: A list of row dicts.
+        """
+        for attempt in range(retries + 1):
+            mysql_client = self.acquire()
+            try:
+                cursor = mysql_client.cursor(DictCursor)
+                cursor.execute(query, params)
+                rows = list(cursor.fetchall())
+                cursor.close()
+            except (OperationalError, InterfaceError) as err:
+                self._discard(mysql_client)
+                if attempt == retries:
+                    raise
+                logger.warning(f"Database connection error: {err}. Reconnecting...")
+                continue
+            except Exception:
+                # Query errors are not retried, but the connection may be
+                # mid-result, so don't return it to the pool.
+                self._discard(mysql_client)
+                raise
+            self.release(mysql_client)
+            return rows
+        # Not reachable, but keeps type checkers happy.
+        raise RuntimeError("Database query failed")
+
+    def close(self) -> None:
+        """Closes all idle connections."""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for mysql_client in idle:
+            self._discard(mysql_client)
+
+
+# Pools shared across all callers in the process, keyed by connection settings,
+# so callers can keep passing a plain `db_settings` dict.
+_db_pools: dict[tuple, DBConnectionPool] = {}
+_db_pools_lock = threading.Lock()
+
+
+def get_db_pool(db_settings: dict) -> DBConnectionPool:
+    """Returns the shared connection pool for the given DB settings,
+    creating it on first use.
+
+    :param dict db_settings: A dict with DB connection details.
+    :return: A DBConnectionPool instance.
+    """
+    key = tuple(
+        db_settings.get(field) for field in ("host", "database", "user", "password")
+    )
+    with _db_pools_lock:
+        if key not in _db_pools:
+            _db_pools[key] = DBConnectionPool(db_settings)
+        return _db_pools[key]
+
+
+@atexit.register
+def close_db_pools() -> None:
+    """Closes all pooled DB connections. Called automatically at exit."""
+    with _db_pools_lock:
+        pools = list(_db_pools.values())
+        _db_pools.clear()
+    for pool in pools:
+        pool.close()
+
 
 def get_container_refs_from_api(
     aspace_client: ASnakeClient, repo_id: int, resource_id: int
@@ -39,13 +200,6 @@ def get_container_refs_from_db(db_settings: dict, resource_id: int) -> set[str]:
     :param int resource_id: ASpace resource ID for target collection.
     :return: A set of container refs.
     """
-    mysql_client = connect(
-        host=db_settings.get("host"),
-        database=db_settings.get("database"),
-        user=db_settings.get("user"),
-        password=db_settings.get("password"),
-    )
-
     query = """
         select distinct
             concat('/repositories/', r.repo_id, '/top_containers/', tc.id) as container_uri
@@ -61,14 +215,139 @@ def get_container_refs_from_db(db_settings: dict, resource_id: int) -> set[str]:
         order by container_uri
     """
     # Parameterized query requires tuple of values
-    cursor = mysql_client.cursor(DictCursor)
-    cursor.execute(query, (resource_id,))
-    container_refs = set(row["container_uri"] for row in cursor.fetchall())
-    cursor.close()
-    mysql_client.close()
+    rows = get_db_pool(db_settings).fetch_all(query, (resource_id,))
+    container_refs = set(row["container_uri"] for row in rows)
     return container_refs
 
 
+def get_container_stamps_from_db(
+    db_settings: dict, resource_id: int
+) -> dict[str, dict]:
+    """Returns the current version stamp (`lock_version` and `system_mtime`)
+    of each top container for the given resource_id, obtained via database query.
+    ArchivesSpace increments `lock_version` and updates `system_mtime`
+    every time a record is saved, so this identifies which containers changed
+    since they were last retrieved.
+    As with `get_container_refs_from_db`, only containers linked to published,
+    non-suppressed archival objects are included.
+
+    :param dict db_settings: A dict with DB connection details.
+    :param int resource_id: ASpace resource ID for target collection.
+    :return: A dict with top container refs as keys, and version stamps
+        (as returned by `get_version_stamp`) as values.
+    """
+    # This extends the query used in `get_container_refs_from_db`
+    # with the container's lock_version and system_mtime.
+    query = """
+        select distinct
+            concat('/repositories/', r.repo_id, '/top_containers/', tc.id) as container_uri,
+            tc.lock_version,
+            tc.system_mtime
+        from resource r
+        inner join archival_object ao on r.id = ao.root_record_id
+        inner join instance i on ao.id = i.archival_object_id
+        inner join sub_container sc on i.id = sc.instance_id
+        inner join top_container_link_rlshp tclr on sc.id = tclr.sub_container_id
+        inner join top_container tc on tclr.top_container_id = tc.id
+        where r.id = %s
+        and ao.publish = 1 -- true
+        and ao.suppressed = 0 -- false
+        order by container_uri
+    """
+    rows = get_db_pool(db_settings).fetch_all(query, (resource_id,))
+    return {
+        row["container_uri"]: {
+            "lock_version": row["lock_version"],
+            # Formatted as in the API's JSON, so stamps from either can be compared.
+            "system_mtime": (
+                row["system_mtime"].strftime("%Y-%m-%dT%H:%M:%SZ")
+                if row["system_mtime"]
+                else None
+            ),
+        }
+        for row in rows
+    }
+
+
+def get_container_versions_from_db(
+    db_settings: dict, resource_id: int
+) -> dict[str, int]:
+    """Returns the current `lock_version` of each top container for the given resource_id,
+    obtained via database query; see `get_container_stamps_from_db`.
+
+    :param dict db_settings: A dict with DB connection details.
+    :param int resource_id: ASpace resource ID for target collection.
+    :return: A dict with top container refs as keys, and lock versions as values.
+    """
+    return {
+        ref: stamp["lock_version"]
+        for ref, stamp in get_container_stamps_from_db(db_settings, resource_id).items()
+    }
+
+
+def get_version_stamp(tc: dict) -> dict:
+    """Returns the version stamp of a top container:
+    its `lock_version` and `system_mtime`, which change whenever it is saved.
+
+    :param dict tc: Top container JSON.
+    :return: A dict with `lock_version` and `system_mtime`.
+    """
+    return {
+        "lock_version": tc.get("lock_version"),
+        "system_mtime": tc.get("system_mtime"),
+    }
+
+
+def get_changed_container_refs(
+    cached_containers: list[dict],
+    current_stamps: dict[str, dict],
+    seen_stamps: dict[str, dict] | None = None,
+) -> tuple[list[dict], set[str], set[str]]:
+    """Compares cached top containers with their current version stamps,
+    to find which cached containers are still current, and which need refetching.
+
+    :param list[dict] cached_containers: Previously retrieved top container JSON.
+    :param dict[str, dict] current_stamps: Current version stamps by container ref,
+        as returned by `get_container_stamps_from_db`.
+    :param dict[str, dict] | None seen_stamps: Version stamps of every container seen
+        when the cache was written, including those left out of `cached_containers`
+        (e.g. not linked to a published record), so they are only refetched if changed.
+        Defaults to the stamps of `cached_containers`.
+    :return: A tuple of:
+        - a list of cached containers which are unchanged.
+        - a set of refs for containers which are new or changed, and need refetching.
+        - a set of refs for cached containers which are no longer in the resource.
+    """
+    if seen_stamps is None:
+        seen_stamps = {tc["uri"]: get_version_stamp(tc) for tc in cached_containers}
+    changed_refs = {
+        ref for ref, stamp in current_stamps.items() if seen_stamps.get(ref) != stamp
+    }
+    unchanged_containers = [
+        tc
+        for tc in cached_containers
+        if tc["uri"] in current_stamps and tc["uri"] not in changed_refs
+    ]
+    removed_refs = {tc["uri"] for tc in cached_containers} - set(current_stamps)
+    return unchanged_containers, changed_refs, removed_refs
+
+
+def partition_containers_by_barcode(
+    containers: Iterable[dict],
+) -> tuple[list[dict], list[dict]]:
+    """Splits top containers into those without and those with barcodes,
+    in a single pass, keeping their original order.
+
+    :param Iterable[dict] containers: Top container JSON.
+    :return: A tuple of (containers without barcodes, containers with barcodes).
+    """
+    without_barcodes: list[dict] = []
+    with_barcodes: list[dict] = []
+    for tc in containers:
+        (with_barcodes if tc.get("barcode") else without_barcodes).append(tc)
+    return without_barcodes, with_barcodes
+
+
 def get_ao_refs_for_top_container_from_db(
     db_settings: dict,
     top_container_id: int,
@@ -80,33 +359,816 @@ def get_ao_refs_for_top_container_from_db(
     :param int top_container_id: ASpace top container ID.
     :return: A list of archival object refs.
     """
-    mysql_client = connect(
-        host=db_settings.get("host"),
-        database=db_settings.get("database"),
-        user=db_settings.get("user"),
-        password=db_settings.get("password"),
+    ao_refs_by_tc_id = get_ao_refs_for_top_containers_from_db(
+        db_settings, [top_container_id]
+    )
+    return ao_refs_by_tc_id[top_container_id]
+
+
+def get_ao_refs_for_top_containers_from_db(
+    db_settings: dict,
+    top_container_ids: Iterable[int],
+    chunk_size: int = DEFAULT_DB_CHUNK_SIZE,
+) -> dict[int, list[str]]:
+    """Return de-duped archival object refs linked to each of the given top container IDs,
+    via chunked database queries. Filters for published and non-suppressed archival objects.
+
+    :param dict db_settings: A dict with DB connection details.
+    :param Iterable[int] top_container_ids: ASpace top container IDs.
+    :param int chunk_size: Maximum number of IDs per query.
+    :return: A dict with top container IDs as keys, and sorted lists of
+        archival object refs as values. Every requested ID is included,
+        with an empty list if no archival objects are linked.
+    """
+    aos_by_tc_id = get_ao_titles_for_top_containers_from_db(
+        db_settings, top_container_ids, chunk_size
     )
+    return {tc_id: [ao["uri"] for ao in aos] for tc_id, aos in aos_by_tc_id.items()}
+
 
-    # This adapts the query used in `_get_container_refs_from_db` to return
-    # the set of archival object refs linked to the given top container.
+def get_ao_titles_for_top_containers_from_db(
+    db_settings: dict,
+    top_container_ids: Iterable[int],
+    chunk_size: int = DEFAULT_DB_CHUNK_SIZE,
+) -> dict[int, list[dict]]:
+    """Return the URI and title of the archival objects linked to each of the
+    given top container IDs, via chunked database queries, without retrieving
+    the archival object records. Filters for published and non-suppressed archival objects.
+
+    :param dict db_settings: A dict with DB connection details.
+    :param Iterable[int] top_container_ids: ASpace top container IDs.
+    :param int chunk_size: Maximum number of IDs per query.
+    :return: A dict with top container IDs as keys, and lists of
+        `{"uri": ..., "title": ...}` dicts, sorted by URI, as values.
+        Every requested ID is included, with an empty list if no archival
+        objects are linked. The title is None for untitled archival objects.
+    """
+    tc_ids = sorted(set(top_container_ids))
+    aos_by_tc_id: dict[int, list[dict]] = {tc_id: [] for tc_id in tc_ids}
+    pool = get_db_pool(db_settings)
+    chunk_size = max(1, chunk_size)
+    for start in range(0, len(tc_ids), chunk_size):
+        chunk = tc_ids[start : start + chunk_size]
+        # This adapts the query used in `get_container_refs_from_db` to return
+        # the archival objects linked to each of the given top containers.
+        # Only placeholders are interpolated; values are still parameterized.
+        query = f"""
+            select distinct
+                tc.id as top_container_id,
+                concat('/repositories/', r.repo_id, '/archival_objects/', ao.id) as ao_uri,
+                ao.title as ao_title
+            from resource r
+            inner join archival_object ao on r.id = ao.root_record_id
+            inner join instance i on ao.id = i.archival_object_id
+            inner join sub_container sc on i.id = sc.instance_id
+            inner join top_container_link_rlshp tclr on sc.id = tclr.sub_container_id
+            inner join top_container tc on tclr.top_container_id = tc.id
+            where tc.id in ({", ".join(["%s"] * len(chunk))})
+            and ao.publish = 1
+            and ao.suppressed = 0
+            order by top_container_id, ao_uri
+        """
+        for row in pool.fetch_all(query, tuple(chunk)):
+            aos_by_tc_id[row["top_container_id"]].append(
+                {"uri": row["ao_uri"], "title": row["ao_title"]}
+            )
+    return aos_by_tc_id
+
+
+def get_container_rankings_from_db(
+    db_settings: dict, resource_id: int
+) -> dict[tuple[str, str], list[dict]]:
+    """Returns the top containers for the given resource_id grouped by (type, indicator),
+    with the values used to choose between duplicate containers,
+    computed by a single aggregate database query:
+    the number of published, non-suppressed archival objects linked to each container
+    (from any resource), and its create time.
+    As with `get_container_refs_from_db`, only containers linked to published,
+    non-suppressed archival objects in the resource are included.
+
+    :param dict db_settings: A dict with DB connection details.
+    :param int resource_id: ASpace resource ID for target collection.
+    :return: A dict with (type, indicator) tuples as keys, and lists of
+        `{"uri": ..., "ao_count": ..., "create_time": ...}` dicts, sorted by URI,
+        as values. Create times are formatted as in the API's JSON.
+    """
+    # The subquery is the query used in `get_container_refs_from_db`;
+    # the outer query counts all of each container's archival objects,
+    # as merging relinks them all, not only those in this resource.
+    query = """
+        select
+            concat('/repositories/', tc.repo_id, '/top_containers/', tc.id) as container_uri,
+            ev.value as container_type,
+            tc.indicator,
+            tc.create_time,
+            count(distinct ao.id) as ao_count
+        from top_container tc
+        left join enumeration_value ev on tc.type_id = ev.id
+        inner join top_container_link_rlshp tclr on tc.id = tclr.top_container_id
+        inner join sub_container sc on tclr.sub_container_id = sc.id
+        inner join instance i on sc.instance_id = i.id
+        inner join archival_object ao on i.archival_object_id = ao.id
+        where ao.publish = 1 -- true
+        and ao.suppressed = 0 -- false
+        and tc.id in (
+            select tclr.top_container_id
+            from archival_object ao
+            inner join instance i on ao.id = i.archival_object_id
+            inner join sub_container sc on i.id = sc.instance_id
+            inner join top_container_link_rlshp tclr on sc.id = tclr.sub_container_id
+            where ao.root_record_id = %s
+            and ao.publish = 1 -- true
+            and ao.suppressed = 0 -- false
+        )
+        group by tc.id, tc.repo_id, ev.value, tc.indicator, tc.create_time
+        order by container_uri
+    """
+    rows = get_db_pool(db_settings).fetch_all(query, (resource_id,))
+
+    rankings: defaultdict[tuple[str, str], list[dict]] = defaultdict(list)
+    for row in rows:
+        create_time = row["create_time"]
+        rankings[(row["container_type"] or "", row["indicator"] or "")].append(
+            {
+                "uri": row["container_uri"],
+                "ao_count": row["ao_count"],
+                "create_time": (
+                    create_time.strftime("%Y-%m-%dT%H:%M:%SZ") if create_time else None
+                ),
+            }
+        )
+    return dict(rankings)
+
+
+def _get_json_with_retries(
+    aspace_client: ASnakeClient,
+    ref: str,
+    retries: int,
+    backoff: float,
+    **kwargs,
+) -> dict | list:
+    """Returns the JSON for the given ref, retrying failed requests
+    with exponential backoff.
+
+    :param ASnakeClient aspace_client: ASnakeClient instance.
+    :param str ref: URI of the record (or listing endpoint) to retrieve.
+    :param int retries: Number of times to retry a failed request.
+    :param float backoff: Seconds to wait before the first retry;
+        doubled for each subsequent retry.
+    :param kwargs: Passed through to `aspace_client.get`, e.g. `params`.
+    :return: The decoded JSON response.
+    :raises Exception: The last error, if all attempts fail.
+    """
+    for attempt in range(retries + 1):
+        try:
+            response = aspace_client.get(ref, **kwargs)
+            response.raise_for_status()
+            return response.json()
+        except Exception as err:
+            if attempt == retries:
+                raise
+            logger.warning(
+                f"Error fetching {ref}: {err}. "
+                f"Retrying ({attempt + 1} of {retries})..."
+            )
+            time.sleep(backoff * 2**attempt)
+    # Not reachable, but keeps type checkers happy.
+    raise RuntimeError(f"Failed to fetch {ref}")
+
+
+def get_top_containers_by_id_set(
+    aspace_client: ASnakeClient,
+    container_refs: Iterable[str],
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    max_workers: int = DEFAULT_MAX_WORKERS,
+    retries: int = DEFAULT_RETRIES,
+    backoff: float = 1.0,
+) -> tuple[list[dict], list[str]]:
+    """Returns full top container JSON for the given container refs,
+    fetched in batches via `GET /repositories/:repo_id/top_containers?id_set[]=...`.
+    Batches are requested concurrently; if a batch cannot be retrieved,
+    even after retries, its containers are requested one at a time instead,
+    and any which still cannot be retrieved are logged and skipped.
+    Results are returned in sorted ref order, regardless of completion order.
+
+    :param ASnakeClient aspace_client: ASnakeClient instance.
+    :param Iterable[str] container_refs: Top container refs (URIs) to retrieve.
+    :param int batch_size: Maximum number of top containers to request per call.
+    :param int max_workers: Maximum number of concurrent requests.
+    :param int retries: Number of times to retry a failed request for each batch.
+    :param float backoff: Seconds to wait before the first retry;
+        doubled for each subsequent retry.
+    :return: A tuple of:
+        - a list of top container dicts.
+        - a list of refs which were requested but not returned,
+            usually because the container was deleted or suppressed.
+    """
+    refs = sorted(set(container_refs))
+    batch_size = max(1, batch_size)
+
+    # The `id_set` endpoint is scoped to a repository, so group IDs by repository,
+    # e.g. "/repositories/2/top_containers/123" -> ("/repositories/2", 123).
+    ids_by_repo: defaultdict[str, list[int]] = defaultdict(list)
+    for ref in refs:
+        repo_uri, _, tc_id = ref.rpartition("/top_containers/")
+        ids_by_repo[repo_uri].append(int(tc_id))
+    batches = [
+        (repo_uri, ids[start : start + batch_size])
+        for repo_uri, ids in ids_by_repo.items()
+        for start in range(0, len(ids), batch_size)
+    ]
+
+    def _fetch_one(ref: str) -> dict | None:
+        try:
+            return _get_json_with_retries(aspace_client, ref, retries, backoff)
+        except Exception as err:
+            logger.error(f"Error fetching top container {ref}: {err}. Skipping.")
+            return None
+
+    def _fetch_batch(batch: tuple[str, list[int]]) -> tuple[list[dict], list[int]]:
+        """Returns the containers in the batch, and the IDs whose absence
+        means ArchivesSpace did not return them (rather than a failed request).
+        """
+        repo_uri, ids = batch
+        try:
+            # ASnake appends "[]" to list-valued param names, giving `id_set[]=...`.
+            batch_tcs = _get_json_with_retries(
+                aspace_client,
+                f"{repo_uri}/top_containers",
+                retries,
+                backoff,
+                params={"id_set": ids},
+            )
+            return batch_tcs, ids
+        except Exception as err:
+            logger.warning(
+                f"Error fetching {len(ids)} top containers from {repo_uri} "
+                f"(IDs {ids[0]}-{ids[-1]}): {err}. Fetching them one at a time."
+            )
+        # Fall back to one request per container, so one bad container
+        # (or a transient failure) does not lose the whole batch.
+        batch_tcs = [
+            tc
+            for tc in (_fetch_one(f"{repo_uri}/top_containers/{id}") for id in ids)
+            if tc is not None
+        ]
+        # Containers which failed individually have already been logged as errors.
+        return batch_tcs, [int(tc["uri"].split("/")[-1]) for tc in batch_tcs]
+
+    tcs_by_uri: dict[str, dict] = {}
+    requested_refs: set[str] = set()
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        for (repo_uri, _), (batch_tcs, requested_ids) in zip(
+            batches, executor.map(_fetch_batch, batches)
+        ):
+            requested_refs.update(
+                f"{repo_uri}/top_containers/{id}" for id in requested_ids
+            )
+            tcs_by_uri.update((tc.get("uri"), tc) for tc in batch_tcs)
+
+    top_containers = [tcs_by_uri[ref] for ref in refs if ref in tcs_by_uri]
+    # Only refs from requests that succeeded count as missing;
+    # failed requests have already been logged as errors.
+    missing_refs = [
+        ref for ref in refs if ref in requested_refs and ref not in tcs_by_uri
+    ]
+    for ref in missing_refs:
+        logger.warning(
+            f"Top container {ref} was not returned by ArchivesSpace; "
+            "it may have been deleted or suppressed."
+        )
+    return top_containers, missing_refs
+
+
+def get_top_containers_from_refs(
+    aspace_client: ASnakeClient,
+    container_refs: Iterable[str],
+    max_workers: int = DEFAULT_MAX_WORKERS,
+    retries: int = DEFAULT_RETRIES,
+    backoff: float = 1.0,
+    batch_size: int | None = None,
+) -> list[dict]:
+    """Returns full top container JSON for the given container refs,
+    fetched concurrently via the API.
+    Containers which cannot be retrieved, even after retries,
+    are logged and skipped.
+    Results are returned in sorted ref order, regardless of completion order,
+    so output is the same from run to run.
+
+    :param ASnakeClient aspace_client: ASnakeClient instance.
+    :param Iterable[str] container_refs: Top container refs (URIs) to retrieve.
+    :param int max_workers: Maximum number of concurrent requests.
+    :param int retries: Number of times to retry a failed request for each ref.
+    :param float backoff: Seconds to wait before the first retry;
+        doubled for each subsequent retry.
+    :param int | None batch_size: If set, retrieve containers in batches of this size
+        via `get_top_containers_by_id_set`, instead of one request per container.
+    :return: A list of top container dicts.
+    """
+    if batch_size:
+        top_containers, _ = get_top_containers_by_id_set(
+            aspace_client, container_refs, batch_size, max_workers, retries, backoff
+        )
+        return top_containers
+
+    refs = sorted(set(container_refs))
+
+    def _fetch(ref: str) -> dict | None:
+        try:
+            return _get_json_with_retries(aspace_client, ref, retries, backoff)
+        except Exception as err:
+            logger.error(f"Error fetching top container {ref}: {err}. Skipping.")
+            return None
+
+    # `executor.map` yields results in the order of `refs`,
+    # no matter which requests finish first.
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        top_containers = [tc for tc in executor.map(_fetch, refs) if tc is not None]
+    return top_containers
+
+
+def _post_barcode_with_retries(
+    aspace_client: ASnakeClient,
+    tc: dict,
+    retries: int,
+    backoff: float,
+) -> str | None:
+    """Posts a top container with its new barcode, checking the response.
+    Server errors (5xx) and connection errors are retried with exponential backoff.
+    A 409 conflict means the container was saved by someone else since it was
+    retrieved (its `lock_version` is stale), so the current version is refetched,
+    the barcode is applied to it, and it is posted again.
+    `tc` is updated in place with the refetched version, so on success
+    it holds what was saved.
+
+    :param ASnakeClient aspace_client: ASnakeClient instance.
+    :param dict tc: Top container JSON, with the barcode to add.
+    :param int retries: Number of times to retry after an error or conflict.
+    :param float backoff: Seconds to wait before the first retry;
+        doubled for each subsequent retry.
+    :return: None on success, otherwise a description of the error.
+    """
+    uri = tc["uri"]
+    barcode = tc["barcode"]
+    error = None
+    for attempt in range(retries + 1):
+        if attempt:
+            time.sleep(backoff * 2 ** (attempt - 1))
+        try:
+            response = aspace_client.post(uri, json=tc)
+        except Exception as err:
+            error = f"Request failed: {err}"
+            logger.warning(f"Error updating {uri}: {error}. Retrying...")
+            continue
+        if response.status_code < 300:
+            return None
+        error = f"HTTP {response.status_code}: {response.text}"
+        if response.status_code == 409:
+            logger.warning(f"Conflict updating {uri}; refetching and retrying...")
+            try:
+                current_tc = _get_json_with_retries(
+                    aspace_client, uri, retries, backoff
+                )
+            except Exception as err:
+                return f"Could not refetch after conflict: {err}"
+            if current_tc.get("barcode") and current_tc["barcode"] != barcode:
+                return f"Barcode {current_tc['barcode']} was added by another update"
+            tc.clear()
+            tc.update(current_tc, barcode=barcode)
+        elif response.status_code >= 500:
+            logger.warning(f"Error updating {uri}: {error}. Retrying...")
+        else:
+            # Other client errors (e.g. validation) will not succeed on retry.
+            return error
+    return error
+
+
+def _get_complete_top_container(
+    aspace_client: ASnakeClient,
+    record: CompactRecord,
+    retries: int,
+    backoff: float,
+) -> tuple[dict, str | None]:
+    """Fetches the complete JSON for a compact top container record,
+    with the record's barcode applied, ready to post.
+
+    :param ASnakeClient aspace_client: ASnakeClient instance.
+    :param CompactRecord record: Compact top container record, with a barcode to add.
+    :param int retries: Number of times to retry after an error.
+    :param float backoff: Seconds to wait before the first retry;
+        doubled for each subsequent retry.
+    :return: A tuple of (top container JSON, None) on success,
+        otherwise (the record as a dict, a description of the error).
+    """
+    uri = record["uri"]
+    barcode = record["barcode"]
+    try:
+        tc = _get_json_with_retries(aspace_client, uri, retries, backoff)
+    except Exception as err:
+        return record.to_dict(), f"Could not fetch top container: {err}"
+    if tc.get("barcode") and tc["barcode"] != barcode:
+        return record.to_dict(), f"Barcode {tc['barcode']} was added by another update"
+    tc["barcode"] = barcode
+    return tc, None
+
+
+def update_top_container_barcodes(
+    aspace_client: ASnakeClient,
+    top_containers: Iterable[dict],
+    max_workers: int = DEFAULT_MAX_WORKERS,
+    retries: int = DEFAULT_RETRIES,
+    backoff: float = 1.0,
+    on_updated: Callable[[dict], None] | None = None,
+) -> tuple[list[str], dict[str, str]]:
+    """Posts top containers with new barcodes to ASpace concurrently,
+    checking each response, retrying transient errors and resolving
+    `lock_version` conflicts (see `_post_barcode_with_retries`).
+
+    Each successful update is logged as "Added barcode to top container {uri}"
+    as soon as it completes, so the log can be used to undo a partial run.
+
+    Compact top container records (see `utils.record_utils`) can be given
+    instead of JSON: the complete JSON of each is fetched just before it is posted,
+    so complete records are only held for the containers being written.
+
+    :param ASnakeClient aspace_client: ASnakeClient instance.
+    :param Iterable[dict] top_containers: Top container JSON or compact records,
+        each with a barcode to add.
+    :param int max_workers: Maximum number of concurrent requests.
+    :param int retries: Number of times to retry each update after an error or conflict.
+    :param float backoff: Seconds to wait before the first retry;
+        doubled for each subsequent retry.
+    :param Callable[[dict], None] | None on_updated: If set, called with each
+        top container as saved, as soon as it is updated, e.g. to journal the change.
+        Called from worker threads.
+    :return: A tuple of:
+        - a list of refs for containers which were updated, in input order.
+        - a dict with refs as keys, and error messages as values,
+            for containers which could not be updated.
+    """
+
+    def _update(tc: dict) -> str | None:
+        if isinstance(tc, CompactRecord):
+            tc, error = _get_complete_top_container(aspace_client, tc, retries, backoff)
+            if error:
+                logger.error(
+                    f"Failed to add barcode to top container {tc['uri']}: {error}"
+                )
+                return error
+        error = _post_barcode_with_retries(aspace_client, tc, retries, backoff)
+        if error:
+            logger.error(f"Failed to add barcode to top container {tc['uri']}: {error}")
+        else:
+            logger.info(f"Added barcode to top container {tc['uri']}")
+            if on_updated:
+                on_updated(tc)
+        return error
+
+    top_containers = list(top_containers)
+    updated_refs: list[str] = []
+    failed_refs: dict[str, str] = {}
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        for tc, error in zip(top_containers, executor.map(_update, top_containers)):
+            if error:
+                failed_refs[tc["uri"]] = error
+            else:
+                updated_refs.append(tc["uri"])
+    return updated_refs, failed_refs
+
+
+def update_top_container_barcodes_in_bulk(
+    aspace_client: ASnakeClient,
+    top_containers: Iterable[dict],
+    chunk_size: int = DEFAULT_BULK_CHUNK_SIZE,
+    max_workers: int = DEFAULT_MAX_WORKERS,
+    retries: int = DEFAULT_RETRIES,
+    backoff: float = 1.0,
+    on_updated: Callable[[dict], None] | None = None,
+) -> tuple[list[str], dict[str, str]]:
+    """Adds barcodes to top containers in chunks, via
+    `POST /repositories/:repo_id/top_containers/bulk/barcodes`,
+    which takes a map of top container URIs to barcodes and applies them server-side.
+
+    The endpoint overwrites whatever barcode a container has, without checking
+    its `lock_version`, so the current version of each chunk's containers is
+    fetched (in one `id_set` request) just before the chunk is posted.
+    Only containers which still have no barcode, and are unchanged since they
+    were retrieved (same `lock_version`, if known), are sent in bulk.
+    The others are updated one at a time via `update_top_container_barcodes`,
+    which resolves conflicts and refuses to replace a different barcode.
+
+    ArchivesSpace applies each chunk in a single transaction, so one invalid barcode
+    fails the whole chunk. A chunk which fails is retried one container at a time
+    via `update_top_container_barcodes`, so only the invalid containers fail.
+
+    As with `update_top_container_barcodes`, each successful update is logged as
+    "Added barcode to top container {uri}", so the log can be used to undo a run.
+
+    :param ASnakeClient aspace_client: ASnakeClient instance.
+    :param Iterable[dict] top_containers: Top container JSON, each with a barcode to add.
+    :param int chunk_size: Maximum number of barcodes per request.
+    :param int max_workers: Maximum number of concurrent requests
+        when retrying a failed chunk one container at a time.
+    :param int retries: Number of times to retry a chunk after a server error.
+    :param float backoff: Seconds to wait before the first retry;
+        doubled for each subsequent retry.
+    :param Callable[[dict], None] | None on_updated: If set, called with each
+        top container as saved (its current JSON, with the new barcode),
+        as soon as it is updated, e.g. to journal the change.
+    :return: A tuple of:
+        - a list of refs for containers which were updated.
+        - a dict with refs as keys, and error messages as values,
+            for containers which could not be updated.
+    """
+    chunk_size = max(1, chunk_size)
+    # The endpoint is scoped to a repository, so group containers by repository.
+    tcs_by_repo: defaultdict[str, list[dict]] = defaultdict(list)
+    for tc in top_containers:
+        repo_uri, _, _ = tc["uri"].rpartition("/top_containers/")
+        tcs_by_repo[repo_uri].append(tc)
+
+    updated_refs: list[str] = []
+    failed_refs: dict[str, str] = {}
+    # Chunks are sent one at a time: each is a single server-side transaction,
+    # and concurrent ones would compete for the same database locks.
+    for repo_uri, tcs in tcs_by_repo.items():
+        for start in range(0, len(tcs), chunk_size):
+            chunk = tcs[start : start + chunk_size]
+            current_tcs, _ = get_top_containers_by_id_set(
+                aspace_client,
+                [tc["uri"] for tc in chunk],
+                len(chunk),
+                1,
+                retries,
+                backoff,
+            )
+            current_tcs_by_uri = {tc["uri"]: tc for tc in current_tcs}
+            bulk_chunk = []
+            single_chunk = []
+            for tc in chunk:
+                current_tc = current_tcs_by_uri.get(tc["uri"])
+                if (
+                    current_tc is None
+                    or current_tc.get("barcode")
+                    or (
+                        tc.get("lock_version") is not None
+                        and current_tc.get("lock_version") != tc["lock_version"]
+                    )
+                ):
+                    single_chunk.append(tc)
+                else:
+                    bulk_chunk.append(tc)
+            if single_chunk:
+                logger.info(
+                    f"{len(single_chunk)} top containers in {repo_uri} have changed "
+                    "since they were retrieved; updating them one at a time..."
+                )
+                chunk_updated_refs, chunk_failed_refs = update_top_container_barcodes(
+                    aspace_client,
+                    single_chunk,
+                    max_workers,
+                    retries,
+                    backoff,
+                    on_updated,
+                )
+                updated_refs.extend(chunk_updated_refs)
+                failed_refs.update(chunk_failed_refs)
+            if not bulk_chunk:
+                continue
+            chunk = bulk_chunk
+
+            barcode_data = {tc["uri"]: tc["barcode"] for tc in chunk}
+            error = None
+            for attempt in range(retries + 1):
+                if attempt:
+                    time.sleep(backoff * 2 ** (attempt - 1))
+                try:
+                    response = aspace_client.post(
+                        f"{repo_uri}/top_containers/bulk/barcodes", json=barcode_data
+                    )
+                except Exception as err:
+                    error = f"Request failed: {err}"
+                    continue
+                if response.status_code < 300:
+                    error = None
+                    break
+                error = f"HTTP {response.status_code}: {response.text}"
+                if response.status_code < 500:
+                    break  # client errors (e.g. validation) will not succeed on retry
+
+            if error is None:
+                for tc in chunk:
+                    logger.info(f"Added barcode to top container {tc['uri']}")
+                    if on_updated:
+                        # The version the barcode was added to, as fetched above.
+                        on_updated(
+                            dict(current_tcs_by_uri[tc["uri"]], barcode=tc["barcode"])
+                        )
+                    updated_refs.append(tc["uri"])
+                continue
+            logger.warning(
+                f"Bulk barcode update of {len(chunk)} top containers in {repo_uri} "
+                f"failed ({error}); updating them one at a time..."
+            )
+            chunk_updated_refs, chunk_failed_refs = update_top_container_barcodes(
+                aspace_client, chunk, max_workers, retries, backoff, on_updated
+            )
+            updated_refs.extend(chunk_updated_refs)
+            failed_refs.update(chunk_failed_refs)
+    return updated_refs, failed_refs
+
+
+def _restore_barcode_with_retries(
+    aspace_client: ASnakeClient,
+    change: dict,
+    retries: int,
+    backoff: float,
+) -> str | None:
+    """Restores a top container's barcode to its value before a journaled change.
+    The current version is fetched before each attempt, so `lock_version`
+    conflicts (409) are retried along with server and connection errors.
+    The barcode is only restored if it is still the one the change added.
+
+    :param ASnakeClient aspace_client: ASnakeClient instance.
+    :param dict change: Journal entry with `uri`, `old_barcode` and `new_barcode`.
+    :param int retries: Number of times to retry after an error or conflict.
+    :param float backoff: Seconds to wait before the first retry;
+        doubled for each subsequent retry.
+    :return: None on success, otherwise a description of the error.
+    """
+    uri = change["uri"]
+    old_barcode = change.get("old_barcode")
+    error = None
+    for attempt in range(retries + 1):
+        if attempt:
+            time.sleep(backoff * 2 ** (attempt - 1))
+        try:
+            tc = _get_json_with_retries(aspace_client, uri, retries, backoff)
+        except Exception as err:
+            return f"Could not fetch: {err}"
+        current_barcode = tc.get("barcode") or None
+        if current_barcode == old_barcode:
+            return None  # already restored, e.g. by an earlier, interrupted undo
+        if current_barcode != change.get("new_barcode"):
+            return (
+                f"Barcode is now {current_barcode}, not {change.get('new_barcode')};"
+                " it was changed after barcoding, so was not restored"
+            )
+        if (
+            change.get("lock_version") is not None
+            and tc.get("lock_version") != change["lock_version"] + 1
+        ):
+            logger.warning(
+                f"Top container {uri} was edited after barcoding "
+                f"(lock_version {tc.get('lock_version')}); restoring its barcode anyway"
+            )
+        if old_barcode:
+            tc["barcode"] = old_barcode
+        else:
+            tc.pop("barcode", None)
+        try:
+            response = aspace_client.post(uri, json=tc)
+        except Exception as err:
+            error = f"Request failed: {err}"
+            logger.warning(f"Error restoring {uri}: {error}. Retrying...")
+            continue
+        if response.status_code < 300:
+            return None
+        error = f"HTTP {response.status_code}: {response.text}"
+        if response.status_code == 409 or response.status_code >= 500:
+            logger.warning(f"Error restoring {uri}: {error}. Retrying...")
+        else:
+            return error
+    return error
+
+
+def restore_top_container_barcodes(
+    aspace_client: ASnakeClient,
+    changes: Iterable[dict],
+    max_workers: int = DEFAULT_MAX_WORKERS,
+    retries: int = DEFAULT_RETRIES,
+    backoff: float = 1.0,
+    on_done: Callable[[dict, str | None], None] | None = None,
+) -> tuple[list[str], dict[str, str]]:
+    """Restores top container barcodes to their values before journaled changes,
+    concurrently. Containers whose barcode has changed again since are left alone,
+    and reported as failures.
+
+    :param ASnakeClient aspace_client: ASnakeClient instance.
+    :param Iterable[dict] changes: Journal entries, as from `get_barcode_changes`.
+    :param int max_workers: Maximum number of concurrent requests.
+    :param int retries: Number of times to retry each restore after an error or conflict.
+    :param float backoff: Seconds to wait before the first retry;
+        doubled for each subsequent retry.
+    :param Callable[[dict, str | None], None] | None on_done: If set, called with each
+        journal entry and its error (None on success) as soon as it is processed,
+        e.g. to checkpoint progress. Called from worker threads.
+    :return: A tuple of:
+        - a list of refs for containers which were restored, in input order.
+        - a dict with refs as keys, and error messages as values,
+            for containers which could not be restored.
+    """
+
+    def _restore(change: dict) -> str | None:
+        error = _restore_barcode_with_retries(aspace_client, change, retries, backoff)
+        if error:
+            logger.error(f"Failed to restore barcode of {change['uri']}: {error}")
+        elif change.get("old_barcode"):
+            logger.info(
+                f"Restored barcode {change['old_barcode']} "
+                f"for top container {change['uri']}"
+            )
+        else:
+            logger.info(
+                f"Deleted barcode {change.get('new_barcode')} "
+                f"for top container {change['uri']}"
+            )
+        if on_done:
+            on_done(change, error)
+        return error
+
+    changes = list(changes)
+    restored_refs: list[str] = []
+    failed_refs: dict[str, str] = {}
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        for change, error in zip(changes, executor.map(_restore, changes)):
+            if error:
+                failed_refs[change["uri"]] = error
+            else:
+                restored_refs.append(change["uri"])
+    return restored_refs, failed_refs
+
+
+def get_top_containers_from_db(db_settings: dict, resource_id: int) -> list[dict]:
+    """Returns a lightweight projection of the top containers for the given resource_id,
+    obtained via a single database query.
+    Each container is a dict shaped like the API's top container JSON,
+    but limited to `uri`, `indicator`, `type`, `barcode`, `lock_version`
+    and `container_locations`,
+    so it can be used with the matching profiles in `config` unchanged.
+    As with `get_container_refs_from_db`, only containers linked to published,
+    non-suppressed archival objects are included.
+
+    This is intended for read-only reports and dry runs: the records are not
+    complete, so must never be posted back to ArchivesSpace.
+
+    :param dict db_settings: A dict with DB connection details.
+    :param int resource_id: ASpace resource ID for target collection.
+    :return: A list of partial top container dicts, sorted by URI.
+    """
+    # This extends the query used in `get_container_refs_from_db`
+    # with the container's type and locations.
+    # Containers with several locations return one row per location.
     query = """
         select distinct
-            concat('/repositories/', r.repo_id, '/archival_objects/', ao.id) as ao_uri
+            concat('/repositories/', r.repo_id, '/top_containers/', tc.id) as container_uri,
+            tc.indicator,
+            tc.barcode,
+            tc.lock_version,
+            ev.value as container_type,
+            l.id as location_id,
+            l.title as location_title,
+            tchar.status as location_status
         from resource r
         inner join archival_object ao on r.id = ao.root_record_id
         inner join instance i on ao.id = i.archival_object_id
         inner join sub_container sc on i.id = sc.instance_id
         inner join top_container_link_rlshp tclr on sc.id = tclr.sub_container_id
         inner join top_container tc on tclr.top_container_id = tc.id
-        where tc.id = %s
-        and ao.publish = 1
-        and ao.suppressed = 0
-        order by ao_uri
-    """
-
-    cursor = mysql_client.cursor(DictCursor)
-    cursor.execute(query, (top_container_id,))
-    ao_refs = [row["ao_uri"] for row in cursor.fetchall()]
-    cursor.close()
-    mysql_client.close()
-    return ao_refs
+        left join enumeration_value ev on tc.type_id = ev.id
+        left join top_container_housed_at_rlshp tchar on tc.id = tchar.top_container_id
+        left join location l on tchar.location_id = l.id
+        where r.id = %s
+        and ao.publish = 1 -- true
+        and ao.suppressed = 0 -- false
+        order by container_uri, location_id
+    """
+    rows = get_db_pool(db_settings).fetch_all(query, (resource_id,))
+
+    # Fold the location rows into one dict per container.
+    top_containers: dict[str, dict] = {}
+    for row in rows:
+        uri = row["container_uri"]
+        if uri not in top_containers:
+            tc = {
+                "uri": uri,
+                "indicator": row["indicator"],
+                "type": row["container_type"],
+                "lock_version": row["lock_version"],
+                "container_locations": [],
+                # Guaranteed by the publish/suppressed filters above.
+                "is_linked_to_published_record": True,
+            }
+            # The API omits `barcode` when a container has none.
+            if row["barcode"]:
+                tc["barcode"] = row["barcode"]
+            top_containers[uri] = tc
+        if row["location_id"] is not None:
+            top_containers[uri]["container_locations"].append(
+                {
+                    "ref": f"/locations/{row['location_id']}",
+                    "status": row["location_status"],
+                    "_resolved": {"title": row["location_title"]},
+                }
+            )
+    return list(top_containers.values())
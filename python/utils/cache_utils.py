@@ -0,0 +1,314 @@
+"""
+Versioned, freshness-aware cache for data fetched from Alma and ArchivesSpace.
+
+Each cache entry is stored as a pair of files in the cache directory:
+- `<key>.jsonl.gz`: the cached records, as gzip-compressed JSON Lines (one record per line).
+- `<key>.meta.json`: metadata about the data: when and where it was fetched,
+    how many records it has, and a hash of its content.
+
+Records are written and read one at a time, so a large collection never has to be
+serialized or parsed as a single JSON document.
+Both files are written atomically (to a temporary file, then renamed),
+so an interrupted run cannot leave a truncated entry behind.
+Entries can be rejected on read if they are too old, from a different source
+(e.g. cached from TEST but read against PROD) or fail their integrity check,
+and the least recently used entries are evicted when the cache grows too large.
+
+Entries written by earlier versions (`<key>.json.gz`, a single JSON document)
+and bare `<key>.json` files from before the cache had metadata can still be read.
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import tempfile
+import zlib
+
+from asnake import logging
+from collections.abc import Iterable, Iterator
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import BinaryIO
+
+# Logger available globally within this module.
+# Configuration is done by the calling script, via configure_logging().
+logger = logging.get_logger(Path(__file__).stem)
+
+# Bump when the format of cache entries changes.
+# Version 1: whole JSON document in `<key>.json.gz`. Version 2: JSON Lines.
+CACHE_FORMAT_VERSION = 2
+READABLE_CACHE_FORMAT_VERSIONS = {1, 2}
+DEFAULT_CACHE_DIR = "cache"
+# Total size of compressed data kept in the cache before LRU eviction.
+DEFAULT_CACHE_MAX_BYTES = 500 * 1024 * 1024
+
+
+class CacheIntegrityError(ValueError):
+    """Raised when cached data cannot be read, or does not match its content hash."""
+
+
+@contextmanager
+def _atomic_file(path: Path) -> Iterator[BinaryIO]:
+    """Yields a binary file which replaces `path` once the block completes,
+    so readers see either the old file or the complete new one.
+    If the block raises, the partial file is removed and `path` is untouched.
+
+    :param Path path: Destination file.
+    """
+    fd, temp_name = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_name, path)
+    except BaseException:
+        Path(temp_name).unlink(missing_ok=True)
+        raise
+
+
+def _write_atomic(path: Path, content: bytes) -> None:
+    """Writes content to `path` atomically.
+
+    :param Path path: Destination file.
+    :param bytes content: Content to write.
+    """
+    with _atomic_file(path) as f:
+        f.write(content)
+
+
+class CacheStore:
+    """A directory of compressed cache entries with metadata,
+    supporting max-age and source checks on read, and size-bounded LRU eviction.
+    """
+
+    def __init__(
+        self,
+        cache_dir: str | Path = DEFAULT_CACHE_DIR,
+        max_bytes: int | None = DEFAULT_CACHE_MAX_BYTES,
+    ):
+        """
+        :param str | Path cache_dir: Directory for cache files; created if needed.
+        :param int | None max_bytes: Evict least recently used entries once the
+            total size of cached data exceeds this. If None, never evict.
+        """
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+
+    def _data_path(self, key: str, version: int = CACHE_FORMAT_VERSION) -> Path:
+        suffix = ".json.gz" if version == 1 else ".jsonl.gz"
+        return self.cache_dir / f"{key}{suffix}"
+
+    def _meta_path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.meta.json"
+
+    def _legacy_paths(self, key: str) -> list[Path]:
+        # Bare JSON files, written to the working directory before the cache existed.
+        return [self.cache_dir / f"{key}.json", Path(f"{key}.json")]
+
+    def get_metadata(self, key: str) -> dict | None:
+        """Returns the metadata for the given cache entry.
+
+        :param str key: Cache key, e.g. "aspace_data_1234".
+        :return: The metadata dict, or None if there is no valid entry.
+        """
+        try:
+            with open(self._meta_path(key), "r") as f:
+                metadata = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if metadata.get("version") not in READABLE_CACHE_FORMAT_VERSIONS:
+            return None
+        return metadata
+
+    def iter_records(
+        self,
+        key: str,
+        max_age: timedelta | None = None,
+        source: str | None = None,
+    ) -> Iterator[dict] | None:
+        """Returns an iterator over the cached records for the given key,
+        or None if there is no usable entry.
+        Stale and mismatched entries are logged and treated as missing.
+        Records are read lazily; the content hash is checked once all have been read.
+
+        :param str key: Cache key, e.g. "aspace_data_1234".
+        :param timedelta | None max_age: If set, reject entries fetched longer ago than this.
+        :param str | None source: If set, reject entries fetched from a different source.
+        :return: An iterator of record dicts, or None.
+        :raises CacheIntegrityError: During iteration, if the data is corrupt.
+        """
+        metadata = self.get_metadata(key)
+        if metadata is None:
+            return self._iter_legacy(key, max_age)
+        fetched_at = datetime.fromisoformat(metadata["fetched_at"])
+        if max_age is not None and datetime.now() - fetched_at > max_age:
+            logger.info(f"Cache entry {key} is stale (fetched {fetched_at}); ignoring")
+            return None
+        if source is not None and metadata.get("source") != source:
+            logger.info(
+                f"Cache entry {key} is from {metadata.get('source')}, not {source}; ignoring"
+            )
+            return None
+
+        metadata["last_accessed"] = datetime.now().isoformat()
+        _write_atomic(self._meta_path(key), json.dumps(metadata).encode())
+        return self._iter_records(key, metadata)
+
+    def _iter_records(self, key: str, metadata: dict) -> Iterator[dict]:
+        data_path = self._data_path(key, metadata["version"])
+        hasher = hashlib.sha256()
+        try:
+            with gzip.open(data_path, "rb") as f:
+                if metadata["version"] == 1:
+                    content = f.read()
+                    hasher.update(content)
+                    records = json.loads(content)
+                else:
+                    records = None
+                    for line in f:
+                        hasher.update(line)
+                        yield json.loads(line)
+        except (OSError, EOFError, zlib.error, ValueError) as err:
+            raise CacheIntegrityError(f"Cannot read cache entry {key}: {err}")
+        if hasher.hexdigest() != metadata["content_hash"]:
+            raise CacheIntegrityError(f"Cache entry {key} failed integrity check")
+        if records is not None:
+            yield from records
+
+    def _iter_legacy(
+        self, key: str, max_age: timedelta | None
+    ) -> Iterator[dict] | None:
+        for legacy_path in self._legacy_paths(key):
+            if not legacy_path.exists():
+                continue
+            fetched_at = datetime.fromtimestamp(legacy_path.stat().st_mtime)
+            if max_age is not None and datetime.now() - fetched_at > max_age:
+                logger.info(f"Legacy cache file {legacy_path} is stale; ignoring")
+                return None
+            logger.warning(
+                f"Reading legacy cache file {legacy_path}; its source cannot be verified"
+            )
+            try:
+                with open(legacy_path, "r") as f:
+                    return iter(json.load(f))
+            except ValueError as err:
+                logger.warning(f"Cannot read legacy cache file {legacy_path}: {err}")
+                return None
+        return None
+
+    def get(
+        self,
+        key: str,
+        max_age: timedelta | None = None,
+        source: str | None = None,
+    ) -> list[dict] | None:
+        """Returns all cached records for the given key,
+        or None if there is no usable entry.
+        Stale, mismatched and corrupt entries are logged and treated as missing.
+
+        :param str key: Cache key, e.g. "aspace_data_1234".
+        :param timedelta | None max_age: If set, reject entries fetched longer ago than this.
+        :param str | None source: If set, reject entries fetched from a different source.
+        :return: A list of record dicts, or None.
+        """
+        records = self.iter_records(key, max_age=max_age, source=source)
+        if records is None:
+            return None
+        try:
+            return list(records)
+        except CacheIntegrityError as err:
+            logger.warning(f"{err}; ignoring")
+            return None
+
+    def put(
+        self,
+        key: str,
+        records: Iterable[dict],
+        source: str | None = None,
+    ) -> dict:
+        """Stores records in the cache, replacing any existing entry for the key,
+        then evicts least recently used entries if the cache is over its size limit.
+        Records are written one at a time, so `records` can be a generator.
+
+        :param str key: Cache key, e.g. "aspace_data_1234".
+        :param Iterable[dict] records: Records to cache.
+        :param str | None source: Where the data came from, e.g. the ASpace baseurl.
+        :return: The metadata for the new entry.
+        """
+        data_path = self._data_path(key)
+        hasher = hashlib.sha256()
+        record_count = 0
+        with _atomic_file(data_path) as raw_file:
+            with gzip.GzipFile(fileobj=raw_file, mode="wb") as f:
+                for record in records:
+                    line = (json.dumps(record) + "\n").encode()
+                    hasher.update(line)
+                    f.write(line)
+                    record_count += 1
+
+        now = datetime.now().isoformat()
+        metadata = {
+            "version": CACHE_FORMAT_VERSION,
+            "key": key,
+            "source": source,
+            "fetched_at": now,
+            "last_accessed": now,
+            "record_count": record_count,
+            "content_hash": hasher.hexdigest(),
+            "size_bytes": data_path.stat().st_size,
+        }
+        # Data first, then metadata: an entry only becomes visible once both exist.
+        _write_atomic(self._meta_path(key), json.dumps(metadata).encode())
+        # Remove any entry for this key in the previous format.
+        self._data_path(key, version=1).unlink(missing_ok=True)
+        self.evict(keep=key)
+        return metadata
+
+    def delete(self, key: str) -> None:
+        """Removes the given cache entry, if it exists.
+
+        :param str key: Cache key.
+        """
+        self._meta_path(key).unlink(missing_ok=True)
+        for version in READABLE_CACHE_FORMAT_VERSIONS:
+            self._data_path(key, version).unlink(missing_ok=True)
+
+    def entries(self) -> list[dict]:
+        """Returns metadata for all valid entries in the cache,
+        least recently used first.
+
+        :return: A list of metadata dicts.
+        """
+        entries = []
+        for meta_path in self.cache_dir.glob("*.meta.json"):
+            metadata = self.get_metadata(meta_path.name.removesuffix(".meta.json"))
+            if metadata is not None:
+                entries.append(metadata)
+        return sorted(entries, key=lambda metadata: metadata["last_accessed"])
+
+    def evict(self, keep: str | None = None) -> list[str]:
+        """Removes least recently used entries until the cache is within `max_bytes`.
+
+        :param str | None keep: Key of an entry which should not be evicted,
+            e.g. the one just written.
+        :return: Keys of the evicted entries.
+        """
+        if self.max_bytes is None:
+            return []
+        entries = self.entries()
+        total_bytes = sum(metadata["size_bytes"] for metadata in entries)
+        evicted = []
+        for metadata in entries:
+            if total_bytes <= self.max_bytes:
+                break
+            if metadata["key"] == keep:
+                continue
+            self.delete(metadata["key"])
+            total_bytes -= metadata["size_bytes"]
+            evicted.append(metadata["key"])
+            logger.info(f"Evicted cache entry {metadata['key']}")
+        return evicted
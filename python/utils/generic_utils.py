@@ -2,9 +2,14 @@
 
 import csv
 import json
+import threading
+import time
+import tracemalloc
 import yaml
 
 from asnake import logging
+from collections.abc import Iterable, Iterator
+from contextlib import contextmanager
 from datetime import datetime
 from pathlib import Path
 
@@ -82,36 +87,131 @@ def write_dicts_to_csv(
         writer.writerows(rows)
 
 
-def read_from_cache(filename: str) -> list[dict] | None:
-    """Reads data from the given file and returns it.
-    Data is expected to be a list of dictionaries,
-    but this method does not enforce that.
+def iter_jsonl(filename: str | Path) -> Iterator:
+    """Yields records from the given JSON Lines file, one per line,
+    reading the file lazily. Blank lines are skipped.
 
-    :param str filename: Filename of cache file.
-    :return: A list of dictionaries, or None if the cache file does not exist.
+    :param str | Path filename: Path to the JSON Lines file.
+    :return: An iterator of decoded records.
     """
-    data_file = Path(filename)
-    if data_file.exists():
-        with open(data_file, "r") as f:
-            data = json.load(f)
-    else:
-        data = None
-    return data
-
-
-def write_to_cache(
-    data: dict | list[dict],
-    filename: str,
-    indent: int | None = None,
-) -> None:
-    """Stores data in the given file for possible later use.
-    Data is expected to be a dict or list of dicts,
-    but this method does not enforce that.
-
-    :param dict | list[dict] data: Data to write to the cache file.
-    :param str filename: Filename for cache file.
-    :param int indent: Number of spaces to indent the JSON data.
-        Defaults to None, which means no indentation.
+    with open(filename, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def _to_json(obj):
+    """Converts objects which json can't serialize, but which have a `to_dict` method."""
+    if hasattr(obj, "to_dict"):
+        return obj.to_dict()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def write_jsonl(
+    records: Iterable,
+    filename: str | Path,
+    append: bool = False,
+) -> int:
+    """Writes records to the given JSON Lines file, one per line,
+    as they are produced, so `records` can be a generator.
+
+    :param Iterable records: Records to write; each must be JSON-serializable,
+        apart from objects with a `to_dict` method (e.g. compact records),
+        which are written as the dict it returns.
+    :param str | Path filename: Path to the JSON Lines file.
+    :param bool append: If True, add records to the end of an existing file.
+    :return: The number of records written.
+    """
+    record_count = 0
+    with open(filename, "a" if append else "w", encoding="utf-8") as f:
+        for record in records:
+            f.write(json.dumps(record, default=_to_json) + "\n")
+            record_count += 1
+    return record_count
+
+
+# Highest traced memory seen during each active stage, keyed by `id()` of its info dict.
+# Stages can overlap (e.g. fetching from Alma and ASpace at once), and resetting
+# the tracemalloc peak for one would lose another's, so each reset first folds
+# the peak so far into every active stage.
+_active_stage_peaks: dict[int, int] = {}
+_stage_memory_lock = threading.Lock()
+# Whether `log_stage` started tracemalloc, so should stop it after the last stage.
+_started_tracing = False
+
+
+def _fold_traced_peak() -> int:
+    """Records the traced memory peak so far for every active stage,
+    then resets it. Call with `_stage_memory_lock` held.
+
+    :return: The current traced memory, in bytes.
+    """
+    current, peak = tracemalloc.get_traced_memory()
+    for key, stage_peak in _active_stage_peaks.items():
+        _active_stage_peaks[key] = max(stage_peak, peak)
+    tracemalloc.reset_peak()
+    return current
+
+
+@contextmanager
+def log_stage(
+    stage: str,
+    logger,
+    stages: list[dict] | None = None,
+    trace_memory: bool = False,
+) -> Iterator[dict]:
+    """Times a stage of a pipeline, then logs its elapsed time,
+    and any counts the caller added to the yielded dict, as structured log fields.
+
+    With `trace_memory`, memory is also measured with `tracemalloc`, so only memory
+    allocated by Python is counted, and it is measured from the start of the stage:
+    `peak_memory_mb` is the most held at once during the stage, above what was
+    held when it started, and `memory_growth_mb` is how much more is held
+    when it ends (negative if the stage freed memory).
+    When stages overlap, each includes the other's allocations while both run.
+    Tracing slows allocation-heavy code several times over, so it is started
+    only for traced stages, and stopped when the last of them completes.
+
+    E.g.
+        with log_stage("match", logger) as stage:
+            matched = match(...)
+            stage["matched"] = len(matched)
+
+    :param str stage: Name of the stage, e.g. "fetch_alma".
+    :param logger: Logger for the stage's log entry.
+    :param list[dict] | None stages: If set, the completed stage's info is appended to it.
+    :param bool trace_memory: If True, measure the stage's memory use as well.
+    :return: A dict of info about the stage, which the caller can add counts to.
     """
-    with open(filename, "w") as f:
-        json.dump(data, f, indent=indent)
+    global _started_tracing
+    stage_info = {"stage": stage}
+    if trace_memory:
+        with _stage_memory_lock:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                _started_tracing = True
+            memory_before = _fold_traced_peak()
+            _active_stage_peaks[id(stage_info)] = memory_before
+    start = time.perf_counter()
+    try:
+        yield stage_info
+    finally:
+        if trace_memory:
+            with _stage_memory_lock:
+                memory_after = _fold_traced_peak()
+                memory_peak = _active_stage_peaks.pop(id(stage_info))
+                if not _active_stage_peaks and _started_tracing:
+                    tracemalloc.stop()
+                    _started_tracing = False
+    stage_info["seconds"] = round(time.perf_counter() - start, 3)
+    if trace_memory:
+        megabyte = 1024 * 1024
+        stage_info["peak_memory_mb"] = round(
+            (memory_peak - memory_before) / megabyte, 1
+        )
+        stage_info["memory_growth_mb"] = round(
+            (memory_after - memory_before) / megabyte, 1
+        )
+    logger.info(f"Completed stage {stage}", **stage_info)
+    if stages is not None:
+        stages.append(stage_info)
@@ -0,0 +1,180 @@
+"""
+Append-only JSON Lines journals, for recording changes as they are made.
+
+A barcoding run writes one journal entry per top container it updates:
+its URI, the barcode before and after the change, and the `lock_version`
+the change was applied to. Undo replays the journal to restore the before-image,
+and writes its own progress to a checkpoint journal, so an interrupted undo
+can resume where it stopped.
+
+Each entry is flushed as soon as it is written, so a journal is complete
+up to the last change made, even if the run is interrupted.
+This also makes the journal the record of progress for resuming an interrupted run,
+along with the run's match plan.
+
+A run's files are named after its run ID, which is the stem of its log file,
+and kept in the logs directory.
+"""
+
+import json
+import threading
+
+from asnake import logging
+from collections.abc import Iterator
+from datetime import datetime
+from pathlib import Path
+
+# Logger available globally within this module.
+# Configuration is done by the calling script, via configure_logging().
+logger = logging.get_logger(Path(__file__).stem)
+
+RUN_FILES_DIR = Path("logs")
+JOURNAL_SUFFIX = ".journal.jsonl"
+PLAN_SUFFIX = ".plan.jsonl"
+CHECKPOINT_SUFFIX = ".undo.jsonl"
+
+
+def get_run_id(log_filename: str | Path) -> str:
+    """Returns the ID of a run, which is the stem of its log file,
+    e.g. "add_alma_barcodes_to_archivesspace_20250101_120000".
+
+    :param str | Path log_filename: Name of the run's log file, as returned by
+        `configure_logging`.
+    :return: The run ID.
+    """
+    return Path(log_filename).stem
+
+
+def get_journal_filename(run_id: str) -> Path:
+    """Returns the filename of the journal of changes made by a run.
+
+    :param str run_id: The run ID.
+    :return: Path of the journal file, in the logs directory.
+    """
+    return RUN_FILES_DIR / f"{run_id}{JOURNAL_SUFFIX}"
+
+
+def get_plan_filename(run_id: str) -> Path:
+    """Returns the filename of the match plan for a run:
+    the matched top containers it will write, and its unhandled data.
+
+    :param str run_id: The run ID.
+    :return: Path of the plan file, in the logs directory.
+    """
+    return RUN_FILES_DIR / f"{run_id}{PLAN_SUFFIX}"
+
+
+def get_checkpoint_filename(journal_filename: str | Path) -> Path:
+    """Returns the filename of the checkpoint recording progress undoing a journal.
+
+    :param str | Path journal_filename: Path of the journal being undone.
+    :return: Path of the checkpoint file, next to the journal.
+    """
+    journal_path = Path(journal_filename)
+    return journal_path.with_name(
+        journal_path.name.removesuffix(JOURNAL_SUFFIX) + CHECKPOINT_SUFFIX
+    )
+
+
+class ChangeJournal:
+    """An append-only JSON Lines file which can be written to from several threads."""
+
+    def __init__(self, filename: str | Path):
+        """
+        :param str | Path filename: Path of the journal; created if needed,
+            and appended to if it exists.
+        """
+        self.filename = Path(filename)
+        self.filename.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(self.filename, "a", encoding="utf-8")
+        self._lock = threading.Lock()
+        # Start on a new line if an interrupted run left its last entry incomplete.
+        if self._file.tell() and not self._ends_with_newline():
+            self._file.write("\n")
+
+    def _ends_with_newline(self) -> bool:
+        with open(self.filename, "rb") as f:
+            f.seek(-1, 2)
+            return f.read() == b"\n"
+
+    def append(self, entry: dict) -> None:
+        """Writes an entry to the journal, and flushes it to disk.
+
+        :param dict entry: JSON-serializable entry.
+        """
+        line = json.dumps(entry) + "\n"
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+
+    def record_barcode_change(
+        self,
+        uri: str,
+        old_barcode: str | None,
+        new_barcode: str | None,
+        lock_version: int | None,
+    ) -> None:
+        """Writes an entry for a change to a top container's barcode.
+
+        :param str uri: URI of the top container.
+        :param str | None old_barcode: The barcode before the change, if any.
+        :param str | None new_barcode: The barcode after the change, if any.
+        :param int | None lock_version: The `lock_version` the change was applied to.
+        """
+        self.append(
+            {
+                "uri": uri,
+                "old_barcode": old_barcode or None,
+                "new_barcode": new_barcode or None,
+                "lock_version": lock_version,
+                "changed_at": datetime.now().isoformat(),
+            }
+        )
+
+    def close(self) -> None:
+        """Closes the journal file."""
+        self._file.close()
+
+    def __enter__(self) -> "ChangeJournal":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+def iter_journal(filename: str | Path) -> Iterator[dict]:
+    """Yields entries from a journal, skipping any line left incomplete
+    by an interrupted run.
+
+    :param str | Path filename: Path of the journal.
+    :return: An iterator of journal entries.
+    """
+    with open(filename, "r", encoding="utf-8") as f:
+        for line_number, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError as err:
+                logger.warning(
+                    f"Ignoring incomplete entry on line {line_number} of {filename}: {err}"
+                )
+
+
+def get_barcode_changes(filename: str | Path) -> list[dict]:
+    """Returns the net barcode change for each top container in a journal,
+    in the order the containers were first changed.
+    If a container was changed more than once, its entry has the barcode
+    from before the first change, and after the last.
+
+    :param str | Path filename: Path of the journal.
+    :return: A list of journal entries, one per top container.
+    """
+    changes: dict[str, dict] = {}
+    for entry in iter_journal(filename):
+        if entry["uri"] in changes:
+            changes[entry["uri"]]["new_barcode"] = entry["new_barcode"]
+            changes[entry["uri"]]["lock_version"] = entry["lock_version"]
+        else:
+            changes[entry["uri"]] = dict(entry)
+    return list(changes.values())
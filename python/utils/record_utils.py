@@ -0,0 +1,108 @@
+"""
+Compact records for matching Alma items with ASpace top containers.
+
+Matching only reads a few fields of each record, but Alma item data and
+top container JSON have dozens, so holding complete records for every item
+and container in a large collection takes far more memory than matching needs.
+These records keep only the matching fields, in `__slots__`.
+
+They support the parts of the dict interface used by the matching profiles,
+`match_containers` and the reports (`record.get(field)`, `record[field]`,
+`record["barcode"] = barcode`), so code written for dicts works unchanged.
+A compact top container must never be posted back to ASpace: it is not
+the complete record. `update_top_container_barcodes` fetches the complete
+record only for each container it writes.
+"""
+
+from collections.abc import Iterable
+from typing import Any
+
+
+class CompactRecord:
+    """Base class for records holding only the fields in their `__slots__`."""
+
+    __slots__ = ()
+
+    def __init__(self, **fields: Any):
+        for field in self.__slots__:
+            setattr(self, field, fields.get(field))
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "CompactRecord":
+        """Returns a compact record with the fields it keeps from a complete record.
+
+        :param dict data: The complete record, e.g. top container JSON.
+        :return: The compact record.
+        """
+        return cls(**{field: data.get(field) for field in cls.__slots__})
+
+    def get(self, field: str, default: Any = None) -> Any:
+        value = getattr(self, field, None) if field in self.__slots__ else None
+        return default if value is None else value
+
+    def __getitem__(self, field: str) -> Any:
+        if field not in self.__slots__ or getattr(self, field) is None:
+            raise KeyError(field)
+        return getattr(self, field)
+
+    def __setitem__(self, field: str, value: Any) -> None:
+        if field not in self.__slots__:
+            raise KeyError(field)
+        setattr(self, field, value)
+
+    def __contains__(self, field: str) -> bool:
+        return self.get(field) is not None
+
+    def __eq__(self, other: object) -> bool:
+        if type(other) is not type(self):
+            return NotImplemented
+        return self.to_dict() == other.to_dict()
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({self.to_dict()})"
+
+    def to_dict(self) -> dict:
+        """Returns the record as a dict, without empty fields,
+        as they are omitted from Alma and ASpace JSON.
+
+        :return: A dict of the record's fields.
+        """
+        return {
+            field: getattr(self, field)
+            for field in self.__slots__
+            if getattr(self, field) is not None
+        }
+
+
+class AlmaItemRecord(CompactRecord):
+    """The fields of Alma item data used for matching."""
+
+    __slots__ = ("pid", "barcode", "description")
+
+
+class TopContainerRecord(CompactRecord):
+    """The fields of ASpace top container JSON used for matching."""
+
+    __slots__ = ("uri", "indicator", "type", "barcode", "lock_version")
+
+
+def compact_alma_items(alma_items: Iterable[dict]) -> list[AlmaItemRecord]:
+    """Returns a compact record for each Alma item.
+    Items are read one at a time, so given a generator of items,
+    the complete items are never all held at once.
+
+    :param Iterable[dict] alma_items: Alma item data.
+    :return: A list of compact records.
+    """
+    return [AlmaItemRecord.from_dict(item) for item in alma_items]
+
+
+def compact_top_containers(
+    top_containers: Iterable[dict],
+) -> list[TopContainerRecord]:
+    """Returns a compact record for each top container.
+
+    :param Iterable[dict] top_containers: Top container JSON.
+    :return: A list of compact records.
+    """
+    return [TopContainerRecord.from_dict(tc) for tc in top_containers]